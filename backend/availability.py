@@ -0,0 +1,134 @@
+"""
+Motor de disponibilidade da agenda.
+- Cada dia vira um índice em memória: intervalos ocupados (minutos desde 00:00),
+  mesclados e ordenados; checar conflito é uma busca binária.
+- Horário de funcionamento vem de chatbot_settings (business_open_hour/business_close_hour).
+- O índice é só a primeira barreira: quem garante é a constraint
+  appointments_no_overlap (migração 0008), sem corrida entre ler e gravar.
+"""
+import bisect
+from datetime import timedelta
+
+from cache import availability_cache
+
+SLOT_STEP_MINUTES = 30
+DEFAULT_OPEN = "08:00"
+DEFAULT_CLOSE = "18:00"
+DEFAULT_DURATION_MINUTES = 60
+
+
+def to_minutes(value):
+    """'09:30' ou datetime.time -> minutos desde 00:00"""
+    if isinstance(value, str):
+        hours, minutes = value.strip().split(":")[:2]
+        return int(hours) * 60 + int(minutes)
+    return value.hour * 60 + value.minute
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class DayIndex:
+    """Intervalos ocupados de um dia, disjuntos e ordenados (starts/ends em paralelo)"""
+
+    def __init__(self, day, open_minutes, close_minutes, busy):
+        self.day = day
+        self.open_minutes = open_minutes
+        self.close_minutes = close_minutes
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(busy):
+            if self.ends and start < self.ends[-1]:
+                # sobreposição antiga (allow_overlap): mescla
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def within_hours(self, start, end):
+        return self.open_minutes <= start and end <= self.close_minutes
+
+    def conflicts(self, start, end):
+        # primeiro intervalo que termina depois do início pedido
+        i = bisect.bisect_right(self.ends, start)
+        return i < len(self.starts) and self.starts[i] < end
+
+    def free_slots(self, duration, step=SLOT_STEP_MINUTES):
+        """Inícios possíveis (na grade de `step` a partir da abertura) para `duration` minutos"""
+        slots = []
+        gaps = list(zip(self.ends, self.starts[1:] + [self.close_minutes]))
+        gaps.insert(0, (self.open_minutes, self.starts[0] if self.starts else self.close_minutes))
+        for gap_start, gap_end in gaps:
+            gap_start = max(gap_start, self.open_minutes)
+            gap_end = min(gap_end, self.close_minutes)
+            # alinha na grade
+            offset = (gap_start - self.open_minutes) % step
+            cursor = gap_start + (step - offset if offset else 0)
+            while cursor + duration <= gap_end:
+                slots.append(format_minutes(cursor))
+                cursor += step
+        return slots
+
+
+def business_hours(cur):
+    cur.execute(
+        """
+        SELECT business_open_hour, business_close_hour
+        FROM chatbot_settings
+        ORDER BY id
+        LIMIT 1
+        """
+    )
+    row = cur.fetchone() or {}
+    try:
+        return (
+            to_minutes(row.get("business_open_hour") or DEFAULT_OPEN),
+            to_minutes(row.get("business_close_hour") or DEFAULT_CLOSE),
+        )
+    except ValueError:
+        return to_minutes(DEFAULT_OPEN), to_minutes(DEFAULT_CLOSE)
+
+
+def service_duration(cur, service_id):
+    """Duração do serviço em minutos; None se o serviço não existe"""
+    cur.execute("SELECT duration_minutes FROM services WHERE id = %s", (service_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return row["duration_minutes"] or DEFAULT_DURATION_MINUTES
+
+
+def load_days(cur, day_from, day_to):
+    """Índices de day_from..day_to; usa o cache e busca os dias que faltam numa consulta só"""
+    days = [day_from + timedelta(days=n) for n in range((day_to - day_from).days + 1)]
+    indexes = {day: availability_cache.get(day) for day in days}
+    missing = [day for day, index in indexes.items() if index is None]
+    if not missing:
+        return [indexes[day] for day in days]
+
+    open_minutes, close_minutes = business_hours(cur)
+    cur.execute(
+        """
+        SELECT date, start_time, duration_minutes
+        FROM appointments
+        WHERE date BETWEEN %s AND %s
+          AND status <> 'cancelled'
+        """,
+        (min(missing), max(missing)),
+    )
+    busy = {day: [] for day in missing}
+    for row in cur.fetchall():
+        if row["date"] in busy:
+            start = to_minutes(row["start_time"])
+            busy[row["date"]].append((start, start + row["duration_minutes"]))
+
+    for day in missing:
+        index = DayIndex(day, open_minutes, close_minutes, busy[day])
+        availability_cache.set(day, index)
+        indexes[day] = index
+    return [indexes[day] for day in days]
+
+
+def load_day(cur, day):
+    return load_days(cur, day, day)[0]
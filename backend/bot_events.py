@@ -0,0 +1,69 @@
+"""
+Difusão do status do bot para vários assinantes (SSE do painel).
+Um único observador por processo verifica mudanças e só recalcula/envia
+o status quando algo mudou; cada assinante recebe sempre o estado mais recente.
+"""
+import asyncio
+
+from starlette.concurrency import run_in_threadpool
+
+
+class StatusBroadcaster:
+    def __init__(self, compute_status, signature, interval=1.0):
+        # signature(): barata (stat de arquivos); compute_status(): o status completo
+        self._compute_status = compute_status
+        self._signature = signature
+        self.interval = interval
+        self._subscribers = set()
+        self._task = None
+        self._last_signature = None
+        self._wake = asyncio.Event()
+        self.last_status = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=1)
+        if self.last_status is not None:
+            queue.put_nowait(self.last_status)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._last_signature = None
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._task is not None:
+            # ninguém ouvindo: para de observar
+            self._task.cancel()
+            self._task = None
+
+    def poke(self):
+        """Acorda o observador na hora (ex.: o supervisor recebeu um status novo do bot)"""
+        self._wake.set()
+
+    def publish(self, status):
+        if status == self.last_status:
+            return
+        self.last_status = status
+        for queue in self._subscribers:
+            if queue.full():
+                # só interessa o estado mais recente
+                queue.get_nowait()
+            queue.put_nowait(status)
+
+    async def _run(self):
+        while True:
+            try:
+                signature = await run_in_threadpool(self._signature)
+                if signature != self._last_signature:
+                    self._last_signature = signature
+                    self.publish(await run_in_threadpool(self._compute_status))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Erro ao observar status do bot: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
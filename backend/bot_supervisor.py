@@ -0,0 +1,320 @@
+"""
+Supervisor do processo do bot (node chatbot.js).
+- É dono do processo filho e lê o stdout dele: linhas "@@STATUS {json}" atualizam o status em memória
+  e "@@METRICS {json}" as métricas do bot (conversas, fila de envio...).
+- Reinicia o bot com backoff exponencial se ele cair sem ter sido parado.
+- start/stop/restart são jobs assíncronos: a API responde na hora com o id do job.
+"""
+import asyncio
+import collections
+import itertools
+import json
+import os
+import sys
+import time
+
+import psutil
+from starlette.concurrency import run_in_threadpool
+
+STATUS_PREFIX = "@@STATUS "
+METRICS_PREFIX = "@@METRICS "
+
+BACKOFF_INITIAL = 1
+BACKOFF_MAX = 60
+# Rodando esse tempo sem cair, o backoff volta ao inicial
+STABLE_AFTER_SECONDS = 60
+STOP_TIMEOUT_SECONDS = 5
+MAX_JOBS = 50
+
+
+def _orphaned_procs(pid):
+    """
+    Filhos que sobraram de um bot que já saiu: sem o pai não dá para descer a
+    árvore, então no POSIX vale o grupo de processos (start_new_session: pgid =
+    pid do bot) e no Windows quem ainda aponta para ele como pai.
+    """
+    procs = []
+    for p in psutil.process_iter():
+        try:
+            if os.name == "nt":
+                if p.ppid() == pid:
+                    procs.extend(p.children(recursive=True) + [p])
+            elif os.getpgid(p.pid) == pid:
+                procs.append(p)
+        except (psutil.Error, OSError):
+            pass
+    return procs
+
+
+def kill_process_tree(pid, timeout=STOP_TIMEOUT_SECONDS):
+    """Termina o processo e os filhos (Chromium); força o kill de quem não sair a tempo"""
+    try:
+        process = psutil.Process(pid)
+        procs = process.children(recursive=True) + [process]
+    except psutil.NoSuchProcess:
+        # O bot já morreu (crash): sobram os filhos, que seguram o perfil do WhatsApp
+        procs = _orphaned_procs(pid)
+    if not procs:
+        return
+    for p in procs:
+        try:
+            p.terminate()
+        except psutil.NoSuchProcess:
+            pass
+    _, alive = psutil.wait_procs(procs, timeout=timeout)
+    for p in alive:
+        try:
+            p.kill()
+        except psutil.NoSuchProcess:
+            pass
+
+
+def initial_status():
+    return {"status": "disconnected", "phone_number": None, "bot_type": None}
+
+
+class BotSupervisor:
+    def __init__(self, command, cwd, pid_file, state_file, on_change=None, on_spawn=None):
+        self.command = command
+        self.cwd = cwd
+        self.pid_file = pid_file
+        self.state_file = state_file      # guarda se o bot deve estar rodando entre reinícios do backend
+        self.on_change = on_change
+        self.on_spawn = on_spawn          # limpa QR/status em disco da execução anterior
+
+        self.process = None
+        self.desired = "stopped"
+        self.status = initial_status()
+        self.version = 0                  # muda a cada alteração de estado (para o SSE)
+        self.metrics = {}
+        self.restarts = 0
+        self.last_exit_code = None
+        self.started_at = None
+        self.log_tail = collections.deque(maxlen=100)
+
+        self._backoff = BACKOFF_INITIAL
+        self._restart_task = None
+        self._tasks = set()               # _watch e jobs: o loop só guarda referência fraca
+        self._lock = asyncio.Lock()
+        self._jobs = collections.OrderedDict()
+        self._job_ids = itertools.count(1)
+
+    # ---------- estado ----------
+
+    @property
+    def is_running(self):
+        return self.process is not None and self.process.returncode is None
+
+    def _changed(self):
+        self.version += 1
+        if self.on_change:
+            self.on_change()
+
+    def _set_status(self, **fields):
+        self.status = {**self.status, **fields}
+        self._changed()
+
+    def _save_desired(self, desired):
+        self.desired = desired
+        try:
+            self.state_file.write_text(json.dumps({"desired": desired}))
+        except OSError as e:
+            print(f"⚠️ Erro ao salvar estado do supervisor: {e}")
+
+    def info(self):
+        return {
+            "desired": self.desired,
+            "is_running": self.is_running,
+            "pid": self.process.pid if self.is_running else None,
+            "status": self.status,
+            "restarts": self.restarts,
+            "last_exit_code": self.last_exit_code,
+            "metrics": self.metrics,
+            "uptime_seconds": round(time.monotonic() - self.started_at) if self.is_running else None,
+            "log_tail": list(self.log_tail)[-20:],
+        }
+
+    # ---------- ciclo de vida ----------
+
+    async def boot(self):
+        """No startup do backend: mata bot órfão de execução anterior e restaura o estado desejado"""
+        if self.pid_file.exists():
+            try:
+                pid = int(self.pid_file.read_text().strip())
+                if psutil.pid_exists(pid) and "node" in psutil.Process(pid).name().lower():
+                    print(f"🧹 Encerrando bot órfão (PID {pid})")
+                    await run_in_threadpool(kill_process_tree, pid)
+            except (ValueError, psutil.Error) as e:
+                print(f"⚠️ PID file inválido: {e}")
+            self.pid_file.unlink(missing_ok=True)
+
+        desired = "stopped"
+        if self.state_file.exists():
+            try:
+                desired = json.loads(self.state_file.read_text()).get("desired", "stopped")
+            except (OSError, ValueError):
+                pass
+        if desired == "running":
+            await self.start()
+
+    async def shutdown(self):
+        """No shutdown do backend: para o bot sem mudar o estado desejado"""
+        desired = self.desired
+        await self.stop()
+        self._save_desired(desired)
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _track(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Tarefa do supervisor falhou: {task.exception()!r}", file=sys.stderr)
+
+    async def start(self):
+        async with self._lock:
+            self._save_desired("running")
+            if self.is_running:
+                return False
+            await self._spawn()
+            return True
+
+    async def stop(self):
+        async with self._lock:
+            self._save_desired("stopped")
+            if self._restart_task:
+                self._restart_task.cancel()
+                self._restart_task = None
+            if not self.is_running:
+                return False
+            process = self.process
+            await run_in_threadpool(kill_process_tree, process.pid)
+            await process.wait()
+            return True
+
+    async def restart(self):
+        await self.stop()
+        return await self.start()
+
+    async def _spawn(self):
+        # Status novo (não mescla): qr_version e afins da sessão anterior não
+        # podem sobreviver até o bot novo se reportar
+        self.status = initial_status()
+        self.metrics = {}
+        if self.on_spawn:
+            await run_in_threadpool(self.on_spawn)
+        self._changed()
+
+        kwargs = {}
+        if os.name == "nt":
+            import subprocess
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            cwd=self.cwd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            **kwargs,
+        )
+        self.started_at = time.monotonic()
+        self.pid_file.write_text(str(self.process.pid))
+        self._track(self._watch(self.process))
+
+    async def _watch(self, process):
+        """Lê o stdout do bot até ele sair; decide se precisa reiniciar"""
+        async for raw in process.stdout:
+            line = raw.decode("utf-8", errors="replace").rstrip()
+            if line.startswith(STATUS_PREFIX):
+                try:
+                    data = json.loads(line[len(STATUS_PREFIX):])
+                    self._set_status(**data)
+                except ValueError:
+                    print(f"⚠️ Status inválido do bot: {line}")
+                continue
+            if line.startswith(METRICS_PREFIX):
+                try:
+                    self.metrics = {**self.metrics, **json.loads(line[len(METRICS_PREFIX):])}
+                except ValueError:
+                    print(f"⚠️ Métricas inválidas do bot: {line}")
+                continue
+            self.log_tail.append(line)
+            print(f"[bot] {line}")
+
+        code = await process.wait()
+        if process is not self.process:
+            return
+        self.last_exit_code = code
+        # Chromium numa sessão própria sobrevive ao node e trava o perfil:
+        # mata o que sobrou antes de qualquer reinício (como o stop() faz)
+        await run_in_threadpool(kill_process_tree, process.pid)
+        self.pid_file.unlink(missing_ok=True)
+        self._set_status(status="disconnected", phone_number=None)
+
+        if self.desired == "running":
+            ran_for = time.monotonic() - self.started_at
+            if ran_for >= STABLE_AFTER_SECONDS:
+                self._backoff = BACKOFF_INITIAL
+            print(f"💥 Bot saiu com código {code}; reiniciando em {self._backoff}s")
+            self._restart_task = self._track(self._restart_after(self._backoff))
+            self._backoff = min(self._backoff * 2, BACKOFF_MAX)
+
+    async def _restart_after(self, delay):
+        await asyncio.sleep(delay)
+        async with self._lock:
+            self._restart_task = None
+            if self.desired == "running" and not self.is_running:
+                self.restarts += 1
+                try:
+                    await self._spawn()
+                except OSError as e:
+                    # ENOENT, EMFILE...: registra e tenta de novo com o backoff
+                    self.log_tail.append(f"Falha ao iniciar o bot: {e}")
+                    print(f"❌ Falha ao reiniciar o bot: {e}; nova tentativa em {self._backoff}s", file=sys.stderr)
+                    self._restart_task = self._track(self._restart_after(self._backoff))
+                    self._backoff = min(self._backoff * 2, BACKOFF_MAX)
+
+    # ---------- jobs ----------
+
+    def submit(self, action, coro_fn):
+        """Agenda uma operação e devolve o job na hora"""
+        job = {
+            "id": next(self._job_ids),
+            "action": action,
+            "state": "pending",
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "finished_at": None,
+        }
+        self._jobs[job["id"]] = job
+        while len(self._jobs) > MAX_JOBS:
+            self._jobs.popitem(last=False)
+
+        async def run():
+            job["state"] = "running"
+            try:
+                job["result"] = await coro_fn()
+                job["state"] = "done"
+            except Exception as e:
+                print(f"❌ Job {action} falhou: {e}", file=sys.stderr)
+                job["state"] = "failed"
+                job["error"] = str(e)
+            finally:
+                job["finished_at"] = time.time()
+
+        self._track(run())
+        return job
+
+    def get_job(self, job_id):
+        return self._jobs.get(job_id)
@@ -0,0 +1,51 @@
+import threading
+import time
+
+
+class TTLCache:
+    """Cache em memória com expiração por tempo, seguro entre threads"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Estatísticas do dashboard: poucos segundos bastam para aliviar o banco
+dashboard_cache = TTLCache(ttl=5)
+
+# Catálogo de serviços, por versão (services_catalog.version): a chave já muda quando
+# o catálogo muda, o TTL só limita quanto tempo versões velhas ocupam memória
+services_cache = TTLCache(ttl=300)
+
+# Índices de disponibilidade por dia (availability.DayIndex); limpos a cada escrita em appointments
+availability_cache = TTLCache(ttl=60)
+
+
+def invalidate_dashboard():
+    """Chamado após escrever em appointments/customers"""
+    dashboard_cache.clear()
+
+
+def invalidate_availability():
+    """Chamado após criar/alterar/excluir agendamentos"""
+    availability_cache.clear()
@@ -0,0 +1,376 @@
+"""
+Importação e exportação em massa (CSV) de agendamentos e clientes.
+- Importação: o arquivo vai direto para uma tabela temporária via COPY e é
+  mesclado com INSERT ... SELECT numa transação só (clientes por telefone).
+- Exportação: cursor no servidor + gerador; o CSV sai em blocos, sem montar
+  o resultado inteiro na memória.
+- O cabeçalho decide a ordem das colunas; aceita vírgula ou ponto e vírgula
+  (CSV salvo pelo Excel em pt-BR).
+"""
+import csv
+import io
+
+import psycopg2
+from fastapi import HTTPException
+from psycopg2 import errors, extensions
+
+from db import get_connection
+
+EXPORT_ITERSIZE = 2000
+EXPORT_CHUNK_BYTES = 64 * 1024
+MAX_REPORTED_ERRORS = 100
+
+APPOINTMENT_STATUSES = ("pending", "confirmed", "cancelled")
+
+# Colunas aceitas no cabeçalho (as do export também, para o arquivo voltar sem edição)
+APPOINTMENT_COLUMNS = (
+    "id", "name", "phone", "email", "service", "service_id",
+    "date", "start_time", "duration_minutes", "status", "channel", "notes",
+)
+CUSTOMER_COLUMNS = (
+    "id", "name", "phone", "email", "channel", "is_blocked", "blocked_reason",
+    "total_appointments", "last_appointment_date",
+)
+
+TRUE_VALUES = ("true", "t", "1", "sim", "s", "yes", "y")
+
+
+def read_header(stream, allowed, required):
+    """Lê a primeira linha do arquivo; retorna (colunas, delimitador) e deixa o stream no início dos dados"""
+    line = stream.readline()
+    if isinstance(line, bytes):
+        line = line.decode("utf-8-sig", errors="replace")
+    line = line.lstrip("﻿").strip()
+    if not line:
+        raise HTTPException(status_code=400, detail="Arquivo vazio")
+
+    delimiter = ";" if line.count(";") > line.count(",") else ","
+    columns = [c.strip().lower() for c in next(csv.reader([line], delimiter=delimiter))]
+
+    unknown = [c for c in columns if c not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Colunas desconhecidas: {', '.join(unknown)}")
+    if len(set(columns)) != len(columns):
+        raise HTTPException(status_code=400, detail="Colunas repetidas no cabeçalho")
+    for group in required:
+        if not any(c in columns for c in group):
+            raise HTTPException(status_code=400, detail=f"Coluna obrigatória ausente: {' ou '.join(group)}")
+    return columns, delimiter
+
+
+def copy_to_staging(cur, stream, table, columns, delimiter):
+    """Tabela temporária só de TEXT (linha = número da linha no arquivo) + COPY do restante do stream"""
+    cur.execute(
+        f"""
+        CREATE TEMP TABLE {table} (
+            line BIGINT GENERATED ALWAYS AS IDENTITY (START WITH 2),
+            {", ".join(f"{c} TEXT" for c in columns)}
+        ) ON COMMIT DROP
+        """
+    )
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN "
+        f"WITH (FORMAT csv, DELIMITER '{delimiter}', ENCODING 'UTF8')",
+        stream,
+    )
+
+
+def collect_errors(cur, table):
+    cur.execute(
+        f"SELECT line, error FROM {table} WHERE error IS NOT NULL ORDER BY line LIMIT %s",
+        (MAX_REPORTED_ERRORS,),
+    )
+    return [dict(row) for row in cur.fetchall()]
+
+
+def run_import(stream, allowed, required, merge):
+    """Transação única: cabeçalho, COPY, validação/mescla; erros de dado viram 400"""
+    columns, delimiter = read_header(stream, allowed, required)
+    conn = get_connection(autocommit=False)
+    try:
+        with conn, conn.cursor() as cur:
+            copy_to_staging(cur, stream, "import_rows", columns, delimiter)
+            # colunas ausentes no arquivo entram como NULL na validação
+            cur.execute(
+                "ALTER TABLE import_rows "
+                + ", ".join(f"ADD COLUMN IF NOT EXISTS {c} TEXT" for c in allowed)
+            )
+            return merge(cur)
+    except (errors.BadCopyFileFormat, errors.CharacterNotInRepertoire,
+            errors.UntranslatableCharacter) as exc:
+        raise HTTPException(status_code=400, detail=f"CSV inválido: {exc.diag.message_primary}")
+    except psycopg2.DataError as exc:
+        raise HTTPException(status_code=400, detail=f"Valor inválido no arquivo: {exc.diag.message_primary}")
+    finally:
+        conn.close()
+
+
+# ==================== AGENDAMENTOS ====================
+
+def _merge_appointments(cur):
+    cur.execute(
+        """
+        CREATE TEMP TABLE import_valid ON COMMIT DROP AS
+        WITH rows AS (
+            SELECT line,
+                   NULLIF(btrim(name), '')  AS name,
+                   NULLIF(btrim(phone), '') AS phone,
+                   NULLIF(btrim(email), '') AS email,
+                   NULLIF(btrim(service), '') AS service,
+                   NULLIF(btrim(service_id), '') AS service_id,
+                   btrim(date) AS date_text,
+                   btrim(start_time) AS start_time_text,
+                   COALESCE(NULLIF(lower(btrim(status)), ''), 'pending') AS status,
+                   COALESCE(NULLIF(btrim(channel), ''), 'import') AS channel,
+                   NULLIF(btrim(notes), '') AS notes
+            FROM import_rows
+        ), parsed AS (
+            -- O regex fixa o formato; try_date/try_time (migração 0012) devolvem
+            -- NULL para valores impossíveis (2024-02-30, 25:00) sem abortar o lote
+            SELECT r.*,
+                   CASE WHEN r.date_text ~ '^\\d{4}-\\d{2}-\\d{2}$' THEN try_date(r.date_text) END AS date,
+                   CASE WHEN r.start_time_text ~ '^\\d{1,2}:\\d{2}(:\\d{2})?$' THEN try_time(r.start_time_text) END AS start_time
+            FROM rows r
+        )
+        SELECT r.line, r.name, r.phone, r.email, s.id AS service_id,
+               r.date, r.start_time,
+               r.status, r.channel, r.notes,
+               CASE
+                   WHEN r.phone IS NULL THEN 'telefone vazio'
+                   WHEN r.date IS NULL THEN 'data inválida (use AAAA-MM-DD)'
+                   WHEN r.start_time IS NULL THEN 'horário inválido (use HH:MM)'
+                   WHEN s.id IS NULL THEN 'serviço não encontrado'
+                   WHEN r.status NOT IN %s THEN 'status inválido'
+               END AS error
+        FROM parsed r
+        LEFT JOIN LATERAL (
+            SELECT id
+            FROM services
+            WHERE id = CASE WHEN r.service_id ~ '^\\d+$' THEN try_int(r.service_id) END
+               OR (r.service_id IS NULL AND lower(name) = lower(r.service))
+            ORDER BY id
+            LIMIT 1
+        ) s ON true
+        """,
+        (APPOINTMENT_STATUSES,),
+    )
+
+    cur.execute(
+        """
+        WITH upserted AS (
+            INSERT INTO customers (name, phone, email, channel)
+            SELECT DISTINCT ON (phone) name, phone, email, channel
+            FROM import_valid
+            WHERE error IS NULL
+            ORDER BY phone, line DESC
+            ON CONFLICT (phone) DO UPDATE
+            SET name = COALESCE(customers.name, EXCLUDED.name),
+                email = COALESCE(customers.email, EXCLUDED.email),
+                updated_at = NOW()
+            WHERE (customers.name IS NULL AND EXCLUDED.name IS NOT NULL)
+               OR (customers.email IS NULL AND EXCLUDED.email IS NOT NULL)
+            RETURNING (xmax = 0) AS created
+        )
+        SELECT COUNT(*) FILTER (WHERE created) AS created,
+               COUNT(*) FILTER (WHERE NOT created) AS updated
+        FROM upserted
+        """
+    )
+    customers = cur.fetchone()
+
+    # Já importado (mesmo cliente, serviço, dia e hora) ou conflito com a
+    # constraint appointments_no_overlap: a linha é pulada, não derruba o lote
+    cur.execute(
+        """
+        WITH inserted AS (
+            INSERT INTO appointments (customer_id, service_id, date, start_time, status, channel, notes)
+            SELECT c.id, v.service_id, v.date, v.start_time, v.status, v.channel, v.notes
+            FROM import_valid v
+            JOIN customers c ON c.phone = v.phone
+            WHERE v.error IS NULL
+              AND NOT EXISTS (
+                  SELECT 1
+                  FROM appointments a
+                  WHERE a.customer_id = c.id
+                    AND a.date = v.date
+                    AND a.start_time = v.start_time
+                    AND a.service_id = v.service_id
+              )
+            ORDER BY v.line
+            ON CONFLICT DO NOTHING
+            RETURNING 1
+        )
+        SELECT
+            (SELECT COUNT(*) FROM inserted) AS created,
+            (SELECT COUNT(*) FROM import_valid) AS total,
+            (SELECT COUNT(*) FROM import_valid WHERE error IS NOT NULL) AS invalid
+        """
+    )
+    counts = cur.fetchone()
+
+    return {
+        "rows": counts["total"],
+        "appointments_created": counts["created"],
+        "skipped": counts["total"] - counts["invalid"] - counts["created"],
+        "customers_created": customers["created"],
+        "customers_updated": customers["updated"],
+        "error_count": counts["invalid"],
+        "errors": collect_errors(cur, "import_valid"),
+    }
+
+
+def import_appointments(stream):
+    """
+    CSV com phone, date (AAAA-MM-DD), start_time (HH:MM) e service (nome) ou service_id;
+    opcionais: name, email, status, channel, notes. Cria/completa os clientes pelo telefone.
+    """
+    return run_import(
+        stream,
+        APPOINTMENT_COLUMNS,
+        [("phone",), ("date",), ("start_time",), ("service", "service_id")],
+        _merge_appointments,
+    )
+
+
+def appointments_export_query(filters):
+    where = ["TRUE"]
+    params = []
+    if filters["date_from"]:
+        where.append("a.date >= %s")
+        params.append(filters["date_from"])
+    if filters["date_to"]:
+        where.append("a.date <= %s")
+        params.append(filters["date_to"])
+    for column in ("status", "channel", "service_id", "customer_id"):
+        if filters[column] is not None:
+            where.append(f"a.{column} = %s")
+            params.append(filters[column])
+
+    query = f"""
+        SELECT a.id, c.name, c.phone, c.email, s.name, a.service_id,
+               a.date, to_char(a.start_time, 'HH24:MI'), a.duration_minutes,
+               a.status, a.channel, a.notes
+        FROM appointments a
+        JOIN customers c ON c.id = a.customer_id
+        JOIN services  s ON s.id = a.service_id
+        WHERE {" AND ".join(where)}
+        ORDER BY a.date, a.start_time, a.id
+    """
+    return query, params
+
+
+# ==================== CLIENTES ====================
+
+def _merge_customers(cur):
+    cur.execute(
+        """
+        CREATE TEMP TABLE import_valid ON COMMIT DROP AS
+        SELECT line,
+               NULLIF(btrim(name), '')  AS name,
+               NULLIF(btrim(phone), '') AS phone,
+               NULLIF(btrim(email), '') AS email,
+               NULLIF(btrim(channel), '') AS channel,
+               CASE
+                   WHEN NULLIF(btrim(is_blocked), '') IS NULL THEN NULL
+                   ELSE lower(btrim(is_blocked)) IN %s
+               END AS is_blocked,
+               NULLIF(btrim(blocked_reason), '') AS blocked_reason,
+               CASE WHEN NULLIF(btrim(phone), '') IS NULL THEN 'telefone vazio' END AS error
+        FROM import_rows
+        """,
+        (TRUE_VALUES,),
+    )
+    # O arquivo manda nos campos preenchidos; vazio mantém o que já existe
+    cur.execute(
+        """
+        WITH latest AS (
+            SELECT DISTINCT ON (phone) *
+            FROM import_valid
+            WHERE error IS NULL
+            ORDER BY phone, line DESC
+        ), updated AS (
+            UPDATE customers c
+            SET name = COALESCE(v.name, c.name),
+                email = COALESCE(v.email, c.email),
+                is_blocked = COALESCE(v.is_blocked, c.is_blocked),
+                blocked_reason = COALESCE(v.blocked_reason, c.blocked_reason),
+                updated_at = NOW()
+            FROM latest v
+            WHERE c.phone = v.phone
+            RETURNING c.phone
+        ), created AS (
+            INSERT INTO customers (name, phone, email, channel, is_blocked, blocked_reason)
+            SELECT v.name, v.phone, v.email, COALESCE(v.channel, 'import'),
+                   COALESCE(v.is_blocked, false), v.blocked_reason
+            FROM latest v
+            WHERE NOT EXISTS (SELECT 1 FROM updated u WHERE u.phone = v.phone)
+            ON CONFLICT (phone) DO NOTHING
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM created) AS created,
+               (SELECT COUNT(*) FROM updated) AS updated,
+               (SELECT COUNT(*) FROM import_valid) AS total,
+               (SELECT COUNT(*) FROM import_valid WHERE error IS NOT NULL) AS invalid
+        """
+    )
+    counts = cur.fetchone()
+    return {
+        "rows": counts["total"],
+        "customers_created": counts["created"],
+        "customers_updated": counts["updated"],
+        "skipped": counts["total"] - counts["invalid"] - counts["created"] - counts["updated"],
+        "error_count": counts["invalid"],
+        "errors": collect_errors(cur, "import_valid"),
+    }
+
+
+def import_customers(stream):
+    """CSV com phone; opcionais: name, email, channel, is_blocked (sim/não, true/false), blocked_reason"""
+    return run_import(stream, CUSTOMER_COLUMNS, [("phone",)], _merge_customers)
+
+
+def customers_export_query(filters):
+    where = ["TRUE"]
+    params = []
+    if filters["is_blocked"] is not None:
+        where.append("c.is_blocked = %s")
+        params.append(filters["is_blocked"])
+    query = f"""
+        SELECT c.id, c.name, c.phone, c.email, c.channel, c.is_blocked, c.blocked_reason,
+               c.total_appointments, c.last_appointment_date
+        FROM customers c
+        WHERE {" AND ".join(where)}
+        ORDER BY c.id
+    """
+    return query, params
+
+
+# ==================== EXPORTAÇÃO ====================
+
+def stream_csv(query, params, header):
+    """
+    Gerador de blocos CSV. A conexão é pega já aqui (erro de pool vira resposta
+    normal, antes do streaming começar) e devolvida quando o gerador termina.
+    """
+    conn = get_connection(cursor_factory=extensions.cursor, autocommit=False)
+
+    def generate():
+        try:
+            # cursor nomeado: o Postgres entrega EXPORT_ITERSIZE linhas por vez
+            with conn.cursor(name="csv_export") as cur:
+                cur.itersize = EXPORT_ITERSIZE
+                cur.execute(query, params)
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(header)
+                for row in cur:
+                    writer.writerow(row)
+                    if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate()
+                yield buffer.getvalue()
+        finally:
+            conn.close()
+
+    return generate()
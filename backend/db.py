@@ -1,4 +1,9 @@
+import os
+import threading
+import time
+
 import psycopg2
+from psycopg2 import extensions, pool
 from psycopg2.extras import RealDictCursor
 
 DB_CONFIG = {
@@ -9,10 +14,241 @@ DB_CONFIG = {
     "password": "003289"
 }
 
-def get_connection():
-    conn = psycopg2.connect(
-        cursor_factory=RealDictCursor,
-        **DB_CONFIG
-    )
-    conn.autocommit = True
+# "sync" (psycopg2 + threadpool) ou "async" (asyncpg, ver db_async.py)
+DB_MODE = os.getenv("PRISYSTEM_DB_MODE", "sync")
+
+# Pool de conexões compartilhado pelo processo inteiro
+POOL_CONFIG = {
+    "min_size": 2,
+    "max_size": 10,
+    "checkout_timeout": 10,        # segundos esperando uma conexão livre
+    "health_check_after": 30,      # segundos ociosa antes de testar com SELECT 1
+}
+
+
+class PoolTimeoutError(pool.PoolError):
+    """Nenhuma conexão ficou livre dentro do checkout_timeout"""
+
+
+class ConnectionPool:
+    """
+    Pool thread-safe de conexões psycopg2.
+    - Mantém entre min_size e max_size conexões abertas.
+    - Testa conexões ociosas há muito tempo antes de entregá-las.
+    - Bloqueia até checkout_timeout quando todas estão em uso.
+    """
+
+    def __init__(self, min_size, max_size, checkout_timeout, health_check_after, **conn_kwargs):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self._conn_kwargs = conn_kwargs
+        self._cond = threading.Condition()
+        self._idle = []           # [(conn, momento em que foi devolvida)]
+        self._in_use = set()
+        self._closed = False
+
+        # métricas
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(cursor_factory=RealDictCursor, **self._conn_kwargs)
+        conn.autocommit = True
+        return conn
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._discarded += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise pool.PoolError("Pool de conexões fechado")
+
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    break
+
+                if len(self._in_use) < self.max_size:
+                    conn, idle_since = None, None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"Nenhuma conexão livre após {self.checkout_timeout}s "
+                        f"({len(self._in_use)}/{self.max_size} em uso)"
+                    )
+                self._cond.wait(remaining)
+
+            # reserva a vaga antes de sair do lock (connect/health check rodam fora dele)
+            placeholder = object()
+            self._in_use.add(placeholder)
+
+        try:
+            if conn is not None and not self._is_healthy(conn, idle_since):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use.discard(placeholder)
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self._in_use.discard(placeholder)
+            self._in_use.add(conn)
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def putconn(self, conn):
+        reusable = not conn.closed
+        if reusable:
+            try:
+                # desfaz transação esquecida aberta e volta aos padrões do pool
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                conn.autocommit = True
+                conn.cursor_factory = RealDictCursor
+            except psycopg2.Error:
+                reusable = False
+
+        with self._cond:
+            self._in_use.discard(conn)
+            if reusable and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                conn.close()
+            self._idle.clear()
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "wait_avg_ms": round(self._wait_total / self._checkouts * 1000, 2) if self._checkouts else 0.0,
+                "wait_max_ms": round(self._wait_max * 1000, 2),
+            }
+
+
+class PooledConnection:
+    """
+    Conexão emprestada do pool. Se comporta como a conexão psycopg2,
+    mas close() devolve ao pool em vez de encerrar o socket.
+    """
+
+    def __init__(self, conn_pool, conn):
+        self._pool = conn_pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise pool.PoolError("Conexão já devolvida ao pool")
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name in ("_pool", "_conn"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.putconn(conn)
+
+    def __del__(self):
+        # rede de segurança para quem esquece o close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_pool():
+    """Cria o pool (chamado no startup do app; idempotente)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(**POOL_CONFIG, **DB_CONFIG)
+    return _pool
+
+
+def close_pool():
+    """Fecha todas as conexões ociosas (chamado no shutdown do app)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def pool_stats():
+    if _pool is None:
+        return None
+    return _pool.stats()
+
+
+def get_connection(cursor_factory=RealDictCursor, autocommit=True):
+    conn_pool = _pool or init_pool()
+    conn = PooledConnection(conn_pool, conn_pool.getconn())
+    conn.cursor_factory = cursor_factory
+    conn.autocommit = autocommit
     return conn
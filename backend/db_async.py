@@ -0,0 +1,229 @@
+"""
+Camada de acesso assíncrona (asyncpg) usada quando DB_MODE = "async".
+Espelha as consultas dos routers síncronos para podermos comparar os dois caminhos.
+"""
+import itertools
+import json
+import re
+
+import asyncpg
+
+from db import DB_CONFIG, POOL_CONFIG
+
+# Timeout padrão (segundos) de cada consulta; pode ser sobrescrito por chamada
+QUERY_TIMEOUT = 5
+
+_pool = None
+
+
+async def init_pool():
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            host=DB_CONFIG["host"],
+            port=DB_CONFIG["port"],
+            database=DB_CONFIG["dbname"],
+            user=DB_CONFIG["user"],
+            password=DB_CONFIG["password"],
+            min_size=POOL_CONFIG["min_size"],
+            max_size=POOL_CONFIG["max_size"],
+            max_inactive_connection_lifetime=300,
+            command_timeout=QUERY_TIMEOUT,
+        )
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def pool_stats():
+    if _pool is None:
+        return None
+    return {
+        "min_size": _pool.get_min_size(),
+        "max_size": _pool.get_max_size(),
+        "size": _pool.get_size(),
+        "idle": _pool.get_idle_size(),
+        "in_use": _pool.get_size() - _pool.get_idle_size(),
+    }
+
+
+async def fetch(query, *args, timeout=QUERY_TIMEOUT):
+    pool = _pool or await init_pool()
+    async with pool.acquire(timeout=POOL_CONFIG["checkout_timeout"]) as conn:
+        rows = await conn.fetch(query, *args, timeout=timeout)
+    return [dict(r) for r in rows]
+
+
+async def fetchrow(query, *args, timeout=QUERY_TIMEOUT):
+    pool = _pool or await init_pool()
+    async with pool.acquire(timeout=POOL_CONFIG["checkout_timeout"]) as conn:
+        row = await conn.fetchrow(query, *args, timeout=timeout)
+    return dict(row) if row else None
+
+
+def positional(query):
+    """Converte placeholders %s (psycopg2) em $1, $2... (asyncpg) para reaproveitar SQL dos routers"""
+    counter = itertools.count(1)
+    return re.sub(r"%s", lambda _: f"${next(counter)}", query)
+
+
+# ==================== AGENDAMENTOS ====================
+
+async def create_appointment(name, phone, email, service_id, date, start_time, duration, channel):
+    """
+    Retorna (customer_id, is_blocked, appointment_id); appointment_id é None se bloqueado.
+    Mesmo comando único do routers/appointments.CREATE_APPOINTMENT_SQL; a duração
+    vem de check_slot, que já validou serviço e horário de funcionamento.
+    """
+    pool = _pool or await init_pool()
+    async with pool.acquire(timeout=POOL_CONFIG["checkout_timeout"]) as conn:
+        row = await conn.fetchrow(
+            """
+            WITH upserted AS (
+                INSERT INTO customers (name, phone, email, channel)
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT (phone) DO UPDATE
+                SET email = COALESCE(customers.email, EXCLUDED.email)
+                WHERE NOT customers.is_blocked
+                RETURNING id, is_blocked
+            ), customer AS (
+                SELECT id, is_blocked FROM upserted
+                UNION ALL
+                SELECT id, is_blocked
+                FROM customers
+                WHERE phone = $2
+                  AND NOT EXISTS (SELECT 1 FROM upserted)
+            ), appointment AS (
+                INSERT INTO appointments (
+                    customer_id, service_id, date, start_time, duration_minutes,
+                    status, channel, notes, created_by
+                )
+                SELECT id, $5, $6, $7, $8, 'pending', $4, 'Criado via API', NULL
+                FROM customer
+                WHERE NOT is_blocked
+                RETURNING id
+            )
+            SELECT c.id AS customer_id,
+                   c.is_blocked,
+                   (SELECT id FROM appointment) AS appointment_id
+            FROM customer c
+            """,
+            name, phone, email, channel, service_id, date, start_time, duration,
+            timeout=QUERY_TIMEOUT,
+        )
+    if row is None:
+        # Bloqueado numa corrida com um cadastro concorrente (ver CREATE_APPOINTMENT_SQL)
+        return None, True, None
+    return row["customer_id"], row["is_blocked"], row["appointment_id"]
+
+
+# ==================== CLIENTES ====================
+
+async def get_customer(customer_id):
+    return await fetchrow(
+        """
+        SELECT id, name, phone, email, is_blocked, blocked_reason
+        FROM customers
+        WHERE id = $1
+        """,
+        customer_id,
+    )
+
+
+async def update_block_status(customer_id, is_blocked, blocked_reason):
+    return await fetchrow(
+        """
+        UPDATE customers
+        SET is_blocked = $1,
+            blocked_reason = $2,
+            updated_at = NOW()
+        WHERE id = $3
+        RETURNING id, name, phone, is_blocked, blocked_reason
+        """,
+        is_blocked, blocked_reason, customer_id,
+    )
+
+
+# ==================== CONFIGURAÇÕES ====================
+
+async def get_chatbot_settings():
+    return await fetchrow(
+        """
+        SELECT id,
+               active_bot_type,
+               welcome_message,
+               closing_message,
+               business_open_hour,
+               business_close_hour,
+               timezone,
+               notes
+        FROM chatbot_settings
+        ORDER BY id
+        LIMIT 1
+        """
+    )
+
+
+# ==================== DASHBOARD ====================
+
+async def dashboard_stats(today):
+    pool = _pool or await init_pool()
+    async with pool.acquire(timeout=POOL_CONFIG["checkout_timeout"]) as conn:
+        # Contadores + próximos agendamentos numa única ida ao banco
+        row = await conn.fetchrow(
+            """
+            WITH ap AS (
+                SELECT COUNT(*) AS appointments_today,
+                       COUNT(*) FILTER (WHERE status = 'pending') AS pending_today,
+                       COUNT(*) FILTER (WHERE status = 'confirmed') AS confirmed_today
+                FROM appointments
+                WHERE date = $1
+            ), cu AS (
+                SELECT COUNT(*) AS total_customers,
+                       COUNT(*) FILTER (WHERE is_blocked = true) AS blocked_customers
+                FROM customers
+            )
+            SELECT ap.*,
+                   cu.*,
+                   (
+                       SELECT COALESCE(json_agg(n ORDER BY n.start_time), '[]'::json)
+                       FROM (
+                           SELECT
+                               a.id,
+                               a.start_time,
+                               c.name as customer_name,
+                               c.phone as customer_phone,
+                               s.name as service_name,
+                               a.status
+                           FROM appointments a
+                           LEFT JOIN customers c ON c.id = a.customer_id
+                           LEFT JOIN services s ON s.id = a.service_id
+                           WHERE a.date = $1
+                           ORDER BY a.start_time ASC
+                           LIMIT 5
+                       ) n
+                   ) AS next_appointments
+            FROM ap CROSS JOIN cu
+            """,
+            today, timeout=QUERY_TIMEOUT,
+        )
+        stats = dict(row)
+        # asyncpg devolve json como texto
+        stats["next_appointments"] = json.loads(stats["next_appointments"])
+
+        stats["chatbot_status"] = "none"
+        try:
+            status_row = await conn.fetchrow(
+                "SELECT active_mode FROM settings WHERE key = 'chatbot' LIMIT 1", timeout=QUERY_TIMEOUT)
+            if status_row and status_row["active_mode"]:
+                stats["chatbot_status"] = status_row["active_mode"]
+        except asyncpg.PostgresError:
+            # Se não existir a tabela ou coluna, ignora
+            pass
+
+    return stats
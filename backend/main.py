@@ -1,10 +1,62 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
-from routers import appointments, customers, settings, chatbot, dashboard, chatbot_messages, whatsapp
+
+import db
+import media_store
+from routers import appointments, customers, settings, chatbot, dashboard, chatbot_messages, whatsapp, media, services, reminders
 
 app = FastAPI(title="PriSystem API")
 
+
+@app.on_event("startup")
+async def open_db_pool():
+    # Pool único de conexões reaproveitado por todos os routers
+    db.init_pool()
+    if db.DB_MODE == "async":
+        import db_async
+        await db_async.init_pool()
+
+
+@app.on_event("startup")
+async def boot_bot_supervisor():
+    # Encerra bot órfão de execução anterior e relança se ele deveria estar rodando
+    await whatsapp.supervisor.boot()
+
+
+@app.on_event("shutdown")
+async def stop_bot_supervisor():
+    await whatsapp.supervisor.shutdown()
+
+
+@app.on_event("startup")
+async def start_reminder_scheduler():
+    # Enfileira os lembretes dos próximos agendamentos; o bot entrega
+    reminders.scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_reminder_scheduler():
+    await reminders.scheduler.stop()
+
+
+@app.on_event("shutdown")
+async def close_db_pool():
+    db.close_pool()
+    if db.DB_MODE == "async":
+        import db_async
+        await db_async.close_pool()
+
+
+@app.exception_handler(db.PoolTimeoutError)
+def pool_timeout_handler(request: Request, exc: db.PoolTimeoutError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Banco de dados ocupado, tente novamente em instantes."}
+    )
+
+
 # CORS pode manter ou remover, já que agora tudo vem da mesma origem
 origins = [
     "http://127.0.0.1:8000",
@@ -18,7 +70,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 413 para upload de mídia grande demais antes do multipart ser lido
+app.add_middleware(media_store.UploadLimitMiddleware, paths=["/chatbot-messages/upload-media"])
+
 # Routers da API PRIMEIRO (antes do mount de static)
+if db.DB_MODE == "async":
+    # Registrado antes dos síncronos para assumir as mesmas rotas
+    from routers import async_api
+    app.include_router(async_api.router)
+
 app.include_router(appointments.router)
 app.include_router(customers.router)
 app.include_router(settings.router)
@@ -26,10 +86,23 @@ app.include_router(chatbot.router)
 app.include_router(dashboard.router)
 app.include_router(chatbot_messages.router)
 app.include_router(whatsapp.router)
+app.include_router(media.router)
+app.include_router(services.router)
+app.include_router(reminders.router)
 
 @app.get("/api")
 def root():
     return {"message": "PriSystem API online"}
 
+
+@app.get("/api/db-pool")
+def db_pool_stats():
+    """Métricas do pool de conexões (em uso, ociosas, tempo de espera)"""
+    stats = {"mode": db.DB_MODE, "sync": db.pool_stats()}
+    if db.DB_MODE == "async":
+        import db_async
+        stats["async"] = db_async.pool_stats()
+    return stats
+
 # Servir arquivos estáticos (HTML, CSS, JS) por último
 app.mount("/", StaticFiles(directory="../painel", html=True), name="painel")
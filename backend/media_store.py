@@ -0,0 +1,297 @@
+"""
+Armazenamento das mídias do chatbot endereçado por conteúdo (SHA-256).
+- O upload é copiado em blocos para disco fora do event loop, com limite de tamanho.
+  O UploadLimitMiddleware recusa o corpo grande demais com 413 antes do multipart
+  ser lido e gravado no arquivo temporário do Starlette.
+- A chave é só o hash: conteúdo repetido reaproveita o arquivo que já existe, seja
+  qual for a extensão enviada. A extensão gravada vem do tipo detectado nos bytes.
+- Nome original, tipo e tamanho ficam na tabela media_files (migração 0011).
+- Arquivos que nenhuma mensagem ativa referencia são removidos pelo collect_garbage().
+"""
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from db import get_connection
+
+UPLOAD_DIR = Path(__file__).parent / "uploads" / "chatbot"
+TMP_DIR = UPLOAD_DIR / ".tmp"
+URL_PREFIX = "/uploads/chatbot/"
+
+MAX_UPLOAD_BYTES = int(os.getenv("PRISYSTEM_MAX_UPLOAD_MB", "50")) * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+# Boundaries e cabeçalhos das partes do multipart em volta do arquivo
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Assinaturas (prefixo, deslocamento) -> (mime, extensão); as mesmas extensões que o bot conhece
+SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", 0, "image/png", ".png"),
+    (b"\xff\xd8\xff", 0, "image/jpeg", ".jpg"),
+    (b"GIF87a", 0, "image/gif", ".gif"),
+    (b"GIF89a", 0, "image/gif", ".gif"),
+    (b"%PDF-", 0, "application/pdf", ".pdf"),
+    (b"OggS", 0, "audio/ogg", ".ogg"),
+    (b"ID3", 0, "audio/mpeg", ".mp3"),
+    (b"ftyp", 4, "video/mp4", ".mp4"),
+]
+
+# Zip e OLE (Office) dependem da extensão declarada para saber o tipo exato
+ZIP_TYPES = {
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+OLE_TYPES = {".doc": "application/msword", ".xls": "application/vnd.ms-excel"}
+
+# Arquivos mais novos que isso não são coletados: o editor faz upload antes de salvar o fluxo
+GC_GRACE_SECONDS = 60 * 60
+
+
+def _too_large():
+    return HTTPException(
+        status_code=413,
+        detail=f"Arquivo maior que o limite de {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+    )
+
+
+class UploadLimitMiddleware:
+    """
+    Limite de tamanho aplicado no corpo da requisição, antes do form ser montado:
+    Content-Length acima do limite responde 413 sem ler nada; sem Content-Length
+    (chunked), a contagem é feita enquanto o corpo chega e para no primeiro bloco
+    que passa do limite.
+    """
+
+    def __init__(self, app, paths, max_body=MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_body:
+            error = _too_large()
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # HTTPException atravessa o parser do corpo do FastAPI e vira 413
+                    raise _too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _write_chunks(src, dst_path):
+    """Copia o upload em blocos calculando o hash; roda numa thread do pool"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(dst_path, "wb") as dst:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise ValueError("too_large")
+            digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigest(), size
+
+
+def sniff_type(path, declared_ext):
+    """(mime, extensão normalizada) pelos primeiros bytes; a extensão enviada só desempata"""
+    with open(path, "rb") as f:
+        head = f.read(16)
+
+    for prefix, offset, mime, ext in SIGNATURES:
+        if head[offset:offset + len(prefix)] == prefix:
+            return mime, ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    if head[:2] == b"\xff\xfb" or head[:2] == b"\xff\xf3" or head[:2] == b"\xff\xf2":
+        return "audio/mpeg", ".mp3"
+    if head[:4] == b"PK\x03\x04":
+        if declared_ext in ZIP_TYPES:
+            return ZIP_TYPES[declared_ext], declared_ext
+        return "application/zip", ".zip"
+    if head[:4] == b"\xd0\xcf\x11\xe0":
+        ext = declared_ext if declared_ext in OLE_TYPES else ".doc"
+        return OLE_TYPES[ext], ext
+    if declared_ext == ".txt":
+        return "text/plain", ".txt"
+    return "application/octet-stream", ".bin"
+
+
+def _existing_name(sha256):
+    """Arquivo gravado antes da tabela media_files (sha256 + extensão enviada)"""
+    for path in UPLOAD_DIR.glob(f"{sha256}.*"):
+        if path.is_file():
+            return path.name
+    return None
+
+
+def _register(sha256, stored_name, mime_type, size, original_name):
+    """Registra (ou renova) o arquivo; devolve o nome já gravado se o hash existia"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO media_files (sha256, stored_name, mime_type, size, original_name)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (sha256) DO UPDATE
+                SET last_uploaded_at = NOW()
+                RETURNING stored_name, mime_type, original_name
+            """, (sha256, stored_name, mime_type, size, original_name))
+            return cur.fetchone()
+    finally:
+        conn.close()
+
+
+def _forget(stored_names):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM media_files WHERE stored_name = ANY(%s)", (list(stored_names),))
+    finally:
+        conn.close()
+
+
+async def save_upload(file: UploadFile):
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    TMP_DIR.mkdir(exist_ok=True)
+
+    tmp_path = TMP_DIR / f"{uuid.uuid4()}.part"
+    try:
+        sha256, size = await run_in_threadpool(_write_chunks, file.file, tmp_path)
+    except ValueError:
+        tmp_path.unlink(missing_ok=True)
+        raise _too_large()
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    try:
+        declared_ext = os.path.splitext(file.filename or "")[1].lower()
+        mime_type, ext = await run_in_threadpool(sniff_type, tmp_path, declared_ext)
+        stored_name = await run_in_threadpool(_existing_name, sha256) or f"{sha256}{ext}"
+        row = await run_in_threadpool(_register, sha256, stored_name, mime_type, size, file.filename)
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    stored_name = row["stored_name"]
+    final_path = UPLOAD_DIR / stored_name
+
+    duplicate = final_path.exists()
+    if duplicate:
+        tmp_path.unlink(missing_ok=True)
+        # renova o mtime para o arquivo não ser coletado antes do fluxo ser salvo
+        os.utime(final_path)
+    else:
+        os.replace(tmp_path, final_path)
+
+    return {
+        "filename": stored_name,
+        "original_name": file.filename,
+        "url": f"{URL_PREFIX}{stored_name}",
+        "mime_type": row["mime_type"],
+        "size": size,
+        "sha256": sha256,
+        "duplicate": duplicate,
+    }
+
+
+def reference_counts():
+    """Quantas mensagens ativas apontam para cada arquivo"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT substring(media_url FROM %s) AS filename, COUNT(*) AS refs
+                FROM chatbot_messages
+                WHERE is_active = true
+                  AND media_url LIKE %s
+                GROUP BY 1
+            """, (f"^{URL_PREFIX}(.+)$", f"{URL_PREFIX}%"))
+            return {row["filename"]: row["refs"] for row in cur.fetchall()}
+    finally:
+        conn.close()
+
+
+def media_metadata():
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT stored_name, mime_type, original_name FROM media_files")
+            return {row["stored_name"]: row for row in cur.fetchall()}
+    finally:
+        conn.close()
+
+
+def list_media():
+    refs = reference_counts()
+    metadata = media_metadata()
+    files = []
+    if UPLOAD_DIR.exists():
+        for path in sorted(UPLOAD_DIR.iterdir()):
+            if path.is_file():
+                meta = metadata.get(path.name) or {}
+                files.append({
+                    "filename": path.name,
+                    "original_name": meta.get("original_name"),
+                    "mime_type": meta.get("mime_type"),
+                    "url": f"{URL_PREFIX}{path.name}",
+                    "size": path.stat().st_size,
+                    "refs": refs.get(path.name, 0),
+                })
+    return files
+
+
+def collect_garbage(grace_seconds=GC_GRACE_SECONDS):
+    """Remove arquivos sem referência (e uploads temporários abandonados)"""
+    if not UPLOAD_DIR.exists():
+        return {"removed": [], "freed_bytes": 0}
+
+    refs = reference_counts()
+    cutoff = time.time() - grace_seconds
+    removed = []
+    freed = 0
+
+    candidates = [p for p in UPLOAD_DIR.iterdir() if p.is_file()]
+    if TMP_DIR.exists():
+        candidates += [p for p in TMP_DIR.iterdir() if p.is_file()]
+
+    for path in candidates:
+        if path.parent == UPLOAD_DIR and refs.get(path.name, 0) > 0:
+            continue
+        stat = path.stat()
+        if stat.st_mtime > cutoff:
+            continue
+        try:
+            path.unlink()
+            removed.append(path.name)
+            freed += stat.st_size
+        except OSError as e:
+            print(f"⚠️ Não foi possível remover {path}: {e}")
+
+    if removed:
+        _forget(removed)
+        print(f"🗑️ {len(removed)} mídia(s) órfã(s) removida(s), {freed} bytes liberados")
+    return {"removed": removed, "freed_bytes": freed}
@@ -0,0 +1,264 @@
+"""
+Migrações versionadas do banco (arquivos backend/migrations/NNNN_nome.sql).
+
+Uso (de dentro de backend/):
+    python migrate.py status   # lista migrações aplicadas e pendentes
+    python migrate.py apply    # aplica as pendentes, em ordem, uma transação por arquivo
+    python migrate.py check --dsn postgresql://.../scratch
+                               # EXPLAIN das consultas quentes sobre dados semeados
+
+O check semeia ~125 mil linhas (com ROLLBACK no fim, mas disparando triggers,
+travando tabelas e consumindo sequences), então só roda num banco descartável:
+--dsn ou PRISYSTEM_SCRATCH_DSN, nunca o DB_CONFIG da aplicação. --dsn também
+vale para status/apply (ex.: preparar o banco descartável antes do check).
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+import psycopg2
+
+from db import DB_CONFIG
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+MIGRATION_FILE = re.compile(r"^(\d{4})_(.+)\.sql$")
+
+SCRATCH_DSN_ENV = "PRISYSTEM_SCRATCH_DSN"
+
+# Chave arbitrária do pg_advisory_lock para não rodar dois "apply" ao mesmo tempo
+LOCK_KEY = 720260218
+
+
+def discover():
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        match = MIGRATION_FILE.match(path.name)
+        if not match:
+            continue
+        sql = path.read_text(encoding="utf-8")
+        migrations.append({
+            "version": match.group(1),
+            "name": match.group(2),
+            "sql": sql,
+            "checksum": hashlib.sha256(sql.encode("utf-8")).hexdigest(),
+        })
+    return migrations
+
+
+def ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     VARCHAR(4) PRIMARY KEY,
+            name        TEXT NOT NULL,
+            checksum    CHAR(64) NOT NULL,
+            applied_at  TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+
+
+def applied_versions(cur):
+    cur.execute("SELECT version, checksum FROM schema_migrations")
+    return dict(cur.fetchall())
+
+
+def status(conn):
+    with conn, conn.cursor() as cur:
+        ensure_table(cur)
+        applied = applied_versions(cur)
+
+    pending = 0
+    for m in discover():
+        checksum = applied.get(m["version"])
+        if checksum is None:
+            label = "pendente"
+            pending += 1
+        elif checksum != m["checksum"]:
+            label = "aplicada (ARQUIVO ALTERADO depois de aplicado!)"
+        else:
+            label = "aplicada"
+        print(f"  {m['version']}  {m['name']:<30} {label}")
+    print(f"\n{pending} migração(ões) pendente(s)")
+    return 0
+
+
+def apply(conn):
+    with conn, conn.cursor() as cur:
+        ensure_table(cur)
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+    conn.commit()
+    try:
+        with conn, conn.cursor() as cur:
+            applied = applied_versions(cur)
+
+        for m in discover():
+            if m["version"] in applied:
+                continue
+            print(f"▶️  Aplicando {m['version']}_{m['name']}...")
+            with conn, conn.cursor() as cur:
+                cur.execute(m["sql"])
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                    (m["version"], m["name"], m["checksum"]),
+                )
+        print("✅ Banco atualizado")
+        return 0
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+        conn.commit()
+
+
+# ==================== CHECK DE PLANOS ====================
+
+# Volume suficiente para o planner preferir índice quando ele existe.
+# Roda dentro de uma transação que sempre sofre ROLLBACK.
+SEED_SQL = """
+    INSERT INTO services (name, duration_minutes)
+    SELECT 'Serviço seed ' || g, 60 FROM generate_series(1, 30) g;
+
+    INSERT INTO customers (name, phone, channel)
+    SELECT 'Cliente seed ' || g, 'seed' || lpad(g::text, 8, '0'), 'seed'
+    FROM generate_series(1, 20000) g
+    ON CONFLICT (phone) DO NOTHING;
+
+    -- allow_overlap: o seed empilha vários agendamentos no mesmo horário
+    INSERT INTO appointments (customer_id, service_id, date, start_time, status, channel, allow_overlap)
+    SELECT c.id,
+           (SELECT MAX(id) FROM services),
+           CURRENT_DATE + (g % 730) - 365,
+           make_time(8 + g % 10, 0, 0),
+           'pending',
+           'seed',
+           true
+    FROM generate_series(1, 100000) g
+    JOIN customers c ON c.phone = 'seed' || lpad((1 + g % 20000)::text, 8, '0');
+
+    INSERT INTO chatbot_messages (order_position, message_text, is_active)
+    SELECT g, 'seed', g <= 50 FROM generate_series(1, 5000) g;
+
+    ANALYZE customers;
+    ANALYZE services;
+    ANALYZE appointments;
+    ANALYZE chatbot_messages;
+"""
+
+
+def hot_queries(cur):
+    """(descrição, tabela que não pode ter Seq Scan, sql, params)"""
+    from routers import appointments, customers
+
+    cur.execute("SELECT id FROM customers WHERE phone = 'seed00012345'")
+    customer_id = cur.fetchone()[0]
+
+    day_query, day_params = appointments.build_list_query({
+        "date": date.today(), "date_from": None, "date_to": None,
+        "status": None, "channel": None, "service_id": None, "customer_id": None,
+        "cursor": None, "limit": 50,
+    })
+    customers_query, customers_params = customers.build_list_query(
+        {"q": None, "cursor": None, "limit": 50}
+    )
+    search_query, search_params = customers.build_list_query(
+        {"q": "seed0001234", "cursor": None, "limit": 50}
+    )
+
+    return [
+        ("customers.phone (create_appointment / checkCustomerBlocked)", "customers",
+         "SELECT id, is_blocked FROM customers WHERE phone = %s", ["seed00012345"]),
+        ("agenda do dia (GET /appointments/?date=)", "appointments",
+         day_query, day_params),
+        ("ocupação do dia (GET /appointments/availability)", "appointments",
+         "SELECT date, start_time, duration_minutes FROM appointments "
+         "WHERE date BETWEEN %s AND %s AND status <> 'cancelled'",
+         [date.today(), date.today()]),
+        ("varredura de lembretes (reminders.scan)", "appointments",
+         "SELECT id FROM appointments "
+         "WHERE date BETWEEN %s AND %s AND status IN ('pending', 'confirmed')",
+         [date.today(), date.today() + timedelta(days=1)]),
+        ("agendamentos por cliente", "appointments",
+         "SELECT COUNT(*), MAX(date) FROM appointments WHERE customer_id = %s", [customer_id]),
+        ("listagem de clientes (GET /customers/)", "customers",
+         customers_query, customers_params),
+        ("busca de clientes por prefixo", "customers",
+         search_query, search_params),
+        ("fluxo ativo do chatbot", "chatbot_messages",
+         "SELECT * FROM chatbot_messages WHERE is_active = true ORDER BY order_position ASC", []),
+    ]
+
+
+def seq_scans(plan, table):
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") == table:
+        found.append(plan)
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child, table))
+    return found
+
+
+def check(conn):
+    failures = 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SEED_SQL)
+            for label, table, sql, params in hot_queries(cur):
+                cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+                plan = cur.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                if seq_scans(plan[0]["Plan"], table):
+                    failures += 1
+                    print(f"❌ {label}: Seq Scan em {table}")
+                else:
+                    print(f"✅ {label}")
+    finally:
+        conn.rollback()
+
+    if failures:
+        print(f"\n{failures} consulta(s) quente(s) sem índice")
+        return 1
+    print("\nTodas as consultas quentes usam índice")
+    return 0
+
+
+def is_app_database(conn):
+    """O DSN informado aponta para o mesmo banco do DB_CONFIG?"""
+    params = conn.get_dsn_parameters()
+    return (
+        params.get("host") == DB_CONFIG["host"]
+        and str(params.get("port") or 5432) == str(DB_CONFIG["port"])
+        and params.get("dbname") == DB_CONFIG["dbname"]
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrações do banco do PriSystem")
+    parser.add_argument("command", choices=["status", "apply", "check"])
+    parser.add_argument("--dsn", help=f"banco alvo (check: obrigatório, ou {SCRATCH_DSN_ENV})")
+    args = parser.parse_args(argv)
+
+    dsn = args.dsn
+    if args.command == "check":
+        dsn = dsn or os.getenv(SCRATCH_DSN_ENV)
+        if not dsn:
+            print(f"❌ check semeia dados: informe um banco descartável com --dsn ou {SCRATCH_DSN_ENV}")
+            return 2
+
+    conn = psycopg2.connect(dsn) if dsn else psycopg2.connect(**DB_CONFIG)
+    try:
+        if args.command == "check" and is_app_database(conn):
+            print("❌ O DSN do check aponta para o banco da aplicação; use um banco descartável")
+            return 2
+        return {"status": status, "apply": apply, "check": check}[args.command](conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+-- Schema base do PriSystem
+-- Idempotente: pode ser aplicado sobre o banco que já existia antes das migrações.
+
+CREATE TABLE IF NOT EXISTS customers (
+    id              SERIAL PRIMARY KEY,
+    name            VARCHAR(150),
+    phone           VARCHAR(30) NOT NULL,
+    email           VARCHAR(150),
+    channel         VARCHAR(30),
+    is_blocked      BOOLEAN NOT NULL DEFAULT false,
+    blocked_reason  TEXT,
+    created_at      TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at      TIMESTAMP NOT NULL DEFAULT NOW(),
+    CONSTRAINT customers_phone_key UNIQUE (phone)
+);
+
+CREATE TABLE IF NOT EXISTS services (
+    id                SERIAL PRIMARY KEY,
+    name              VARCHAR(150) NOT NULL,
+    price             NUMERIC(10, 2),
+    duration_minutes  INTEGER NOT NULL DEFAULT 60,
+    is_active         BOOLEAN NOT NULL DEFAULT true
+);
+
+CREATE TABLE IF NOT EXISTS appointments (
+    id           SERIAL PRIMARY KEY,
+    customer_id  INTEGER NOT NULL REFERENCES customers (id),
+    service_id   INTEGER NOT NULL REFERENCES services (id),
+    date         DATE NOT NULL,
+    start_time   TIME NOT NULL,
+    status       VARCHAR(20) NOT NULL DEFAULT 'pending',
+    channel      VARCHAR(30),
+    notes        TEXT,
+    created_by   INTEGER,
+    created_at   TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS chatbot_settings (
+    id                   SERIAL PRIMARY KEY,
+    active_bot_type      VARCHAR(10) NOT NULL DEFAULT 'rule',
+    flow_mode            VARCHAR(10) NOT NULL DEFAULT 'default',
+    welcome_message      TEXT,
+    closing_message      TEXT,
+    business_open_hour   VARCHAR(5),
+    business_close_hour  VARCHAR(5),
+    timezone             VARCHAR(50) DEFAULT 'America/Sao_Paulo',
+    notes                TEXT,
+    updated_at           TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS chatbot_messages (
+    id              SERIAL PRIMARY KEY,
+    order_position  INTEGER NOT NULL,
+    message_type    VARCHAR(20) NOT NULL DEFAULT 'message',
+    message_text    TEXT NOT NULL,
+    wait_for_reply  BOOLEAN NOT NULL DEFAULT true,
+    delay_seconds   INTEGER NOT NULL DEFAULT 0,
+    media_type      VARCHAR(20),
+    media_url       TEXT,
+    media_filename  TEXT,
+    is_active       BOOLEAN NOT NULL DEFAULT true,
+    created_at      TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at      TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Índices dos caminhos quentes
+-- customers.phone já é coberto por customers_phone_key (create_appointment, checkCustomerBlocked)
+
+-- Visão do dia e paginação keyset (date, start_time, id)
+CREATE INDEX IF NOT EXISTS idx_appointments_date_start
+    ON appointments (date, start_time, id);
+
+-- JOIN/contagem de agendamentos por cliente
+CREATE INDEX IF NOT EXISTS idx_appointments_customer
+    ON appointments (customer_id);
+
+-- Fluxo ativo do chatbot em ordem
+CREATE INDEX IF NOT EXISTS idx_chatbot_messages_active_order
+    ON chatbot_messages (is_active, order_position);
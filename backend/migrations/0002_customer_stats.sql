@@ -0,0 +1,56 @@
+-- Resumo de agendamentos mantido por trigger em customers
+-- (evita o LEFT JOIN appointments ... GROUP BY na listagem de clientes)
+
+ALTER TABLE customers
+    ADD COLUMN IF NOT EXISTS total_appointments INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS last_appointment_date DATE;
+
+CREATE OR REPLACE FUNCTION refresh_customer_stats(p_customer_id INTEGER)
+RETURNS VOID AS $$
+    UPDATE customers c
+    SET total_appointments = s.total,
+        last_appointment_date = s.last_date
+    FROM (
+        SELECT COUNT(*) AS total, MAX(date) AS last_date
+        FROM appointments
+        WHERE customer_id = p_customer_id
+    ) s
+    WHERE c.id = p_customer_id;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION appointments_customer_stats_trg()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM refresh_customer_stats(NEW.customer_id);
+    END IF;
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.customer_id IS DISTINCT FROM NEW.customer_id) THEN
+        PERFORM refresh_customer_stats(OLD.customer_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS appointments_customer_stats ON appointments;
+CREATE TRIGGER appointments_customer_stats
+AFTER INSERT OR DELETE OR UPDATE OF customer_id, date ON appointments
+FOR EACH ROW EXECUTE FUNCTION appointments_customer_stats_trg();
+
+-- Carga inicial do resumo
+UPDATE customers c
+SET total_appointments = s.total,
+    last_appointment_date = s.last_date
+FROM (
+    SELECT customer_id, COUNT(*) AS total, MAX(date) AS last_date
+    FROM appointments
+    GROUP BY customer_id
+) s
+WHERE c.id = s.customer_id;
+
+-- Ordem da listagem (keyset) e busca por prefixo
+CREATE INDEX IF NOT EXISTS idx_customers_listing
+    ON customers (is_blocked DESC, COALESCE(last_appointment_date, '-infinity'::date) DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_customers_phone_prefix
+    ON customers (phone text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_customers_name_prefix
+    ON customers (lower(name) text_pattern_ops);
@@ -0,0 +1,11 @@
+-- Versão do fluxo do chatbot, incrementada a cada "Salvar tudo" do editor
+-- (PUT /chatbot-messages/bulk). Linha única.
+
+CREATE TABLE IF NOT EXISTS chatbot_flow (
+    id          INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version     INTEGER NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO chatbot_flow (id, version) VALUES (1, 0)
+ON CONFLICT (id) DO NOTHING;
@@ -0,0 +1,33 @@
+-- Avisa o bot (LISTEN customer_block) quando o bloqueio de um cliente muda,
+-- para ele manter o cache de bloqueio em memória sem consultar o banco a cada mensagem.
+-- Payload: {"phone": "...", "is_blocked": true|false}
+
+CREATE OR REPLACE FUNCTION customers_block_notify_trg()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('customer_block', json_build_object('phone', OLD.phone, 'is_blocked', false)::text);
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        IF NEW.is_blocked THEN
+            PERFORM pg_notify('customer_block', json_build_object('phone', NEW.phone, 'is_blocked', true)::text);
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    IF OLD.phone IS DISTINCT FROM NEW.phone THEN
+        PERFORM pg_notify('customer_block', json_build_object('phone', OLD.phone, 'is_blocked', false)::text);
+    ELSIF OLD.is_blocked IS NOT DISTINCT FROM NEW.is_blocked THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('customer_block', json_build_object('phone', NEW.phone, 'is_blocked', COALESCE(NEW.is_blocked, false))::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS customers_block_notify ON customers;
+CREATE TRIGGER customers_block_notify
+AFTER INSERT OR DELETE OR UPDATE OF is_blocked, phone ON customers
+FOR EACH ROW EXECUTE FUNCTION customers_block_notify_trg();
@@ -0,0 +1,23 @@
+-- Avisa o bot (LISTEN chatbot_config) quando configurações ou mensagens do
+-- chatbot mudam, para ele recarregar o fluxo sem reiniciar (e sem relançar o Chromium).
+-- Um aviso por comando; o NOTIFY só é entregue no COMMIT e avisos iguais
+-- na mesma transação são agrupados pelo Postgres.
+-- Payload: nome da tabela alterada.
+
+CREATE OR REPLACE FUNCTION chatbot_config_notify_trg()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('chatbot_config', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS chatbot_settings_notify ON chatbot_settings;
+CREATE TRIGGER chatbot_settings_notify
+AFTER INSERT OR UPDATE OR DELETE ON chatbot_settings
+FOR EACH STATEMENT EXECUTE FUNCTION chatbot_config_notify_trg();
+
+DROP TRIGGER IF EXISTS chatbot_messages_notify ON chatbot_messages;
+CREATE TRIGGER chatbot_messages_notify
+AFTER INSERT OR UPDATE OR DELETE ON chatbot_messages
+FOR EACH STATEMENT EXECUTE FUNCTION chatbot_config_notify_trg();
@@ -0,0 +1,13 @@
+-- Estado das conversas do bot (etapa e dados coletados), gravado em lote
+-- pelo ConversationStore (chatbot/bot_rule/conversation-store.js) para
+-- sobreviver a reinícios do bot.
+
+CREATE TABLE IF NOT EXISTS chatbot_conversations (
+    chat_id        VARCHAR(64) PRIMARY KEY,
+    state          JSONB,
+    is_closed      BOOLEAN NOT NULL DEFAULT false,
+    last_activity  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_chatbot_conversations_activity
+    ON chatbot_conversations (last_activity);
@@ -0,0 +1,61 @@
+-- Catálogo de serviços único para o painel, a API (/services) e o bot
+-- (antes o bot tinha a lista fixa SERVICOS no chatbot.js).
+-- services_catalog.version muda a cada alteração em services: vira o ETag
+-- do GET /services e o bot recebe NOTIFY chatbot_config 'services'.
+
+CREATE TABLE IF NOT EXISTS services_catalog (
+    id          INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version     INTEGER NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO services_catalog (id, version) VALUES (1, 0)
+ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION services_catalog_bump_trg()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE services_catalog SET version = version + 1, updated_at = NOW() WHERE id = 1;
+    PERFORM pg_notify('chatbot_config', 'services');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS services_catalog_bump ON services;
+CREATE TRIGGER services_catalog_bump
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON services
+FOR EACH STATEMENT EXECUTE FUNCTION services_catalog_bump_trg();
+
+-- Carga inicial com a lista que ficava no bot (só se a tabela estiver vazia)
+INSERT INTO services (name, price)
+SELECT v.name, v.price
+FROM (VALUES
+    (1,  'BrowLaminations', 150.00),
+    (2,  'Design de Sobrancelhas', 35.00),
+    (3,  'Design em sobrancelhas micropigmentadas', 30.00),
+    (4,  'Drenagem Linfática (10 sessões)', 750.00),
+    (5,  'Drenagem Linfática (5 sessões)', 400.00),
+    (6,  'Drenagem Linfática (1 sessão)', 90.00),
+    (7,  'Epilação Buço', 10.00),
+    (8,  'Epilação Facial', 60.00),
+    (9,  'Epilação Buço e queixo', 20.00),
+    (10, 'SPA Lips - esfoliação e hidratação labial', 40.00),
+    (11, 'Hidragloss 1 sessão', 150.00),
+    (12, 'Lash Lifting', 120.00),
+    (13, 'Limpeza de pele', 150.00),
+    (14, 'Massagem modeladora (1 sessão)', 90.00),
+    (15, 'Massagem modeladora (10 sessões)', 750.00),
+    (16, 'Massagem modeladora (5 sessões)', 400.00),
+    (17, 'Massagem Terapêutica (1 sessão)', 90.00),
+    (18, 'Massagem Terapêutica (10 sessões)', 750.00),
+    (19, 'Massagem Terapêutica (5 sessões)', 400.00),
+    (20, 'Micropigmentação Labial (duas sessões)', 575.00),
+    (21, 'Micropigmentação Labial (uma sessão)', 290.00),
+    (22, 'Micropigmentação sobrancelhas - fio a fio ou Shadow (duas sessões)', 430.00),
+    (23, 'Micropigmentação sobrancelhas - fio a fio ou Shadow (uma sessão)', 250.00),
+    (24, 'Remoção e hidratação dos cílios', 40.00),
+    (25, 'Alongamento de cílios volume Express Soft', 120.00),
+    (26, 'Design e Henna', 50.00)
+) AS v(position, name, price)
+WHERE NOT EXISTS (SELECT 1 FROM services)
+ORDER BY v.position;
@@ -0,0 +1,61 @@
+-- Conflito de horários garantido pelo banco: cada agendamento ocupa o intervalo
+-- [date + start_time, + duração do serviço) e dois agendamentos não cancelados
+-- não podem se sobrepor (constraint de exclusão, sem corrida entre ler e gravar).
+
+-- Duração gravada no agendamento: mudar a duração do serviço não mexe no que já foi marcado
+ALTER TABLE appointments
+    ADD COLUMN IF NOT EXISTS duration_minutes INTEGER,
+    ADD COLUMN IF NOT EXISTS allow_overlap BOOLEAN NOT NULL DEFAULT false;
+
+UPDATE appointments a
+SET duration_minutes = s.duration_minutes
+FROM services s
+WHERE s.id = a.service_id
+  AND a.duration_minutes IS NULL;
+
+UPDATE appointments SET duration_minutes = 60 WHERE duration_minutes IS NULL;
+ALTER TABLE appointments ALTER COLUMN duration_minutes SET NOT NULL;
+
+CREATE OR REPLACE FUNCTION appointments_duration_trg()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.duration_minutes IS NOT NULL THEN
+        RETURN NEW;
+    END IF;
+    IF TG_OP = 'UPDATE' AND NEW.service_id IS NOT DISTINCT FROM OLD.service_id THEN
+        RETURN NEW;
+    END IF;
+    SELECT duration_minutes INTO NEW.duration_minutes FROM services WHERE id = NEW.service_id;
+    NEW.duration_minutes := COALESCE(NEW.duration_minutes, 60);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS appointments_duration ON appointments;
+CREATE TRIGGER appointments_duration
+BEFORE INSERT OR UPDATE OF service_id ON appointments
+FOR EACH ROW EXECUTE FUNCTION appointments_duration_trg();
+
+ALTER TABLE appointments
+    ADD COLUMN IF NOT EXISTS slot TSRANGE GENERATED ALWAYS AS (
+        tsrange(date + start_time, date + start_time + make_interval(mins => duration_minutes), '[)')
+    ) STORED;
+
+-- Agendamentos duplos que já existiam ficam marcados (e fora da constraint)
+-- para a migração não falhar; aparecem no painel normalmente.
+UPDATE appointments a
+SET allow_overlap = true
+WHERE a.status <> 'cancelled'
+  AND EXISTS (
+      SELECT 1
+      FROM appointments b
+      WHERE b.id < a.id
+        AND b.status <> 'cancelled'
+        AND b.slot && a.slot
+  );
+
+ALTER TABLE appointments DROP CONSTRAINT IF EXISTS appointments_no_overlap;
+ALTER TABLE appointments
+    ADD CONSTRAINT appointments_no_overlap
+    EXCLUDE USING gist (slot WITH &&)
+    WHERE (status <> 'cancelled' AND NOT allow_overlap);
@@ -0,0 +1,48 @@
+-- Lembretes de agendamento: o backend (reminders.py) varre os próximos
+-- agendamentos e enfileira um job por lembrete; o bot reivindica os jobs com
+-- FOR UPDATE SKIP LOCKED e entrega pela fila de envio.
+
+-- Varredura dos próximos dias por status (date BETWEEN ... AND status IN ...)
+CREATE INDEX IF NOT EXISTS idx_appointments_date_status
+    ON appointments (date, status);
+
+CREATE TABLE IF NOT EXISTS reminder_jobs (
+    id              BIGSERIAL PRIMARY KEY,
+    appointment_id  INTEGER NOT NULL REFERENCES appointments (id) ON DELETE CASCADE,
+    kind            VARCHAR(20) NOT NULL DEFAULT 'day_before',
+    -- date + start_time do agendamento quando o lembrete foi criado: remarcou, vira outro job
+    scheduled_for   TIMESTAMP NOT NULL,
+    phone           VARCHAR(30) NOT NULL,
+    message         TEXT NOT NULL,
+    run_at          TIMESTAMP NOT NULL,
+    status          VARCHAR(12) NOT NULL DEFAULT 'pending',  -- pending, sending, sent, failed, cancelled
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    max_attempts    INTEGER NOT NULL DEFAULT 3,
+    locked_until    TIMESTAMP,
+    created_at      TIMESTAMP NOT NULL DEFAULT NOW(),
+    finished_at     TIMESTAMP,
+    CONSTRAINT reminder_jobs_once UNIQUE (appointment_id, kind, scheduled_for)
+);
+
+-- Fila: só as linhas pendentes/em envio entram nos índices
+CREATE INDEX IF NOT EXISTS idx_reminder_jobs_due
+    ON reminder_jobs (run_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_reminder_jobs_sending
+    ON reminder_jobs (locked_until) WHERE status = 'sending';
+
+-- Acorda o bot (LISTEN reminder_jobs) quando a varredura cria jobs novos
+CREATE OR REPLACE FUNCTION reminder_jobs_notify_trg()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM inserted) THEN
+        PERFORM pg_notify('reminder_jobs', '');
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS reminder_jobs_notify ON reminder_jobs;
+CREATE TRIGGER reminder_jobs_notify
+AFTER INSERT ON reminder_jobs
+REFERENCING NEW TABLE AS inserted
+FOR EACH STATEMENT EXECUTE FUNCTION reminder_jobs_notify_trg();
@@ -0,0 +1,51 @@
+-- Resumo de agendamentos em customers mantido por delta (substitui o recálculo
+-- da migração 0002, que contava o histórico inteiro do cliente a cada escrita).
+-- total_appointments: +1/-1; last_appointment_date: GREATEST na entrada e só
+-- recalcula o MAX quando a linha que sai (ou muda de data) era a data máxima.
+
+CREATE OR REPLACE FUNCTION customer_stats_add(p_customer_id INTEGER, p_date DATE)
+RETURNS VOID AS $$
+    UPDATE customers
+    SET total_appointments = total_appointments + 1,
+        last_appointment_date = GREATEST(last_appointment_date, p_date)
+    WHERE id = p_customer_id;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION customer_stats_remove(p_customer_id INTEGER, p_date DATE)
+RETURNS VOID AS $$
+    UPDATE customers c
+    SET total_appointments = GREATEST(c.total_appointments - 1, 0),
+        last_appointment_date = CASE
+            WHEN c.last_appointment_date IS DISTINCT FROM p_date THEN c.last_appointment_date
+            ELSE (SELECT MAX(a.date) FROM appointments a WHERE a.customer_id = p_customer_id)
+        END
+    WHERE c.id = p_customer_id;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION appointments_customer_stats_trg()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM customer_stats_add(NEW.customer_id, NEW.date);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM customer_stats_remove(OLD.customer_id, OLD.date);
+    ELSIF OLD.customer_id IS DISTINCT FROM NEW.customer_id THEN
+        PERFORM customer_stats_remove(OLD.customer_id, OLD.date);
+        PERFORM customer_stats_add(NEW.customer_id, NEW.date);
+    ELSIF OLD.date IS DISTINCT FROM NEW.date THEN
+        UPDATE customers c
+        SET last_appointment_date = CASE
+                WHEN NEW.date >= c.last_appointment_date OR c.last_appointment_date IS NULL THEN NEW.date
+                WHEN OLD.date = c.last_appointment_date
+                    THEN (SELECT MAX(a.date) FROM appointments a WHERE a.customer_id = NEW.customer_id)
+                ELSE c.last_appointment_date
+            END
+        WHERE c.id = NEW.customer_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- O trigger appointments_customer_stats (0002) já aponta para esta função
+-- (AFTER INSERT OR DELETE OR UPDATE OF customer_id, date); o AFTER garante que
+-- o MAX recalculado já enxerga a linha removida/alterada.
@@ -0,0 +1,13 @@
+-- Metadados das mídias do chatbot (media_store.py). A chave é só o SHA-256 do
+-- conteúdo: o mesmo arquivo enviado como .jpg e .jpeg vira um arquivo só, com a
+-- extensão tirada do tipo detectado nos bytes. O nome original fica aqui.
+
+CREATE TABLE IF NOT EXISTS media_files (
+    sha256            CHAR(64) PRIMARY KEY,
+    stored_name       TEXT NOT NULL UNIQUE,
+    mime_type         VARCHAR(100) NOT NULL,
+    size              BIGINT NOT NULL,
+    original_name     TEXT,
+    created_at        TIMESTAMP NOT NULL DEFAULT NOW(),
+    last_uploaded_at  TIMESTAMP NOT NULL DEFAULT NOW()
+);
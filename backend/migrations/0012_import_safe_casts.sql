@@ -0,0 +1,31 @@
+-- Conversões que devolvem NULL em vez de erro, para a importação de CSV
+-- (csv_transfer.py): o regex confere só o formato, então "2024-02-30" ou
+-- "25:00" passavam e o cast derrubava o arquivo inteiro. Com estas funções a
+-- linha ganha a mensagem na coluna error e o restante do lote segue.
+
+CREATE OR REPLACE FUNCTION try_date(p_value TEXT)
+RETURNS DATE AS $$
+BEGIN
+    RETURN p_value::date;
+EXCEPTION WHEN data_exception THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION try_time(p_value TEXT)
+RETURNS TIME AS $$
+BEGIN
+    RETURN p_value::time;
+EXCEPTION WHEN data_exception THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION try_int(p_value TEXT)
+RETURNS INTEGER AS $$
+BEGIN
+    RETURN p_value::integer;
+EXCEPTION WHEN data_exception THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
@@ -0,0 +1,22 @@
+-- Relógio do salão: agendamentos e reminder_jobs guardam TIMESTAMP sem fuso,
+-- no horário local do salão. LOCALTIMESTAMP/CURRENT_DATE seguem o fuso da
+-- sessão (do servidor ou do driver), então a varredura e o bot podiam enxergar
+-- "agora" com horas de diferença. salon_now() usa chatbot_settings.timezone
+-- (fuso inválido ou ausente cai no padrão America/Sao_Paulo).
+
+CREATE OR REPLACE FUNCTION salon_now()
+RETURNS TIMESTAMP AS $$
+DECLARE
+    tz TEXT;
+BEGIN
+    SELECT NULLIF(btrim(timezone), '') INTO tz
+    FROM chatbot_settings
+    ORDER BY id
+    LIMIT 1;
+    BEGIN
+        RETURN now() AT TIME ZONE COALESCE(tz, 'America/Sao_Paulo');
+    EXCEPTION WHEN invalid_parameter_value THEN
+        RETURN now() AT TIME ZONE 'America/Sao_Paulo';
+    END;
+END;
+$$ LANGUAGE plpgsql STABLE;
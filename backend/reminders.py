@@ -0,0 +1,201 @@
+"""
+Lembretes dos próximos agendamentos (fila durável em reminder_jobs, migração 0009).
+- A varredura é um INSERT ... SELECT só: todos os agendamentos da janela viram
+  jobs de uma vez (índice (date, status)); ON CONFLICT evita duplicar.
+- Quem envia é o bot: reivindica os jobs com FOR UPDATE SKIP LOCKED e entrega
+  pela fila de envio com limite de taxa (chatbot/bot_rule/reminder-dispatcher.js).
+- A mesma varredura cancela jobs de agendamentos cancelados/remarcados, devolve
+  para a fila os que ficaram presos em "sending" e apaga os antigos.
+- "Agora" é o relógio do salão (salon_now(), migração 0013, fuso de
+  chatbot_settings), lido uma vez por varredura; nunca o fuso da sessão.
+"""
+import asyncio
+import os
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from db import get_connection
+
+REMINDERS_ENABLED = os.getenv("PRISYSTEM_REMINDERS", "1") != "0"
+SCAN_INTERVAL_SECONDS = 5 * 60
+HOURS_BEFORE = 24
+# Agendamento muito em cima da hora não recebe lembrete
+MIN_LEAD_MINUTES = 120
+RETENTION_DAYS = 30
+ACTIVE_STATUSES = ("pending", "confirmed")
+
+# Chave do pg_try_advisory_xact_lock: com vários workers, só um varre por vez
+LOCK_KEY = 720260225
+
+# Placeholders do format() do Postgres: saudação, serviço, data, hora
+MESSAGE_TEMPLATE = (
+    "Olá%s! 😊\n\n"
+    "Passando para lembrar do seu horário de *%s* no dia *%s* às *%s*.\n\n"
+    "Caso precise remarcar ou cancelar, entre em contato conosco."
+)
+
+# Jobs em "sending" com o lock vencido: o bot renova locked_until enquanto o
+# lote está na fila de envio, então vencido = bot caiu no meio do lote
+RECOVER_SQL = """
+    UPDATE reminder_jobs
+    SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+        finished_at = CASE WHEN attempts >= max_attempts THEN %(now)s END,
+        locked_until = NULL
+    WHERE status = 'sending'
+      AND locked_until < %(now)s
+"""
+
+CANCEL_SQL = """
+    UPDATE reminder_jobs j
+    SET status = 'cancelled',
+        finished_at = %(now)s
+    FROM appointments a, customers c
+    WHERE j.status = 'pending'
+      AND a.id = j.appointment_id
+      AND c.id = a.customer_id
+      AND (a.status NOT IN %(statuses)s
+           OR a.date + a.start_time <> j.scheduled_for
+           OR j.scheduled_for <= %(now)s
+           OR c.is_blocked)
+"""
+
+ENQUEUE_SQL = """
+    INSERT INTO reminder_jobs (appointment_id, kind, scheduled_for, phone, message, run_at)
+    SELECT a.id,
+           'day_before',
+           a.date + a.start_time,
+           c.phone,
+           format(
+               %(template)s,
+               COALESCE(', ' || NULLIF(split_part(btrim(c.name), ' ', 1), ''), ''),
+               s.name,
+               to_char(a.date, 'DD/MM'),
+               to_char(a.start_time, 'HH24:MI')
+           ),
+           GREATEST(a.date + a.start_time - make_interval(hours => %(hours)s), %(now)s)
+    FROM appointments a
+    JOIN customers c ON c.id = a.customer_id
+    JOIN services  s ON s.id = a.service_id
+    WHERE a.date BETWEEN %(now)s::date AND %(now)s::date + %(days)s
+      AND a.status IN %(statuses)s
+      AND a.date + a.start_time > %(now)s + make_interval(mins => %(min_lead)s)
+      AND NOT c.is_blocked
+    ON CONFLICT (appointment_id, kind, scheduled_for) DO NOTHING
+"""
+
+PURGE_SQL = """
+    DELETE FROM reminder_jobs
+    WHERE status IN ('sent', 'failed', 'cancelled')
+      AND finished_at < %(now)s - make_interval(days => %(days)s)
+"""
+
+
+def scan():
+    """Uma varredura completa numa transação; None se outro processo já está varrendo"""
+    conn = get_connection(autocommit=False)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (LOCK_KEY,))
+            if not cur.fetchone()["locked"]:
+                return None
+
+            cur.execute("SELECT salon_now() AS now")
+            now = cur.fetchone()["now"]
+
+            cur.execute(RECOVER_SQL, {"now": now})
+            recovered = cur.rowcount
+            cur.execute(CANCEL_SQL, {"now": now, "statuses": ACTIVE_STATUSES})
+            cancelled = cur.rowcount
+            cur.execute(ENQUEUE_SQL, {
+                "now": now,
+                "template": MESSAGE_TEMPLATE,
+                "hours": HOURS_BEFORE,
+                "days": -(-HOURS_BEFORE // 24),
+                "statuses": ACTIVE_STATUSES,
+                "min_lead": MIN_LEAD_MINUTES,
+            })
+            enqueued = cur.rowcount
+            cur.execute(PURGE_SQL, {"now": now, "days": RETENTION_DAYS})
+            purged = cur.rowcount
+        return {"enqueued": enqueued, "cancelled": cancelled, "recovered": recovered, "purged": purged}
+    finally:
+        conn.close()
+
+
+def job_counts():
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT status, COUNT(*) AS total, MIN(run_at) AS next_run_at
+                FROM reminder_jobs
+                GROUP BY status
+                """
+            )
+            return {row["status"]: {"total": row["total"], "next_run_at": row["next_run_at"]}
+                    for row in cur.fetchall()}
+    finally:
+        conn.close()
+
+
+class ReminderScheduler:
+    """Roda scan() a cada `interval` segundos numa task do event loop"""
+
+    def __init__(self, interval=SCAN_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task = None
+        self.last_run_at = None
+        self.last_result = None
+        self.last_error = None
+
+    def start(self):
+        if not REMINDERS_ENABLED:
+            print("⏸️ Lembretes desativados (PRISYSTEM_REMINDERS=0)")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self):
+        try:
+            result = await run_in_threadpool(scan)
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"⚠️ Erro na varredura de lembretes: {e}")
+            return None
+        self.last_run_at = time.time()
+        self.last_error = None
+        if result is not None:
+            self.last_result = result
+            if result["enqueued"] or result["cancelled"] or result["recovered"]:
+                print(
+                    f"⏰ Lembretes: {result['enqueued']} novo(s), {result['cancelled']} cancelado(s), "
+                    f"{result['recovered']} devolvido(s) para a fila"
+                )
+        return result
+
+    async def _run(self):
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    def info(self):
+        return {
+            "enabled": REMINDERS_ENABLED,
+            "running": self._task is not None and not self._task.done(),
+            "interval_seconds": self.interval,
+            "hours_before": HOURS_BEFORE,
+            "last_run_at": self.last_run_at,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
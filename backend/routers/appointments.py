@@ -1,13 +1,21 @@
 # Arquivo COMPLETO: prisystem/backend/routers/appointments.py
 # Substitua TODO o conteúdo:
 
-from datetime import date as date_type, time as time_type
-from typing import Optional
+import base64
+import json
+from datetime import date as date_type, time as time_type, timedelta
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from psycopg2 import errors
 from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
 
+import availability
+import csv_transfer
 from db import get_connection
+from cache import invalidate_availability, invalidate_dashboard
 
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
@@ -30,139 +38,424 @@ class AppointmentUpdate(BaseModel):
     notes: Optional[str] = None
 
 
+BATCH_MAX_IDS = 500
+
+
+class AppointmentBatchUpdate(BaseModel):
+    # Limite validado antes da deduplicação: lista enorme vira 422, não chega ao banco
+    ids: List[int] = Field(..., min_length=1, max_length=BATCH_MAX_IDS, examples=[[12, 13, 14]])
+    status: Optional[Literal["pending", "confirmed", "cancelled"]] = Field(None, examples=["confirmed"])
+    notes: Optional[str] = None
+
+
+# Uma ida ao banco: upsert do cliente pelo telefone (o DO UPDATE trava a linha e
+# devolve o cliente mesmo quando outra requisição acabou de criá-lo), checagem de
+# bloqueio e INSERT do agendamento. appointment_id vem NULL se o cliente está bloqueado.
+CREATE_APPOINTMENT_SQL = """
+    WITH upserted AS (
+        INSERT INTO customers (name, phone, email, channel)
+        VALUES (%(name)s, %(phone)s, %(email)s, %(channel)s)
+        ON CONFLICT (phone) DO UPDATE
+        SET email = COALESCE(customers.email, EXCLUDED.email)
+        WHERE NOT customers.is_blocked
+        RETURNING id, is_blocked
+    ), customer AS (
+        -- Cliente bloqueado: o DO UPDATE não toca no cadastro e não retorna
+        -- linha, então ele vem da tabela para a resposta 403
+        SELECT id, is_blocked FROM upserted
+        UNION ALL
+        SELECT id, is_blocked
+        FROM customers
+        WHERE phone = %(phone)s
+          AND NOT EXISTS (SELECT 1 FROM upserted)
+    ), appointment AS (
+        INSERT INTO appointments (
+            customer_id,
+            service_id,
+            date,
+            start_time,
+            duration_minutes,
+            status,
+            channel,
+            notes,
+            created_by
+        )
+        SELECT id, %(service_id)s, %(date)s, %(start_time)s, %(duration)s,
+               'pending', %(channel)s, %(notes)s, NULL
+        FROM customer
+        WHERE NOT is_blocked
+        RETURNING id
+    )
+    SELECT c.id AS customer_id,
+           c.is_blocked,
+           (SELECT id FROM appointment) AS appointment_id
+    FROM customer c
+"""
+
+
 @router.post("/", status_code=201)
 def create_appointment(payload: AppointmentCreate):
     conn = get_connection()
     try:
         with conn:
             with conn.cursor() as cur:
-                # 1) Buscar cliente
-                cur.execute(
-                    """
-                    SELECT id, is_blocked
-                    FROM customers
-                    WHERE phone = %s
-                    """,
-                    (payload.phone,)
-                )
-                row = cur.fetchone()
+                # 1) Serviço e horário de funcionamento
+                duration = check_slot(cur, payload.service_id, payload.start_time)
 
-                if row:
-                    customer_id = row["id"]
-                    is_blocked = row["is_blocked"]
-                else:
+                # 2) Cliente + bloqueio + agendamento num comando só
+                #    (a constraint de exclusão decide o conflito de horário)
+                try:
                     cur.execute(
-                        """
-                        INSERT INTO customers (name, phone, email, channel)
-                        VALUES (%s, %s, %s, %s)
-                        RETURNING id, is_blocked
-                        """,
-                        (payload.name, payload.phone,
-                         payload.email, payload.channel)
+                        CREATE_APPOINTMENT_SQL,
+                        {
+                            "name": payload.name,
+                            "phone": payload.phone,
+                            "email": payload.email,
+                            "channel": payload.channel,
+                            "service_id": payload.service_id,
+                            "date": payload.date,
+                            "start_time": payload.start_time,
+                            "duration": duration,
+                            "notes": "Criado via API",
+                        },
                     )
-                    res = cur.fetchone()
-                    customer_id = res["id"]
-                    is_blocked = res["is_blocked"]
+                except errors.ExclusionViolation:
+                    raise slot_taken()
+                row = cur.fetchone()
 
-                if is_blocked:
+                # Sem linha: bloqueado numa corrida com um cadastro concorrente
+                if row is None or row["is_blocked"]:
                     raise HTTPException(
                         status_code=403,
                         detail="Cliente bloqueado. Entre em contato com o atendimento."
                     )
 
-                # 3) Criar agendamento
-                cur.execute(
-                    """
-                    INSERT INTO appointments (
-                        customer_id,
-                        service_id,
-                        date,
-                        start_time,
-                        status,
-                        channel,
-                        notes,
-                        created_by
-                    ) VALUES (
-                        %s, %s, %s, %s, 'pending', %s, %s, NULL
-                    )
-                    RETURNING id
-                    """,
-                    (
-                        customer_id,
-                        payload.service_id,
-                        payload.date,
-                        payload.start_time,
-                        payload.channel,
-                        "Criado via API"
-                    )
-                )
-                appointment = cur.fetchone()
-                appointment_id = appointment["id"]
-
+        invalidate_dashboard()
+        invalidate_availability()
         return {
-            "id": appointment_id,
-            "customer_id": customer_id,
+            "id": row["appointment_id"],
+            "customer_id": row["customer_id"],
             "status": "pending"
         }
     finally:
         conn.close()
 
 
-@router.get("/", response_model=list[dict])
-def list_appointments(
-    date_filter: Optional[date_type] = Query(None, alias="date")
+def slot_taken():
+    return HTTPException(status_code=409, detail="Horário indisponível: já existe um agendamento nesse período")
+
+
+def check_hours(cur, start_time, duration):
+    """400 se start_time + duração sai do horário de funcionamento (lido do banco, sem cache)"""
+    open_minutes, close_minutes = availability.business_hours(cur)
+    try:
+        start = availability.to_minutes(start_time)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Horário inválido (use HH:MM)")
+    if start < open_minutes or start + duration > close_minutes:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                "Fora do horário de funcionamento "
+                f"({availability.format_minutes(open_minutes)}–"
+                f"{availability.format_minutes(close_minutes)})"
+            ),
+        )
+
+
+def check_slot(cur, service_id, start_time):
+    """
+    Valida serviço e horário de funcionamento; retorna a duração em minutos.
+    O conflito fica só com a constraint appointments_no_overlap (409 via
+    slot_taken): o DayIndex em cache é por processo e pode estar velho.
+    """
+    duration = availability.service_duration(cur, service_id)
+    if duration is None:
+        raise HTTPException(status_code=400, detail="Serviço não encontrado")
+    check_hours(cur, start_time, duration)
+    return duration
+
+
+def validate_slot(service_id, start_time):
+    """check_slot com conexão própria (rota assíncrona, via run_in_threadpool)"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            return check_slot(cur, service_id, start_time)
+    finally:
+        conn.close()
+
+
+APPOINTMENTS_PAGE_SIZE = 50
+APPOINTMENTS_PAGE_MAX = 200
+
+
+def encode_cursor(row):
+    """Cursor opaco com a chave de ordenação (date, start_time, id) da última linha"""
+    key = [row["date"].isoformat(), row["start_time"].isoformat(), row["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        day, start, appointment_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return date_type.fromisoformat(day), time_type.fromisoformat(start), int(appointment_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def appointment_filters(
+    date_filter: Optional[date_type] = Query(None, alias="date"),
+    date_from: Optional[date_type] = None,
+    date_to: Optional[date_type] = None,
+    status: Optional[str] = None,
+    channel: Optional[str] = None,
+    service_id: Optional[int] = None,
+    customer_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(APPOINTMENTS_PAGE_SIZE, ge=1, le=APPOINTMENTS_PAGE_MAX),
 ):
+    return {
+        "date": date_filter,
+        "date_from": date_from,
+        "date_to": date_to,
+        "status": status,
+        "channel": channel,
+        "service_id": service_id,
+        "customer_id": customer_id,
+        "cursor": cursor,
+        "limit": limit,
+    }
+
+
+def build_list_query(filters):
+    """Monta o SELECT paginado por keyset (date, start_time, id) a partir dos filtros"""
+    where = []
+    params = []
+
+    if filters["date"]:
+        where.append("a.date = %s")
+        params.append(filters["date"])
+    elif not filters["date_from"] and not filters["date_to"]:
+        # sem filtro de data: só agendamentos futuros
+        where.append("a.date >= CURRENT_DATE")
+    if filters["date_from"]:
+        where.append("a.date >= %s")
+        params.append(filters["date_from"])
+    if filters["date_to"]:
+        where.append("a.date <= %s")
+        params.append(filters["date_to"])
+
+    for column in ("status", "channel", "service_id", "customer_id"):
+        if filters[column] is not None:
+            where.append(f"a.{column} = %s")
+            params.append(filters[column])
+
+    if filters["cursor"]:
+        where.append("(a.date, a.start_time, a.id) > (%s, %s, %s)")
+        params.extend(decode_cursor(filters["cursor"]))
+
+    # busca uma linha a mais para saber se existe próxima página
+    params.append(filters["limit"] + 1)
+    query = f"""
+        SELECT a.id,
+               a.customer_id,
+               a.date,
+               a.start_time,
+               a.status,
+               a.channel,
+               c.name AS customer_name,
+               c.phone AS customer_phone,
+               s.name AS service_name
+        FROM appointments a
+        JOIN customers c ON c.id = a.customer_id
+        JOIN services  s ON s.id = a.service_id
+        WHERE {" AND ".join(where)}
+        ORDER BY a.date, a.start_time, a.id
+        LIMIT %s
+    """
+    return query, params
+
+
+def build_page(rows, limit):
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/")
+def list_appointments(filters: dict = Depends(appointment_filters)):
     """
-    Lista agendamentos.
-    - Se `date` vier na query (?date=2026-02-20), filtra por dia.
-    - Senão, retorna os próximos agendamentos futuros.
+    Lista agendamentos paginados.
+    - `date` filtra um dia; `date_from`/`date_to` um intervalo; sem nenhum, só os futuros.
+    - Filtros opcionais: status, channel, service_id, customer_id.
+    - Passe o `next_cursor` da resposta em `cursor` para buscar a próxima página.
     """
+    query, params = build_list_query(filters)
     conn = get_connection()
     try:
         with conn, conn.cursor() as cur:
-            if date_filter:
-                cur.execute(
-                    """
-                    SELECT a.id,
-                           a.customer_id,
-                           a.date,
-                           a.start_time,
-                           a.status,
-                           a.channel,
-                           c.name AS customer_name,
-                           c.phone AS customer_phone,
-                           s.name AS service_name
-                    FROM appointments a
-                    JOIN customers c ON c.id = a.customer_id
-                    JOIN services  s ON s.id = a.service_id
-                    WHERE a.date = %s
-                    ORDER BY a.start_time
-                    """,
-                    (date_filter,)
-                )
-            else:
-                cur.execute(
-                    """
-                    SELECT a.id,
-                           a.customer_id,
-                           a.date,
-                           a.start_time,
-                           a.status,
-                           a.channel,
-                           c.name AS customer_name,
-                           c.phone AS customer_phone,
-                           s.name AS service_name
-                    FROM appointments a
-                    JOIN customers c ON c.id = a.customer_id
-                    JOIN services  s ON s.id = a.service_id
-                    WHERE a.date >= CURRENT_DATE
-                    ORDER BY a.date, a.start_time
-                    LIMIT 100
-                    """
-                )
-
+            cur.execute(query, params)
             rows = cur.fetchall()
-            return rows
+            return build_page(rows, filters["limit"])
+    finally:
+        conn.close()
+
+
+@router.post("/import")
+async def import_appointments(file: UploadFile = File(...)):
+    """
+    Importa agendamentos de um CSV (COPY para tabela temporária + mescla em lote).
+    Colunas: phone, date, start_time, service ou service_id; opcionais name, email,
+    status, channel, notes. Linhas repetidas ou em conflito de horário são puladas.
+    """
+    result = await run_in_threadpool(csv_transfer.import_appointments, file.file)
+    invalidate_dashboard()
+    invalidate_availability()
+    return result
+
+
+@router.get("/export")
+def export_appointments(
+    date_from: Optional[date_type] = None,
+    date_to: Optional[date_type] = None,
+    status: Optional[str] = None,
+    channel: Optional[str] = None,
+    service_id: Optional[int] = None,
+    customer_id: Optional[int] = None,
+):
+    """CSV de todos os agendamentos (ou do intervalo/filtros), gerado em streaming"""
+    query, params = csv_transfer.appointments_export_query({
+        "date_from": date_from,
+        "date_to": date_to,
+        "status": status,
+        "channel": channel,
+        "service_id": service_id,
+        "customer_id": customer_id,
+    })
+    return StreamingResponse(
+        csv_transfer.stream_csv(query, params, csv_transfer.APPOINTMENT_COLUMNS),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="agendamentos.csv"'},
+    )
+
+
+@router.get("/availability")
+def get_availability(
+    day: date_type = Query(..., alias="date"),
+    days: int = Query(1, ge=1, le=31),
+    service_id: Optional[int] = None,
+):
+    """
+    Horários livres a partir de `date` por `days` dias, para a duração do serviço
+    (ou 60 minutos sem service_id), na grade de 30 em 30 minutos.
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            duration = availability.DEFAULT_DURATION_MINUTES
+            if service_id is not None:
+                duration = availability.service_duration(cur, service_id)
+                if duration is None:
+                    raise HTTPException(status_code=404, detail="Serviço não encontrado")
+
+            indexes = availability.load_days(cur, day, day + timedelta(days=days - 1))
+            return {
+                "service_id": service_id,
+                "duration_minutes": duration,
+                "step_minutes": availability.SLOT_STEP_MINUTES,
+                "days": [
+                    {
+                        "date": index.day.isoformat(),
+                        "open": availability.format_minutes(index.open_minutes),
+                        "close": availability.format_minutes(index.close_minutes),
+                        "slots": index.free_slots(duration),
+                    }
+                    for index in indexes
+                ],
+            }
+    finally:
+        conn.close()
+
+
+def batch_update(cur, ids, update_fields, params):
+    """
+    UPDATE ... WHERE id = ANY(...) numa transação. Se reativar algum agendamento
+    esbarrar na constraint de horário, refaz item a item com SAVEPOINT para dizer
+    qual ID conflitou sem desistir dos outros.
+    """
+    set_clause = ", ".join(update_fields)
+    try:
+        cur.execute(
+            f"UPDATE appointments SET {set_clause} WHERE id = ANY(%s) RETURNING id, status",
+            params + [ids],
+        )
+        return {row["id"]: row for row in cur.fetchall()}, set()
+    except errors.ExclusionViolation:
+        cur.connection.rollback()
+
+    updated, conflicts = {}, set()
+    for appointment_id in ids:
+        cur.execute("SAVEPOINT batch_item")
+        try:
+            cur.execute(
+                f"UPDATE appointments SET {set_clause} WHERE id = %s RETURNING id, status",
+                params + [appointment_id],
+            )
+            row = cur.fetchone()
+            if row:
+                updated[row["id"]] = row
+            cur.execute("RELEASE SAVEPOINT batch_item")
+        except errors.ExclusionViolation:
+            cur.execute("ROLLBACK TO SAVEPOINT batch_item")
+            conflicts.add(appointment_id)
+    return updated, conflicts
+
+
+@router.patch("/batch")
+def update_appointments_batch(payload: AppointmentBatchUpdate):
+    """
+    Aplica o mesmo status/notes a vários agendamentos (ex.: confirmar o dia inteiro).
+    Retorna o resultado por ID: updated, not_found ou conflict (horário já ocupado).
+    """
+    ids = list(dict.fromkeys(payload.ids))
+
+    update_fields = []
+    params = []
+    if payload.status is not None:
+        update_fields.append("status = %s")
+        params.append(payload.status)
+    if payload.notes is not None:
+        update_fields.append("notes = %s")
+        params.append(payload.notes)
+    if not update_fields:
+        raise HTTPException(status_code=400, detail="Nenhum campo para atualizar")
+
+    conn = get_connection(autocommit=False)
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                updated, conflicts = batch_update(cur, ids, update_fields, params)
+
+        if updated:
+            invalidate_dashboard()
+            invalidate_availability()
+
+        results = []
+        for appointment_id in ids:
+            if appointment_id in updated:
+                results.append({"id": appointment_id, "result": "updated",
+                                "status": updated[appointment_id]["status"]})
+            elif appointment_id in conflicts:
+                results.append({"id": appointment_id, "result": "conflict"})
+            else:
+                results.append({"id": appointment_id, "result": "not_found"})
+        return {
+            "updated": len(updated),
+            "not_found": len(ids) - len(updated) - len(conflicts),
+            "conflicts": len(conflicts),
+            "results": results,
+        }
     finally:
         conn.close()
 
@@ -174,11 +467,26 @@ def update_appointment(appointment_id: int, payload: AppointmentUpdate):
     try:
         with conn:
             with conn.cursor() as cur:
-                # Verifica se o agendamento existe
-                cur.execute("SELECT id FROM appointments WHERE id = %s", (appointment_id,))
-                if not cur.fetchone():
-                    raise HTTPException(status_code=404, detail="Agendamento não encontrado")
-                
+                # Mudou serviço, dia ou horário: mesma checagem de horário de
+                # funcionamento da criação, com a duração que a linha vai ter
+                if any(v is not None for v in (payload.service_id, payload.date, payload.start_time)):
+                    cur.execute(
+                        """
+                        SELECT service_id, start_time, duration_minutes
+                        FROM appointments
+                        WHERE id = %s
+                        FOR UPDATE
+                        """,
+                        (appointment_id,),
+                    )
+                    current = cur.fetchone()
+                    if not current:
+                        raise HTTPException(status_code=404, detail="Agendamento não encontrado")
+                    if payload.service_id is not None and payload.service_id != current["service_id"]:
+                        check_slot(cur, payload.service_id, payload.start_time or current["start_time"])
+                    else:
+                        check_hours(cur, payload.start_time or current["start_time"], current["duration_minutes"])
+
                 # Monta query dinâmica com campos a atualizar
                 update_fields = []
                 params = []
@@ -203,10 +511,18 @@ def update_appointment(appointment_id: int, payload: AppointmentUpdate):
                     raise HTTPException(status_code=400, detail="Nenhum campo para atualizar")
                 
                 params.append(appointment_id)
-                query = f"UPDATE appointments SET {', '.join(update_fields)} WHERE id = %s"
+                query = f"UPDATE appointments SET {', '.join(update_fields)} WHERE id = %s RETURNING id"
                 
-                cur.execute(query, params)
+                try:
+                    cur.execute(query, params)
+                except errors.ExclusionViolation:
+                    raise slot_taken()
+                # Nenhuma linha afetada = não existe (sem SELECT prévio)
+                if not cur.fetchone():
+                    raise HTTPException(status_code=404, detail="Agendamento não encontrado")
                 
+        invalidate_dashboard()
+        invalidate_availability()
         return {"message": "Agendamento atualizado com sucesso", "id": appointment_id}
     finally:
         conn.close()
@@ -227,6 +543,8 @@ def delete_appointment(appointment_id: int):
                 # Exclui
                 cur.execute("DELETE FROM appointments WHERE id = %s", (appointment_id,))
                 
+        invalidate_dashboard()
+        invalidate_availability()
         return {"message": "Agendamento excluído com sucesso", "id": appointment_id}
     finally:
         conn.close()
@@ -0,0 +1,106 @@
+"""
+Versões `async def` dos endpoints mais acessados, servidas pelo asyncpg.
+Só são registradas quando db.DB_MODE = "async"; como entram antes dos routers
+síncronos no main.py, têm prioridade nas mesmas rotas.
+"""
+from datetime import date
+
+import asyncpg
+from fastapi import APIRouter, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
+
+import db_async
+from cache import dashboard_cache, invalidate_availability, invalidate_dashboard
+from routers import appointments, customers
+from routers.appointments import AppointmentCreate, appointment_filters
+from routers.customers import CustomerBlockUpdate, customer_filters
+from routers.settings import ChatbotSettings
+
+router = APIRouter(tags=["async"])
+
+
+@router.post("/appointments/", status_code=201)
+async def create_appointment_async(payload: AppointmentCreate):
+    # Mesma validação da rota síncrona: serviço (400) e horário de funcionamento
+    # (400); o conflito (409) vem da constraint de exclusão no INSERT
+    duration = await run_in_threadpool(
+        appointments.validate_slot, payload.service_id, payload.start_time
+    )
+    try:
+        customer_id, is_blocked, appointment_id = await db_async.create_appointment(
+            payload.name,
+            payload.phone,
+            payload.email,
+            payload.service_id,
+            payload.date,
+            payload.start_time,
+            duration,
+            payload.channel,
+        )
+    except asyncpg.exceptions.ExclusionViolationError:
+        raise appointments.slot_taken()
+    except asyncpg.exceptions.ForeignKeyViolationError:
+        # Serviço removido entre a validação e o INSERT
+        raise HTTPException(status_code=400, detail="Serviço não encontrado")
+    if is_blocked:
+        raise HTTPException(
+            status_code=403,
+            detail="Cliente bloqueado. Entre em contato com o atendimento."
+        )
+    invalidate_dashboard()
+    invalidate_availability()
+    return {
+        "id": appointment_id,
+        "customer_id": customer_id,
+        "status": "pending"
+    }
+
+
+@router.get("/appointments/")
+async def list_appointments_async(filters: dict = Depends(appointment_filters)):
+    query, params = appointments.build_list_query(filters)
+    rows = await db_async.fetch(db_async.positional(query), *params)
+    return appointments.build_page(rows, filters["limit"])
+
+
+@router.get("/customers/")
+async def list_customers_async(filters: dict = Depends(customer_filters)):
+    query, params = customers.build_list_query(filters)
+    rows = await db_async.fetch(db_async.positional(query), *params)
+    return customers.build_page(rows, filters["limit"])
+
+
+# :int para não capturar /customers/export (router síncrono)
+@router.get("/customers/{customer_id:int}")
+async def get_customer_async(customer_id: int):
+    row = await db_async.get_customer(customer_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Cliente não encontrado")
+    return row
+
+
+@router.patch("/customers/{customer_id:int}/block")
+async def update_block_status_async(customer_id: int, data: CustomerBlockUpdate):
+    row = await db_async.update_block_status(customer_id, data.is_blocked, data.blocked_reason)
+    if not row:
+        raise HTTPException(status_code=404, detail="Cliente não encontrado")
+    invalidate_dashboard()
+    return row
+
+
+@router.get("/settings/chatbot", response_model=ChatbotSettings)
+async def get_chatbot_settings_async():
+    row = await db_async.get_chatbot_settings()
+    if not row:
+        raise HTTPException(status_code=404, detail="Configurações não encontradas")
+    return row
+
+
+@router.get("/dashboard/stats")
+async def get_dashboard_stats_async():
+    today = date.today()
+    cached = dashboard_cache.get(today)
+    if cached is None:
+        cached = await db_async.dashboard_stats(today)
+        dashboard_cache.set(today, cached)
+    return cached
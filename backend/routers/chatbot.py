@@ -2,22 +2,18 @@ from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from typing import Optional, List
 import psycopg2
+from psycopg2 import extensions
 from datetime import datetime
 
+from db import get_connection
+from routers.chatbot_messages import reorder_active_messages
+
 router = APIRouter(prefix="/chatbot", tags=["chatbot"])
 
-# Configuração do banco
-DB_CONFIG = {
-    'host': '204.157.124.199',
-    'port': 5432,
-    'user': 'postgres',
-    'password': '003289',
-    'database': 'pri_system'
-}
 
 def get_db_connection():
-    """Cria e retorna uma conexão com o banco"""
-    return psycopg2.connect(**DB_CONFIG)
+    """Empresta uma conexão do pool compartilhado (cursor de tuplas, com transação)"""
+    return get_connection(cursor_factory=extensions.cursor, autocommit=False)
 
 
 # ==================== MODELS ====================
@@ -80,7 +76,10 @@ def get_chatbot_settings():
 
 @router.put("/flow-mode")
 def update_flow_mode(mode: str = Query(..., regex="^(default|custom)$")):
-    """Atualiza o modo de fluxo (default ou custom)"""
+    """
+    Atualiza o modo de fluxo (default ou custom).
+    O bot recarrega sozinho: o trigger chatbot_settings_notify (migração 0005) avisa no COMMIT.
+    """
     conn = None
     try:
         conn = get_db_connection()
@@ -279,29 +278,6 @@ def delete_message(message_id: int):
 
 @router.post("/messages/reorder")
 def reorder_messages(message_ids: List[int]):
-    """Reordena as mensagens"""
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        for position, message_id in enumerate(message_ids, start=1):
-            cursor.execute("""
-                UPDATE chatbot_messages
-                SET order_position = %s
-                WHERE id = %s
-            """, (position, message_id))
-        
-        conn.commit()
-        cursor.close()
-        
-        return {"message": "Mensagens reordenadas com sucesso"}
-        
-    except Exception as e:
-        print(f"❌ Erro ao reordenar mensagens: {e}")
-        if conn:
-            conn.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+    """Reordena as mensagens (mesma regra de POST /chatbot-messages/reorder)"""
+    order = reorder_active_messages(message_ids)
+    return {"message": "Mensagens reordenadas com sucesso", "order": order}
\ No newline at end of file
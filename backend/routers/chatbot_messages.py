@@ -1,9 +1,9 @@
 from typing import Optional, List
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, HTTPException, UploadFile, File
 from pydantic import BaseModel
 from db import get_connection
-import os
-import uuid
+import media_store
+import json
 
 router = APIRouter(prefix="/chatbot-messages", tags=["chatbot-messages"])
 
@@ -67,6 +67,127 @@ def create_message(payload: ChatbotMessage):
         conn.close()
 
 
+class ChatbotFlow(BaseModel):
+    messages: List[ChatbotMessage]
+
+
+@router.put("/bulk")
+def save_flow(payload: ChatbotFlow, background_tasks: BackgroundTasks):
+    """
+    Salva o fluxo inteiro numa transação: insere as mensagens sem id, atualiza
+    as que mudaram, desativa as que saíram da lista e grava as posições
+    conforme a ordem recebida. Retorna os ids (na ordem) e a nova versão do fluxo.
+    """
+    ids = [m.id for m in payload.messages if m.id is not None]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Lista de IDs contém duplicados")
+
+    incoming = [
+        {**m.model_dump(exclude={"is_active"}), "order_position": position}
+        for position, m in enumerate(payload.messages, start=1)
+    ]
+
+    conn = get_connection(autocommit=False)
+    try:
+        with conn, conn.cursor() as cur:
+            # trava a versão: saves concorrentes passam a ser serializados
+            cur.execute("SELECT version FROM chatbot_flow WHERE id = 1 FOR UPDATE")
+
+            cur.execute("""
+                WITH incoming AS (
+                    SELECT *
+                    FROM jsonb_to_recordset(%(messages)s::jsonb) AS x(
+                        id int, order_position int, message_type text,
+                        message_text text, wait_for_reply boolean, delay_seconds int,
+                        media_type text, media_url text, media_filename text
+                    )
+                ), unknown AS (
+                    SELECT i.id
+                    FROM incoming i
+                    WHERE i.id IS NOT NULL
+                      AND NOT EXISTS (
+                          SELECT 1 FROM chatbot_messages m
+                          WHERE m.id = i.id AND m.is_active = true
+                      )
+                ), removed AS (
+                    UPDATE chatbot_messages m
+                    SET is_active = false,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE m.is_active = true
+                      AND m.id NOT IN (SELECT id FROM incoming WHERE id IS NOT NULL)
+                    RETURNING m.id
+                ), updated AS (
+                    UPDATE chatbot_messages m
+                    SET order_position = i.order_position,
+                        message_type = i.message_type,
+                        message_text = i.message_text,
+                        wait_for_reply = i.wait_for_reply,
+                        delay_seconds = i.delay_seconds,
+                        media_type = i.media_type,
+                        media_url = i.media_url,
+                        media_filename = i.media_filename,
+                        updated_at = CURRENT_TIMESTAMP
+                    FROM incoming i
+                    WHERE m.id = i.id
+                      AND m.is_active = true
+                      AND (m.order_position, m.message_type, m.message_text, m.wait_for_reply,
+                           m.delay_seconds, m.media_type, m.media_url, m.media_filename)
+                          IS DISTINCT FROM
+                          (i.order_position, i.message_type, i.message_text, i.wait_for_reply,
+                           i.delay_seconds, i.media_type, i.media_url, i.media_filename)
+                    RETURNING m.id
+                ), inserted AS (
+                    INSERT INTO chatbot_messages (
+                        order_position, message_type, message_text, wait_for_reply,
+                        delay_seconds, media_type, media_url, media_filename
+                    )
+                    SELECT order_position, message_type, message_text, wait_for_reply,
+                           delay_seconds, media_type, media_url, media_filename
+                    FROM incoming
+                    WHERE id IS NULL
+                    RETURNING id, order_position
+                ), bumped AS (
+                    UPDATE chatbot_flow
+                    SET version = version + 1,
+                        updated_at = NOW()
+                    WHERE id = 1
+                    RETURNING version
+                )
+                SELECT
+                    (SELECT version FROM bumped) AS version,
+                    (SELECT COALESCE(array_agg(id), '{}') FROM unknown) AS unknown_ids,
+                    (SELECT COUNT(*) FROM inserted) AS inserted,
+                    (SELECT COUNT(*) FROM updated) AS updated,
+                    (SELECT COUNT(*) FROM removed) AS removed,
+                    ARRAY(
+                        SELECT COALESCE(i.id, n.id)
+                        FROM incoming i
+                        LEFT JOIN inserted n ON i.id IS NULL AND n.order_position = i.order_position
+                        ORDER BY i.order_position
+                    ) AS ids
+            """, {"messages": json.dumps(incoming)})
+            result = cur.fetchone()
+
+            if result["unknown_ids"]:
+                # `with conn` desfaz todas as escritas ao sair pela exceção
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Mensagens inexistentes ou inativas: {sorted(result['unknown_ids'])}"
+                )
+
+        background_tasks.add_task(media_store.collect_garbage)
+        return {
+            "message": "Fluxo salvo com sucesso",
+            "version": result["version"],
+            "ids": result["ids"],
+            "inserted": result["inserted"],
+            "updated": result["updated"],
+            "removed": result["removed"],
+        }
+    finally:
+        conn.close()
+
+
 @router.put("/{message_id}")
 def update_message(message_id: int, payload: ChatbotMessage):
     """Atualiza uma mensagem existente"""
@@ -103,7 +224,7 @@ def update_message(message_id: int, payload: ChatbotMessage):
 
 
 @router.delete("/{message_id}")
-def delete_message(message_id: int):
+def delete_message(message_id: int, background_tasks: BackgroundTasks):
     """Remove uma mensagem (soft delete)"""
     conn = get_connection()
     try:
@@ -114,50 +235,79 @@ def delete_message(message_id: int):
                 WHERE id = %s
             """, (message_id,))
             conn.commit()
+            background_tasks.add_task(media_store.collect_garbage)
             return {"message": "Mensagem removida com sucesso"}
     finally:
         conn.close()
 
 
-@router.post("/reorder")
-def reorder_messages(message_ids: List[int]):
-    """Reordena as mensagens baseado na lista de IDs"""
-    conn = get_connection()
+def reorder_active_messages(message_ids):
+    """
+    Reordena o fluxo ativo num UPDATE só (atômico). A lista precisa ser exatamente o
+    conjunto de mensagens ativas: lista parcial deixaria order_position repetido.
+    Usado também por POST /chatbot/messages/reorder.
+    """
+    if not message_ids:
+        raise HTTPException(status_code=400, detail="Lista de IDs vazia")
+    if len(set(message_ids)) != len(message_ids):
+        raise HTTPException(status_code=400, detail="Lista de IDs contém duplicados")
+
+    conn = get_connection(autocommit=False)
     try:
-        with conn.cursor() as cur:
-            for index, msg_id in enumerate(message_ids):
-                cur.execute("""
-                    UPDATE chatbot_messages
-                    SET order_position = %s
-                    WHERE id = %s
-                """, (index + 1, msg_id))
-            conn.commit()
-            return {"message": "Mensagens reordenadas com sucesso"}
+        with conn, conn.cursor() as cur:
+            # trava o conjunto ativo: ninguém ativa/desativa mensagens no meio da reordenação
+            cur.execute("SELECT id FROM chatbot_messages WHERE is_active = true FOR UPDATE")
+            active = {r["id"] for r in cur.fetchall()}
+            submitted = set(message_ids)
+            if submitted != active:
+                problems = []
+                unknown = sorted(submitted - active)
+                missing = sorted(active - submitted)
+                if unknown:
+                    problems.append(f"inexistentes ou inativas: {unknown}")
+                if missing:
+                    problems.append(f"faltando na lista: {missing}")
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"A lista deve conter exatamente as mensagens ativas ({'; '.join(problems)})"
+                )
+
+            cur.execute("""
+                UPDATE chatbot_messages m
+                SET order_position = o.position,
+                    updated_at = CURRENT_TIMESTAMP
+                FROM unnest(%s::int[]) WITH ORDINALITY AS o(id, position)
+                WHERE m.id = o.id
+                  AND m.is_active = true
+                RETURNING m.id, m.order_position
+            """, (message_ids,))
+            rows = cur.fetchall()
+
+        return sorted(rows, key=lambda r: r["order_position"])
     finally:
         conn.close()
 
 
+@router.post("/reorder")
+def reorder_messages(message_ids: List[int]):
+    """Reordena as mensagens baseado na lista de IDs (todas as ativas, na nova ordem)"""
+    order = reorder_active_messages(message_ids)
+    return {"message": "Mensagens reordenadas com sucesso", "order": order}
+
+
 @router.post("/upload-media")
 async def upload_media(file: UploadFile = File(...)):
-    """Faz upload de mídia (imagem, PDF, etc)"""
-
-    # Criar diretório se não existir
-    upload_dir = "uploads/chatbot"
-    os.makedirs(upload_dir, exist_ok=True)
-
-    # Gerar nome único
-    file_ext = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    file_path = os.path.join(upload_dir, unique_filename)
-
-    # Salvar arquivo
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
-
-    return {
-        "filename": unique_filename,
-        "original_name": file.filename,
-        "url": f"/uploads/chatbot/{unique_filename}",
-        "size": len(content)
-    }
+    """Faz upload de mídia (imagem, PDF, etc); conteúdo repetido reaproveita o arquivo existente"""
+    return await media_store.save_upload(file)
+
+
+@router.get("/media")
+def list_media():
+    """Lista as mídias enviadas e quantas mensagens ativas usam cada uma"""
+    return media_store.list_media()
+
+
+@router.post("/media/gc")
+def collect_media_garbage():
+    """Remove mídias que nenhuma mensagem ativa referencia"""
+    return media_store.collect_garbage()
@@ -1,8 +1,18 @@
-from fastapi import APIRouter, HTTPException
+import base64
+import json
+import re
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
 
+import csv_transfer
 from db import get_connection
+from cache import invalidate_dashboard
 import schemas
 
 
@@ -14,6 +24,29 @@ class CustomerBlockUpdate(BaseModel):
     blocked_reason: str | None = Field(None, example="Faltas repetidas")
 
 
+@router.post("/import")
+async def import_customers(file: UploadFile = File(...)):
+    """
+    Importa clientes de um CSV (COPY + upsert pelo telefone).
+    Colunas: phone; opcionais name, email, channel, is_blocked, blocked_reason.
+    Campos vazios mantêm o valor atual do cliente.
+    """
+    result = await run_in_threadpool(csv_transfer.import_customers, file.file)
+    invalidate_dashboard()
+    return result
+
+
+@router.get("/export")
+def export_customers(is_blocked: Optional[bool] = None):
+    """CSV de todos os clientes (ou só bloqueados/desbloqueados), gerado em streaming"""
+    query, params = csv_transfer.customers_export_query({"is_blocked": is_blocked})
+    return StreamingResponse(
+        csv_transfer.stream_csv(query, params, csv_transfer.CUSTOMER_COLUMNS),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="clientes.csv"'},
+    )
+
+
 @router.get("/{customer_id}")
 def get_customer(customer_id: int):
     conn = get_connection()
@@ -37,6 +70,7 @@ def get_customer(customer_id: int):
 
 @router.patch("/{customer_id}/block")
 def update_block_status(customer_id: int, data: CustomerBlockUpdate):
+    # O trigger customers_block_notify (migração 0004) avisa o bot via NOTIFY
     conn = get_connection()
     try:
         with conn, conn.cursor() as cur:
@@ -54,33 +88,98 @@ def update_block_status(customer_id: int, data: CustomerBlockUpdate):
             row = cur.fetchone()
             if not row:
                 raise HTTPException(status_code=404, detail="Cliente não encontrado")
+            invalidate_dashboard()
             return row
     finally:
         conn.close()
 
+CUSTOMERS_PAGE_SIZE = 50
+CUSTOMERS_PAGE_MAX = 200
+
+
+def encode_cursor(row):
+    """Cursor opaco com a chave de ordenação (is_blocked, last_appointment_date, id)"""
+    last = row["last_appointment_date"]
+    key = [row["is_blocked"], last.isoformat() if last else None, row["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        is_blocked, last, customer_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return bool(is_blocked), date.fromisoformat(last) if last else None, int(customer_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def customer_filters(
+    q: Optional[str] = Query(None, description="Prefixo do telefone ou do nome"),
+    cursor: Optional[str] = None,
+    limit: int = Query(CUSTOMERS_PAGE_SIZE, ge=1, le=CUSTOMERS_PAGE_MAX),
+):
+    return {"q": q.strip() if q else None, "cursor": cursor, "limit": limit}
+
+
+def build_list_query(filters):
+    """
+    SELECT paginado por keyset sobre o resumo mantido por trigger
+    (migrations/0002_customer_stats.sql), sem JOIN com appointments.
+    """
+    where = ["TRUE"]
+    params = []
+
+    if filters["q"]:
+        prefix = re.sub(r"([\\%_])", r"\\\1", filters["q"]) + "%"
+        where.append("(c.phone LIKE %s OR lower(c.name) LIKE lower(%s))")
+        params.extend([prefix, prefix])
+
+    if filters["cursor"]:
+        where.append(
+            "(c.is_blocked, COALESCE(c.last_appointment_date, '-infinity'::date), c.id)"
+            " < (%s, COALESCE(%s::date, '-infinity'::date), %s)"
+        )
+        params.extend(decode_cursor(filters["cursor"]))
+
+    params.append(filters["limit"] + 1)
+    query = f"""
+        SELECT
+          c.id,
+          c.name,
+          c.phone,
+          c.is_blocked,
+          c.blocked_reason,
+          c.total_appointments,
+          c.last_appointment_date
+        FROM customers c
+        WHERE {" AND ".join(where)}
+        ORDER BY c.is_blocked DESC,
+                 COALESCE(c.last_appointment_date, '-infinity'::date) DESC,
+                 c.id DESC
+        LIMIT %s
+    """
+    return query, params
+
+
+def build_page(rows, limit):
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
 @router.get("/")
-def list_customers():
+def list_customers(filters: dict = Depends(customer_filters)):
+    """
+    Lista clientes paginados (bloqueados primeiro, depois pelo último agendamento).
+    - `q` busca por prefixo do telefone ou do nome.
+    - Passe o `next_cursor` da resposta em `cursor` para buscar a próxima página.
+    """
+    query, params = build_list_query(filters)
     conn = get_connection()
     try:
         with conn, conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT
-                  c.id,
-                  c.name,
-                  c.phone,
-                  c.is_blocked,
-                  c.blocked_reason,
-                  COUNT(a.id) AS total_appointments,
-                  MAX(a.date) AS last_appointment_date
-                FROM customers c
-                LEFT JOIN appointments a ON a.customer_id = c.id
-                GROUP BY c.id, c.name, c.phone, c.is_blocked, c.blocked_reason
-                ORDER BY c.is_blocked DESC, last_appointment_date DESC NULLS LAST;
-                """
-            )
+            cur.execute(query, params)
             rows = cur.fetchall()
-        return rows
+        return build_page(rows, filters["limit"])
     finally:
         conn.close()
 
@@ -109,6 +208,7 @@ def delete_customer(customer_id: int):
                 # Exclui o cliente
                 cur.execute("DELETE FROM customers WHERE id = %s", (customer_id,))
                 
+        invalidate_dashboard()
         return {"message": "Cliente excluído com sucesso", "id": customer_id}
     finally:
         conn.close()
@@ -0,0 +1,164 @@
+"""
+Entrega das mídias do chatbot (/uploads/chatbot/...) com cache HTTP:
+ETag forte, Last-Modified, respostas 304, Range (vídeo) e zero-copy quando o servidor ASGI suporta.
+"""
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import APIRouter, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+from media_store import UPLOAD_DIR
+
+router = APIRouter(prefix="/uploads/chatbot", tags=["media"])
+
+CONTENT_HASHED = re.compile(r"^([0-9a-f]{64})(\.[A-Za-z0-9]+)?$")
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 256 * 1024
+
+# Nome = hash do conteúdo: o arquivo nunca muda, pode ficar em cache "para sempre"
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Nomes antigos (uuid) podem ser sobrescritos: o cliente revalida com ETag
+REVALIDATE_CACHE = "public, no-cache"
+
+
+class MediaFileResponse(Response):
+    """Envia um trecho do arquivo; usa http.response.zerocopysend se o servidor oferecer"""
+
+    def __init__(self, path, offset, count, status_code, headers, send_body=True):
+        super().__init__(status_code=status_code, headers=headers)
+        self.path = path
+        self.offset = offset
+        self.count = count
+        self.send_body = send_body
+
+    async def __call__(self, scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if not self.send_body or self.count == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        f = await run_in_threadpool(open, self.path, "rb")
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.offset,
+                    "count": self.count,
+                })
+                return
+
+            await run_in_threadpool(f.seek, self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await run_in_threadpool(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": remaining > 0,
+                })
+            if remaining > 0:
+                # arquivo encolheu no meio do envio: fecha o corpo mesmo assim
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            await run_in_threadpool(f.close)
+
+
+def _etag(filename, stat):
+    match = CONTENT_HASHED.match(filename)
+    if match:
+        return f'"{match.group(1)}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _not_modified(request, etag, stat):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(stat.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _parse_range(header, size):
+    """Retorna (início, fim) inclusivo; None = ignorar (arquivo inteiro); levanta 416 se inválido"""
+    match = RANGE_HEADER.match(header.strip())
+    if not match:
+        # multi-range ou formato desconhecido: a RFC permite responder com o arquivo inteiro
+        return None
+    start, end = match.groups()
+    if start == "" and end == "":
+        return None
+    if start == "":
+        length = int(end)
+        if length == 0:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+@router.api_route("/{filename}", methods=["GET", "HEAD"])
+def serve_media(filename: str, request: Request):
+    """Entrega uma mídia enviada pelo editor do chatbot"""
+    if filename.startswith(".") or os.path.basename(filename) != filename:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+    path = UPLOAD_DIR / filename
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+    etag = _etag(filename, stat)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": IMMUTABLE_CACHE if CONTENT_HASHED.match(filename) else REVALIDATE_CACHE,
+        "Accept-Ranges": "bytes",
+    }
+
+    if _not_modified(request, etag, stat):
+        return Response(status_code=304, headers=headers)
+
+    size = stat.st_size
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and size > 0:
+        if_range = request.headers.get("if-range")
+        # If-Range com validador diferente: o cliente tem versão velha, manda tudo
+        if not if_range or if_range.strip() in (etag, headers["Last-Modified"]):
+            byte_range = _parse_range(range_header, size)
+
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    headers["Content-Type"] = media_type
+    send_body = request.method != "HEAD"
+
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return MediaFileResponse(str(path), start, end - start + 1, 206, headers, send_body)
+
+    headers["Content-Length"] = str(size)
+    return MediaFileResponse(str(path), 0, size, 200, headers, send_body)
@@ -0,0 +1,32 @@
+"""
+Lembretes de agendamento (reminders.py): situação da fila e varredura manual.
+O envio em si é feito pelo bot.
+"""
+from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from reminders import ReminderScheduler, job_counts
+
+router = APIRouter(prefix="/reminders", tags=["reminders"])
+
+scheduler = ReminderScheduler()
+
+
+@router.get("/")
+async def get_reminders():
+    """Jobs por status (com o próximo run_at) e a última varredura"""
+    return {
+        "scheduler": scheduler.info(),
+        "jobs": await run_in_threadpool(job_counts),
+    }
+
+
+@router.post("/scan")
+async def scan_reminders():
+    """Varre agora, sem esperar o intervalo (ex.: depois de importar agendamentos)"""
+    result = await scheduler.run_once()
+    if result is None:
+        if scheduler.last_error:
+            raise HTTPException(status_code=500, detail=f"Erro na varredura: {scheduler.last_error}")
+        return {"message": "Outra varredura já está em andamento"}
+    return result
@@ -0,0 +1,55 @@
+"""
+Catálogo de serviços (tabela services), usado pelo painel e pelo bot.
+O ETag é a versão do catálogo (services_catalog, migração 0007): revalidar
+custa uma leitura por chave primária e a lista montada fica em cache por versão.
+"""
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import JSONResponse, Response
+
+from db import get_connection
+from cache import services_cache
+
+router = APIRouter(prefix="/services", tags=["services"])
+
+
+def catalog_version(cur):
+    cur.execute("SELECT version FROM services_catalog WHERE id = 1")
+    row = cur.fetchone()
+    return row["version"] if row else 0
+
+
+def fetch_services(cur, include_inactive):
+    cur.execute(
+        """
+        SELECT id, name, price::float AS price, duration_minutes, is_active
+        FROM services
+        WHERE is_active OR %s
+        ORDER BY id
+        """,
+        (include_inactive,),
+    )
+    return cur.fetchall()
+
+
+@router.get("/")
+def list_services(request: Request, include_inactive: bool = Query(False)):
+    """Lista os serviços; responde 304 se o cliente já tem a versão atual"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            version = catalog_version(cur)
+            etag = f'"services-{version}{"-all" if include_inactive else ""}"'
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+            if_none_match = request.headers.get("if-none-match")
+            if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+                return Response(status_code=304, headers=headers)
+
+            key = (version, include_inactive)
+            services = services_cache.get(key)
+            if services is None:
+                services = fetch_services(cur, include_inactive)
+                services_cache.set(key, services)
+            return JSONResponse(content=services, headers=headers)
+    finally:
+        conn.close()
@@ -1,19 +1,23 @@
 # Arquivo: backend/routers/whatsapp.py
-# SUBSTITUA COMPLETAMENTE:
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
 import os
-import base64
 import shutil
 import subprocess
-import signal
-import psutil
 from pathlib import Path
 import json
+import threading
 import time
 
+from starlette.concurrency import run_in_threadpool
+
+from bot_events import StatusBroadcaster
+from bot_supervisor import BotSupervisor
+
 router = APIRouter(prefix="/whatsapp", tags=["whatsapp"])
 
 # Caminhos
@@ -25,6 +29,11 @@ AUTH_CACHE_DIR = DATA_DIR / ".wwebjs_auth_rule"
 BOT_DIR = BASE_DIR / "chatbot" / "bot_rule"
 BOT_SCRIPT = BOT_DIR / "chatbot.js"
 PID_FILE = DATA_DIR / "bot_pid.txt"
+STATUS_FILE = DATA_DIR / "bot_status.json"
+SUPERVISOR_STATE_FILE = DATA_DIR / "bot_supervisor.json"
+
+# Intervalo entre comentários de keep-alive no SSE
+SSE_HEARTBEAT_SECONDS = 15
 
 # Garantir que diretórios existem
 DATA_DIR.mkdir(exist_ok=True)
@@ -33,131 +42,204 @@ IMAGE_DIR.mkdir(exist_ok=True)
 
 class WhatsAppStatus(BaseModel):
     status: str
-    qr_code: Optional[str] = None
+    qr_version: Optional[str] = None  # a imagem fica em /whatsapp/qr
     phone_number: Optional[str] = None
     bot_type: Optional[str] = None
     is_running: bool = False
 
 
-def is_bot_running():
-    """Verifica se o bot está rodando"""
-    if not PID_FILE.exists():
-        return False
-
+def _mtime(path):
     try:
-        with open(PID_FILE, "r") as f:
-            pid = int(f.read().strip())
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
 
-        # Verificar se o processo existe
-        if psutil.pid_exists(pid):
-            process = psutil.Process(pid)
-            # Verificar se é realmente nosso bot (node chatbot.js)
-            if "node" in process.name().lower() or "node.exe" in process.name().lower():
-                return True
+class QRCache:
+    """
+    Guarda o PNG do QR em memória. A versão é o timestamp de geração informado
+    pelo bot (ou o mtime do arquivo, se ele não informar); o arquivo só é relido
+    quando a versão muda.
+    """
 
-        # Se chegou aqui, o PID não é válido
-        PID_FILE.unlink()
-        return False
-    except:
-        return False
+    def __init__(self, path):
+        self.path = path
+        self.version = None
+        self.data = None
+        self._lock = threading.Lock()
+
+    def current_version(self):
+        mtime = _mtime(self.path)
+        if mtime is None:
+            return None
+        return supervisor.status.get("qr_version") or f"{mtime:x}"
+
+    def get(self):
+        """Retorna (versão, bytes) do QR atual ou None"""
+        version = self.current_version()
+        if version is None:
+            self.clear()
+            return None
+        with self._lock:
+            if version != self.version:
+                try:
+                    self.data = self.path.read_bytes()
+                except FileNotFoundError:
+                    self.version = self.data = None
+                    return None
+                self.version = version
+            return self.version, self.data
 
+    def clear(self):
+        with self._lock:
+            self.version = self.data = None
 
-def kill_bot_process():
-    """Para o processo do bot"""
-    if not PID_FILE.exists():
-        return False
 
-    try:
-        with open(PID_FILE, "r") as f:
-            pid = int(f.read().strip())
-
-        if psutil.pid_exists(pid):
-            process = psutil.Process(pid)
-            # Terminar processo e todos os filhos
-            children = process.children(recursive=True)
-            for child in children:
-                child.terminate()
-            process.terminate()
-
-            # Aguardar um pouco
-            psutil.wait_procs([process] + children, timeout=5)
-
-        PID_FILE.unlink()
-        return True
-    except Exception as e:
-        print(f"Erro ao matar processo: {e}")
-        if PID_FILE.exists():
-            PID_FILE.unlink()
-        return False
+qr_cache = QRCache(QR_PATH)
+
+
+def status_signature():
+    """Assinatura barata do estado: só recalcula o status completo quando ela muda"""
+    return (supervisor.version, _mtime(QR_PATH))
+
+
+status_events = StatusBroadcaster(
+    compute_status=lambda: get_whatsapp_status().model_dump(),
+    signature=status_signature,
+)
+
+def clear_runtime_files():
+    """Remove QR Code e status antigos do bot"""
+    removed = []
+    for label, path in (("QR Code", QR_PATH), ("Arquivo de status", STATUS_FILE)):
+        if path.exists():
+            try:
+                path.unlink()
+                removed.append(label)
+            except Exception as e:
+                print(f"Erro ao remover {path}: {e}")
+    qr_cache.clear()
+    return removed
+
+
+supervisor = BotSupervisor(
+    command=["node", "chatbot.js"],
+    cwd=BOT_DIR,
+    pid_file=PID_FILE,
+    state_file=SUPERVISOR_STATE_FILE,
+    on_change=status_events.poke,
+    on_spawn=clear_runtime_files,
+)
+
+
+def is_bot_running():
+    """Verifica se o bot está rodando"""
+    return supervisor.is_running
 
 
 @router.get("/status", response_model=WhatsAppStatus)
 def get_whatsapp_status():
-    """Retorna o status atual do WhatsApp Bot e QR code se disponível"""
-    
-    # Verificar se bot está rodando
-    bot_running = is_bot_running()
-    
+    """Retorna o status atual do WhatsApp Bot e a versão do QR code se disponível"""
+
     # Se o bot NÃO está rodando, sempre retornar desconectado
-    if not bot_running:
+    if not is_bot_running():
         return WhatsAppStatus(
             status="disconnected",
-            qr_code=None,
             phone_number=None,
             bot_type=None,
             is_running=False
         )
-    
-    # Verificar se existe QR code salvo
-    qr_base64 = None
-    if QR_PATH.exists():
-        try:
-            with open(QR_PATH, "rb") as f:
-                qr_bytes = f.read()
-                qr_base64 = base64.b64encode(qr_bytes).decode('utf-8')
-        except Exception as e:
-            print(f"Erro ao ler QR code: {e}")
-    
-    # Verificar arquivo de status
-    status_file = DATA_DIR / "bot_status.json"
-    
-    if status_file.exists():
-        try:
-            with open(status_file, "r") as f:
-                status_data = json.load(f)
-                
-                # Se tem status de conectado e bot está rodando
-                if status_data.get("status") == "connected":
-                    return WhatsAppStatus(
-                        status="connected",
-                        qr_code=None,  # Não precisa QR quando conectado
-                        phone_number=status_data.get("phone_number"),
-                        bot_type=status_data.get("bot_type", "rule"),
-                        is_running=True
-                    )
-        except Exception as e:
-            print(f"Erro ao ler status: {e}")
-    
-    # Se chegou aqui: bot está rodando mas ainda não conectou
-    # Se tem QR code, mostrar
-    if qr_base64:
+
+    # Status em memória, vindo do stdout do bot
+    status_data = supervisor.status
+    if status_data.get("status") == "connected":
+        return WhatsAppStatus(
+            status="connected",
+            phone_number=status_data.get("phone_number"),
+            bot_type=status_data.get("bot_type", "rule"),
+            is_running=True
+        )
+
+    # Bot rodando mas ainda não conectou: se tem QR code, informar a versão
+    qr_version = qr_cache.current_version()
+    if qr_version:
         return WhatsAppStatus(
             status="qr_pending",
-            qr_code=qr_base64,
+            qr_version=qr_version,
             is_running=True
         )
-    
+
     # Bot rodando mas sem QR ainda (iniciando)
     return WhatsAppStatus(
         status="disconnected",
-        qr_code=None,
         is_running=True
     )
 
 
+@router.get("/qr")
+def get_qr_code(request: Request):
+    """PNG do QR code atual; responde 304 se o cliente já tem essa versão"""
+    if not is_bot_running():
+        raise HTTPException(status_code=404, detail="Nenhum QR code disponível")
+
+    current = qr_cache.get()
+    if current is None:
+        raise HTTPException(status_code=404, detail="Nenhum QR code disponível")
+
+    version, data = current
+    etag = f'"qr-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type="image/png", headers=headers)
+
+
+@router.get("/events")
+async def whatsapp_events(request: Request):
+    """
+    Stream SSE com o status do bot. Envia o estado atual ao conectar e depois
+    só quando ele muda; todos os painéis abertos compartilham um único observador.
+    """
+    queue = status_events.subscribe()
+
+    async def stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    status = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: status\ndata: {json.dumps(status)}\n\n"
+        finally:
+            status_events.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/supervisor")
+def get_supervisor_info():
+    """Estado do supervisor: PID, reinícios, último código de saída e fim do log"""
+    return supervisor.info()
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: int):
+    """Acompanha um start/stop/restart/disconnect agendado"""
+    job = supervisor.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+
 @router.post("/start")
-def start_bot():
-    """Inicia o bot do WhatsApp"""
+async def start_bot():
+    """Inicia o bot do WhatsApp (não bloqueia: acompanhe pelo job ou pelo /events)"""
 
     # Verificar se já está rodando
     if is_bot_running():
@@ -170,92 +252,52 @@ def start_bot():
             detail=f"Script do bot não encontrado em: {BOT_SCRIPT}"
         )
 
-    try:
-        # Iniciar processo em background
-        if os.name == 'nt':  # Windows
-            process = subprocess.Popen(
-                ["node", "chatbot.js"],
-                cwd=BOT_DIR,
-                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-        else:  # Linux/Mac
-            process = subprocess.Popen(
-                ["node", "chatbot.js"],
-                cwd=BOT_DIR,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                preexec_fn=os.setpgrp
-            )
-
-        # Salvar PID
-        with open(PID_FILE, "w") as f:
-            f.write(str(process.pid))
-
-        return {
-            "message": "Bot iniciado com sucesso! Aguarde o QR Code aparecer...",
-            "success": True,
-            "pid": process.pid
-        }
+    async def run():
+        await run_in_threadpool(clear_runtime_files)
+        await supervisor.start()
+        return {"pid": supervisor.process.pid if supervisor.is_running else None}
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erro ao iniciar bot: {str(e)}"
-        )
+    job = supervisor.submit("start", run)
+    return {
+        "message": "Bot iniciando! Aguarde o QR Code aparecer...",
+        "success": True,
+        "job_id": job["id"]
+    }
 
 
 @router.post("/stop")
-def stop_bot():
+async def stop_bot():
     """Para o bot do WhatsApp"""
 
     if not is_bot_running():
         return {"message": "Bot não está rodando", "success": False}
 
-    try:
-        if kill_bot_process():
-            # Limpar QR Code e status ao parar
-            if QR_PATH.exists():
-                QR_PATH.unlink()
-
-            status_file = DATA_DIR / "bot_status.json"
-            if status_file.exists():
-                status_file.unlink()
-
-            return {"message": "Bot parado com sucesso!", "success": True}
-        else:
-            return {"message": "Erro ao parar bot", "success": False}
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erro ao parar bot: {str(e)}"
-        )
+    async def run():
+        stopped = await supervisor.stop()
+        # Limpar QR Code e status ao parar
+        await run_in_threadpool(clear_runtime_files)
+        return {"stopped": stopped}
+
+    job = supervisor.submit("stop", run)
+    return {"message": "Parando o bot...", "success": True, "job_id": job["id"]}
 
 
 @router.post("/restart")
-def restart_bot():
+async def restart_bot():
     """Reinicia o bot do WhatsApp"""
 
-    try:
-        # Parar se estiver rodando
-        if is_bot_running():
-            kill_bot_process()
-            import time
-            time.sleep(2)  # Aguardar um pouco
+    async def run():
+        await supervisor.stop()
+        await run_in_threadpool(clear_runtime_files)
+        await supervisor.start()
+        return {"pid": supervisor.process.pid if supervisor.is_running else None}
 
-        # Iniciar novamente
-        result = start_bot()
-        return {
-            "message": "Bot reiniciado com sucesso!",
-            "success": True
-        }
-
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erro ao reiniciar bot: {str(e)}"
-        )
+    job = supervisor.submit("restart", run)
+    return {
+        "message": "Bot reiniciando...",
+        "success": True,
+        "job_id": job["id"]
+    }
 
 
 def force_remove_directory(path):
@@ -268,7 +310,7 @@ def force_remove_directory(path):
             return True
         except PermissionError:
             if attempt < max_attempts - 1:
-                time.sleep(1)  # Aguardar 1 segundo
+                time.sleep(1)  # Aguardar 1 segundo (roda numa thread do job)
                 continue
             return False
         except Exception as e:
@@ -277,77 +319,62 @@ def force_remove_directory(path):
     return False
 
 
+def remove_auth_cache():
+    """Remove o cache de autenticação; levanta exceção com instruções se não conseguir"""
+    if not AUTH_CACHE_DIR.exists():
+        return None
+
+    print(f"🗑️ Removendo cache: {AUTH_CACHE_DIR}")
+    if force_remove_directory(AUTH_CACHE_DIR):
+        return "Cache de autenticação"
+
+    # Se ainda falhar, tentar método alternativo
+    try:
+        # No Windows, às vezes precisa de força bruta
+        if os.name == 'nt':  # Windows
+            subprocess.run(
+                ['rmdir', '/S', '/Q', str(AUTH_CACHE_DIR)],
+                shell=True,
+                capture_output=True
+            )
+            if not AUTH_CACHE_DIR.exists():
+                return "Cache de autenticação (forçado)"
+            raise Exception("Não foi possível remover o cache")
+        raise Exception("Método alternativo só funciona no Windows")
+    except Exception as e:
+        raise Exception(
+            f"⚠️ Não foi possível remover o cache completamente.\n\n"
+            f"Erro: {str(e)}\n\n"
+            f"Solução manual:\n"
+            f"1. Feche TODOS os terminais\n"
+            f"2. Delete a pasta manualmente:\n"
+            f"{AUTH_CACHE_DIR}"
+        )
+
+
 @router.post("/disconnect")
-def disconnect_whatsapp():
+async def disconnect_whatsapp():
     """
     Para o bot e remove o cache de autenticação do WhatsApp.
-    Faz tudo automaticamente!
+    Roda como job: acompanhe em /whatsapp/jobs/{job_id}.
     """
 
-    try:
+    async def run():
         removed_items = []
 
-        # PASSO 1: Parar o bot se estiver rodando
+        # PASSO 1: Parar o bot e esperar o processo (e o Chromium) sair de fato
         if is_bot_running():
             print("🛑 Parando bot antes de remover cache...")
-            kill_bot_process()
-            time.sleep(4)
+            await supervisor.stop()
             removed_items.append("Processo do bot parado")
 
-        # PASSO 2: Remover QR code
-        if QR_PATH.exists():
-            try:
-                QR_PATH.unlink()
-                removed_items.append("QR Code")
-            except Exception as e:
-                print(f"Erro ao remover QR: {e}")
-
-        # PASSO 3: Remover arquivo de status
-        status_file = DATA_DIR / "bot_status.json"
-        if status_file.exists():
-            try:
-                status_file.unlink()
-                removed_items.append("Arquivo de status")
-            except Exception as e:
-                print(f"Erro ao remover status: {e}")
+        # PASSO 2 e 3: Remover QR code e arquivo de status
+        removed_items += await run_in_threadpool(clear_runtime_files)
 
         # PASSO 4: Remover cache de autenticação (com retry)
-        if AUTH_CACHE_DIR.exists():
-            print(f"🗑️ Removendo cache: {AUTH_CACHE_DIR}")
-
-            if force_remove_directory(AUTH_CACHE_DIR):
-                removed_items.append("Cache de autenticação")
-            else:
-                # Se ainda falhar, tentar método alternativo
-                try:
-                    # No Windows, às vezes precisa de força bruta
-                    import subprocess
-                    if os.name == 'nt':  # Windows
-                        subprocess.run(
-                            ['rmdir', '/S', '/Q', str(AUTH_CACHE_DIR)],
-                            shell=True,
-                            capture_output=True
-                        )
-                        if not AUTH_CACHE_DIR.exists():
-                            removed_items.append(
-                                "Cache de autenticação (forçado)")
-                        else:
-                            raise Exception("Não foi possível remover o cache")
-                    else:
-                        raise Exception(
-                            "Método alternativo só funciona no Windows")
-                except Exception as e:
-                    raise HTTPException(
-                        status_code=500,
-                        detail=(
-                            f"⚠️ Não foi possível remover o cache completamente.\n\n"
-                            f"Erro: {str(e)}\n\n"
-                            f"Solução manual:\n"
-                            f"1. Feche TODOS os terminais\n"
-                            f"2. Delete a pasta manualmente:\n"
-                            f"{AUTH_CACHE_DIR}"
-                        )
-                    )
+        removed = await run_in_threadpool(remove_auth_cache)
+        if removed:
+            removed_items.append(removed)
 
         if removed_items:
             return {
@@ -355,20 +382,14 @@ def disconnect_whatsapp():
                 "removed": removed_items,
                 "success": True
             }
-        else:
-            return {
-                "message": "Nenhuma sessão ativa encontrada",
-                "removed": [],
-                "success": False
-            }
+        return {
+            "message": "Nenhuma sessão ativa encontrada",
+            "removed": [],
+            "success": False
+        }
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erro ao desconectar: {str(e)}"
-        )
+    job = supervisor.submit("disconnect", run)
+    return {"message": "Desconectando...", "success": True, "job_id": job["id"]}
 
 
 @router.post("/clear-qr")
@@ -377,6 +398,7 @@ def clear_qr_code():
     try:
         if QR_PATH.exists():
             QR_PATH.unlink()
+        qr_cache.clear()
         return {"message": "QR code removido", "success": True}
     except Exception as e:
         raise HTTPException(
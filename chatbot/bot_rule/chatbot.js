@@ -1,11 +1,17 @@
 // Arquivo: chatbot/bot_rule/chatbot.js
 // SUBSTITUA COMPLETAMENTE
 
-const { Client, LocalAuth, MessageMedia } = require('whatsapp-web.js');
+const { Client, LocalAuth } = require('whatsapp-web.js');
 const { Pool } = require('pg');
 const fs = require('fs');
 const path = require('path');
 const qr = require('qrcode');
+const { ConversationStore } = require('./conversation-store');
+const flowEngine = require('./flow-engine');
+const { SendQueue } = require('./send-queue');
+const { MediaCache } = require('./media-cache');
+const { ReminderDispatcher } = require('./reminder-dispatcher');
+const { compileFlowProgram } = flowEngine;
 
 // ==================== CONFIGURAÇÃO ====================
 
@@ -16,6 +22,7 @@ const ASSETS_DIR = path.join(DATA_DIR, 'assets');
 const QR_PATH = path.join(IMAGE_DIR, 'whatsapp_qr.png');
 const STATUS_PATH = path.join(DATA_DIR, 'bot_status.json');
 const CATALOGO_PATH = path.join(ASSETS_DIR, 'catalogo.pdf');
+const MEDIA_DIR = path.join(BASE_DIR, 'backend', 'uploads', 'chatbot');
 
 [DATA_DIR, IMAGE_DIR, ASSETS_DIR].forEach(dir => {
     if (!fs.existsSync(dir)) {
@@ -69,46 +76,57 @@ const client = new Client({
 });
 
 // ==================== SERVIÇOS ====================
+// Catálogo vem da tabela services (o mesmo do GET /services do backend).
+// O menu é montado uma vez por versão do catálogo; o banco avisa quando ele muda
+// (NOTIFY chatbot_config 'services', migração 0007).
 
-const SERVICOS = {
-    1: { nome: 'BrowLaminations', preco: 'R$ 150,00' },
-    2: { nome: 'Design de Sobrancelhas', preco: 'R$ 35,00' },
-    3: { nome: 'Design em sobrancelhas micropigmentadas', preco: 'R$ 30,00' },
-    4: { nome: 'Drenagem Linfática (10 sessões)', preco: 'R$ 750,00' },
-    5: { nome: 'Drenagem Linfática (5 sessões)', preco: 'R$ 400,00' },
-    6: { nome: 'Drenagem Linfática (1 sessão)', preco: 'R$ 90,00' },
-    7: { nome: 'Epilação Buço', preco: 'R$ 10,00' },
-    8: { nome: 'Epilação Facial', preco: 'R$ 60,00' },
-    9: { nome: 'Epilação Buço e queixo', preco: 'R$ 20,00' },
-    10: { nome: 'SPA Lips - esfoliação e hidratação labial', preco: 'R$ 40,00' },
-    11: { nome: 'Hidragloss 1 sessão', preco: 'R$ 150,00' },
-    12: { nome: 'Lash Lifting', preco: 'R$ 120,00' },
-    13: { nome: 'Limpeza de pele', preco: 'R$ 150,00' },
-    14: { nome: 'Massagem modeladora (1 sessão)', preco: 'R$ 90,00' },
-    15: { nome: 'Massagem modeladora (10 sessões)', preco: 'R$ 750,00' },
-    16: { nome: 'Massagem modeladora (5 sessões)', preco: 'R$ 400,00' },
-    17: { nome: 'Massagem Terapêutica (1 sessão)', preco: 'R$ 90,00' },
-    18: { nome: 'Massagem Terapêutica (10 sessões)', preco: 'R$ 750,00' },
-    19: { nome: 'Massagem Terapêutica (5 sessões)', preco: 'R$ 400,00' },
-    20: { nome: 'Micropigmentação Labial (duas sessões)', preco: 'R$ 575,00' },
-    21: { nome: 'Micropigmentação Labial (uma sessão)', preco: 'R$ 290,00' },
-    22: { nome: 'Micropigmentação sobrancelhas - fio a fio ou Shadow (duas sessões)', preco: 'R$ 430,00' },
-    23: { nome: 'Micropigmentação sobrancelhas - fio a fio ou Shadow (uma sessão)', preco: 'R$ 250,00' },
-    24: { nome: 'Remoção e hidratação dos cílios', preco: 'R$ 40,00' },
-    25: { nome: 'Alongamento de cílios volume Express Soft', preco: 'R$ 120,00' },
-    26: { nome: 'Design e Henna', preco: 'R$ 50,00' }
-};
+let SERVICOS = {};          // número no menu -> { id, nome, preco }
+let MENU_SERVICOS = '';     // lista pronta para a mensagem da etapa 2
+
+function formatarPreco(preco) {
+    if (preco === null || preco === undefined) return '';
+    return 'R$ ' + Number(preco).toLocaleString('pt-BR', { minimumFractionDigits: 2, maximumFractionDigits: 2 });
+}
+
+function compileServices(rows) {
+    const servicos = {};
+    let menu = '';
+    rows.forEach((row, index) => {
+        const numero = index + 1;
+        const servico = Object.freeze({ id: row.id, nome: row.name, preco: formatarPreco(row.price) });
+        servicos[numero] = servico;
+        menu += `*${numero}* - ${servico.nome}${servico.preco ? ' ' + servico.preco : ''}\n`;
+    });
+    return { servicos: Object.freeze(servicos), menu };
+}
+
+async function loadServices() {
+    try {
+        const result = await pool.query(`
+            SELECT id, name, price
+            FROM services
+            WHERE is_active = true
+            ORDER BY id
+        `);
+        const { servicos, menu } = compileServices(result.rows);
+        SERVICOS = servicos;
+        MENU_SERVICOS = menu;
+        console.log(`💆 ${result.rows.length} serviços carregados`);
+        return true;
+    } catch (error) {
+        // Mantém o catálogo anterior
+        console.error('❌ Erro ao carregar serviços:', error);
+        return false;
+    }
+}
 
 // ==================== VARIÁVEIS GLOBAIS ====================
 
 let MENSAGENS_PROGRAMADAS = [];
 let CHATBOT_SETTINGS = null;
-let conversasAtivas = {};
-let conversasEncerradas = new Set();
 let PALAVRA_CHAVE_REATIVAR = 'atendimento';
 let FLOW_MODE = 'default'; // 'default' ou 'custom'
 
-const delay = ms => new Promise(res => setTimeout(res, ms));
 let lastQrGeneration = 0;
 const QR_GENERATION_INTERVAL = 60000;
 
@@ -119,11 +137,15 @@ async function saveStatus(status, phoneNumber = null) {
         status: status,
         phone_number: phoneNumber,
         bot_type: 'rule',
+        // Versão do QR (momento em que foi gerado): o painel só baixa a imagem quando ela muda
+        qr_version: status === 'qr_pending' ? String(lastQrGeneration) : null,
         last_update: new Date().toISOString()
     };
     
     try {
         fs.writeFileSync(STATUS_PATH, JSON.stringify(statusData, null, 2));
+        // Canal rápido: o supervisor do backend lê esta linha do stdout
+        console.log('@@STATUS ' + JSON.stringify(statusData));
         console.log(`📊 Status salvo: ${status}`);
     } catch (error) {
         console.error('❌ Erro ao salvar status:', error);
@@ -132,44 +154,101 @@ async function saveStatus(status, phoneNumber = null) {
 
 // ==================== FUNÇÕES DE BANCO ====================
 
-async function loadChatbotSettings() {
+// Configurações e mensagens formam um "fluxo" compilado e imutável. Um reload
+// monta o fluxo novo por inteiro e só então troca a referência: quem está no meio
+// de uma resposta nunca vê metade da configuração antiga e metade da nova.
+let FLOW = null;
+
+function compileFlow(settings, messages) {
+    const ordered = messages
+        .slice()
+        .sort((a, b) => a.order_position - b.order_position || a.id - b.id);
+    const program = compileFlowProgram(ordered);
+
+    return Object.freeze({
+        loadedAt: new Date().toISOString(),
+        settings: settings ? Object.freeze({ ...settings }) : null,
+        mode: (settings && settings.flow_mode) || 'default',
+        messages: Object.freeze(ordered),
+        program,
+        steps: program.steps
+    });
+}
+
+function applyFlow(flow) {
+    FLOW = flow;
+    CHATBOT_SETTINGS = flow.settings;
+    FLOW_MODE = flow.mode;
+    MENSAGENS_PROGRAMADAS = flow.messages;
+}
+
+async function loadFlow() {
     try {
-        const result = await pool.query(`
-            SELECT * FROM chatbot_settings
-            WHERE active_bot_type = 'rule'
-            ORDER BY id
-            LIMIT 1
-        `);
-        
-        if (result.rows.length > 0) {
-            CHATBOT_SETTINGS = result.rows[0];
-            FLOW_MODE = CHATBOT_SETTINGS.flow_mode || 'default';
-            console.log(`⚙️ Configurações carregadas: Bot tipo ${CHATBOT_SETTINGS.active_bot_type}`);
-            console.log(`🔀 Modo de fluxo: ${FLOW_MODE}`);
+        const [settingsResult, messagesResult] = await Promise.all([
+            pool.query(`
+                SELECT * FROM chatbot_settings
+                WHERE active_bot_type = 'rule'
+                ORDER BY id
+                LIMIT 1
+            `),
+            // Carrega sempre: trocar para o modo personalizado não exige outro reload
+            pool.query(`
+                SELECT * FROM chatbot_messages
+                WHERE is_active = true
+                ORDER BY order_position ASC
+            `)
+        ]);
+
+        const flow = compileFlow(settingsResult.rows[0] || null, messagesResult.rows);
+        applyFlow(flow);
+
+        // Deixa as mídias do fluxo (e o catálogo) prontas antes do primeiro envio
+        const arquivos = flow.steps.filter(step => step.media).map(step => caminhoMidia(step.media.url));
+        if (fs.existsSync(CATALOGO_PATH)) arquivos.push(CATALOGO_PATH);
+        midias.preload(arquivos);
+
+        if (flow.settings) {
+            console.log(`⚙️ Configurações carregadas: Bot tipo ${flow.settings.active_bot_type}`);
+        }
+        console.log(`🔀 Modo de fluxo: ${flow.mode}`);
+        if (flow.mode === 'default') {
+            console.log('📋 Usando fluxo PADRÃO (hardcoded)');
+        } else {
+            console.log(`📋 ${flow.steps.length} mensagens personalizadas carregadas`);
         }
+        return true;
     } catch (error) {
-        console.error('❌ Erro ao carregar configurações:', error);
+        // Mantém o fluxo anterior
+        console.error('❌ Erro ao carregar configurações/mensagens:', error);
+        return false;
     }
 }
 
-async function loadProgrammedMessages() {
-    if (FLOW_MODE === 'default') {
-        console.log('📋 Usando fluxo PADRÃO (hardcoded)');
-        return;
-    }
-    
-    try {
-        const result = await pool.query(`
-            SELECT * FROM chatbot_messages
-            WHERE is_active = true
-            ORDER BY order_position ASC
-        `);
-        
-        MENSAGENS_PROGRAMADAS = result.rows;
-        console.log(`📋 ${MENSAGENS_PROGRAMADAS.length} mensagens personalizadas carregadas`);
-    } catch (error) {
-        console.error('❌ Erro ao carregar mensagens:', error);
-    }
+// Vários avisos seguidos (ex.: "Salvar tudo" no editor) viram um único reload
+const FLOW_RELOAD_DEBOUNCE_MS = 300;
+let flowReloadTimer = null;
+let flowReloading = false;
+let flowReloadPending = false;
+
+function scheduleFlowReload() {
+    if (flowReloadTimer) clearTimeout(flowReloadTimer);
+    flowReloadTimer = setTimeout(async () => {
+        flowReloadTimer = null;
+        if (flowReloading) {
+            flowReloadPending = true;
+            return;
+        }
+        flowReloading = true;
+        try {
+            do {
+                flowReloadPending = false;
+                console.log('🔄 Configuração do chatbot alterada, recarregando fluxo...');
+                await loadFlow();
+            } while (flowReloadPending);
+        } finally {
+            flowReloading = false;
+        }
+    }, FLOW_RELOAD_DEBOUNCE_MS);
 }
 
 async function saveCustomer(phone, name, email = null) {
@@ -190,21 +269,135 @@ async function saveCustomer(phone, name, email = null) {
 }
 
 async function checkCustomerBlocked(phone) {
+    const cached = blockCacheGet(phone);
+    if (cached !== undefined) {
+        return cached;
+    }
+
     try {
+        const seq = blockNotifySeq;
         const result = await pool.query(`
             SELECT is_blocked FROM customers WHERE phone = $1
         `, [phone]);
         
-        if (result.rows.length > 0) {
-            return result.rows[0].is_blocked;
+        const blocked = result.rows.length > 0 ? result.rows[0].is_blocked === true : false;
+        // Se chegou um NOTIFY durante a consulta, o resultado pode estar velho: não guarda
+        if (blockListenerReady && seq === blockNotifySeq) {
+            blockCacheSet(phone, blocked);
         }
-        return false;
+        return blocked;
     } catch (error) {
         console.error('❌ Erro ao verificar bloqueio:', error);
         return false;
     }
 }
 
+// ==================== CACHE DE BLOQUEIO ====================
+// O banco avisa (NOTIFY customer_block, migração 0004) quando um bloqueio muda;
+// o cache só é usado enquanto o LISTEN está ativo, então bloqueios valem na hora.
+
+const BLOCK_CACHE_TTL_MS = 10 * 60 * 1000;
+const BLOCK_CACHE_MAX = 5000;
+
+const blockCache = new Map(); // phone -> { blocked, expiresAt } (ordem de inserção = LRU)
+const blockCacheStats = { hits: 0, misses: 0, notifications: 0 };
+let blockListenerReady = false;
+let blockNotifySeq = 0;
+
+function blockCacheGet(phone) {
+    if (!blockListenerReady) {
+        return undefined;
+    }
+    const entry = blockCache.get(phone);
+    if (!entry || entry.expiresAt < Date.now()) {
+        blockCache.delete(phone);
+        blockCacheStats.misses++;
+        return undefined;
+    }
+    // renova a posição no LRU
+    blockCache.delete(phone);
+    blockCache.set(phone, entry);
+    blockCacheStats.hits++;
+    return entry.blocked;
+}
+
+function blockCacheSet(phone, blocked) {
+    blockCache.delete(phone);
+    blockCache.set(phone, { blocked, expiresAt: Date.now() + BLOCK_CACHE_TTL_MS });
+    if (blockCache.size > BLOCK_CACHE_MAX) {
+        blockCache.delete(blockCache.keys().next().value);
+    }
+}
+
+function onBlockNotification(payload) {
+    blockNotifySeq++;
+    blockCacheStats.notifications++;
+    try {
+        const { phone, is_blocked } = JSON.parse(payload);
+        blockCacheSet(phone, is_blocked === true);
+        if (is_blocked) console.log(`🚫 Bloqueio atualizado: ${phone}`);
+    } catch (error) {
+        console.error('⚠️ NOTIFY customer_block inválido:', payload);
+    }
+}
+
+// ==================== NOTIFICAÇÕES DO BANCO ====================
+// Uma conexão dedicada escuta todos os canais (migrações 0004, 0005 e 0009)
+
+const DB_LISTEN_RETRY_MS = 5000;
+
+const DB_CHANNELS = {
+    customer_block: onBlockNotification,
+    chatbot_config: (payload) => (payload === 'services' ? loadServices() : scheduleFlowReload()),
+    reminder_jobs: () => lembretes.wake()
+};
+
+async function startDbListener() {
+    let listener = null;
+
+    const retry = (error) => {
+        if (!listener) return;
+        console.error('⚠️ LISTEN caiu, usando o banco direto:', error.message);
+        blockListenerReady = false;
+        blockCache.clear();
+        listener.removeAllListeners('notification');
+        listener.removeAllListeners('error');
+        listener.release(true);
+        listener = null;
+        setTimeout(startDbListener, DB_LISTEN_RETRY_MS);
+    };
+
+    try {
+        listener = await pool.connect();
+        listener.on('error', retry);
+        listener.on('notification', (notification) => {
+            const handler = DB_CHANNELS[notification.channel];
+            if (handler) handler(notification.payload);
+        });
+        for (const channel of Object.keys(DB_CHANNELS)) {
+            await listener.query(`LISTEN ${channel}`);
+        }
+        // Avisos perdidos enquanto estava desconectado: começa do zero
+        blockCache.clear();
+        blockListenerReady = true;
+        if (FLOW) {
+            scheduleFlowReload();
+            loadServices();
+        }
+        lembretes.wake();
+        console.log(`👂 Escutando o banco: ${Object.keys(DB_CHANNELS).join(', ')}`);
+    } catch (error) {
+        if (listener) {
+            retry(error);
+        } else {
+            console.error('⚠️ Não foi possível escutar o banco:', error.message);
+            setTimeout(startDbListener, DB_LISTEN_RETRY_MS);
+        }
+    }
+}
+
+startDbListener();
+
 // ==================== EVENTOS DE CONEXÃO ====================
 
 client.on('qr', async (qrString) => {
@@ -218,8 +411,6 @@ client.on('qr', async (qrString) => {
     lastQrGeneration = now;
     console.log('📱 QR_GENERATED');
     
-    await saveStatus('qr_pending');
-    
     try {
         await qr.toFile(QR_PATH, qrString, {
             color: { dark: '#000000', light: '#FFFFFF' },
@@ -229,6 +420,9 @@ client.on('qr', async (qrString) => {
     } catch (error) {
         console.error('❌ Erro ao salvar QR:', error.message);
     }
+
+    // Avisa depois de gravar: a versão do status sempre aponta para um arquivo completo
+    await saveStatus('qr_pending');
 });
 
 client.on('authenticated', () => {
@@ -241,8 +435,8 @@ client.on('ready', async () => {
     
     await saveStatus('connected', client.info.wid.user);
     
-    await loadChatbotSettings();
-    await loadProgrammedMessages();
+    await loadFlow();
+    lembretes.setReady(true);
     
     try {
         if (fs.existsSync(QR_PATH)) {
@@ -256,33 +450,65 @@ client.on('ready', async () => {
 
 client.on('auth_failure', async (msg) => {
     console.error('❌ FALHA NA AUTENTICAÇÃO:', msg);
+    lembretes.setReady(false);
     await saveStatus('disconnected');
 });
 
 client.on('disconnected', async (reason) => {
     console.log('❌ DESCONECTADO:', reason);
+    lembretes.setReady(false);
     await saveStatus('disconnected');
 });
 
+// ==================== FILA DE ENVIO ====================
+// Todo envio passa pela fila (ordem por chat, limite de taxa, novas tentativas);
+// o handler não espera o envio terminar.
+
+// content pode ser uma função async: é resolvida só na hora do envio (mídias do cache)
+const filaEnvio = new SendQueue(async (chatId, content, options) => {
+    const resolved = typeof content === 'function' ? await content() : content;
+    return client.sendMessage(chatId, resolved, options);
+});
+
+// Catálogo e anexos do fluxo: lidos e convertidos para base64 uma vez
+const midias = new MediaCache();
+
+// delayMs: pausa em relação à mensagem anterior do mesmo chat
+function enviar(chatId, content, options = undefined, delayMs = 0) {
+    return filaEnvio.enqueue(chatId, content, options, delayMs);
+}
+
+// Lembretes de agendamento enfileirados pelo backend (reminders.py), pela mesma fila
+const lembretes = new ReminderDispatcher(pool, (chatId, texto) => enviar(chatId, texto));
+
 // ==================== SISTEMA DE CONVERSAS ====================
+// Estado por contato com expiração e persistência em lote (tabela chatbot_conversations)
+
+const conversas = new ConversationStore(pool);
+
+// Métricas para o supervisor do backend (GET /whatsapp/supervisor)
+const METRICS_INTERVAL_MS = 60 * 1000;
+
+function reportMetrics() {
+    console.log('@@METRICS ' + JSON.stringify({
+        conversations: conversas.stats(),
+        send_queue: filaEnvio.stats(),
+        media_cache: midias.stats(),
+        reminders: lembretes.stats()
+    }));
+}
 
 function resetarConversa(numeroTelefone) {
-    if (conversasAtivas[numeroTelefone]) {
-        delete conversasAtivas[numeroTelefone];
-    }
+    conversas.reset(numeroTelefone);
     console.log(`🔄 Conversa resetada: ${numeroTelefone}`);
 }
 
 function encerrarConversa(numeroTelefone) {
-    conversasEncerradas.add(numeroTelefone);
-    if (conversasAtivas[numeroTelefone]) {
-        conversasAtivas[numeroTelefone].encerrada = true;
-    }
+    conversas.close(numeroTelefone);
     console.log(`🔒 Conversa encerrada: ${numeroTelefone}`);
 }
 
 function reativarConversa(numeroTelefone) {
-    conversasEncerradas.delete(numeroTelefone);
     resetarConversa(numeroTelefone);
     console.log(`🔓 Conversa reativada: ${numeroTelefone}`);
 }
@@ -290,20 +516,17 @@ function reativarConversa(numeroTelefone) {
 // ==================== FLUXO PADRÃO ====================
 
 async function iniciarConversaPadrao(msg) {
-    await delay(1000);
-    
     const mensagem1 = `Olá, seja muito bem-vinda! 🤍\n\n` +
         `Aqui é a assistente virtual da *Pri Malzoni Estética*.\n` +
         `Vou te orientar no agendamento de forma rápida e organizada ✨\n\n` +
         `Para começarmos, poderia me informar, por favor,\n` +
         `seu *nome e sobrenome*? 🤍`;
     
-    await client.sendMessage(msg.from, mensagem1);
-    
-    conversasAtivas[msg.from] = {
+    conversas.start(msg.from, {
         etapa: 1,
         dados: {}
-    };
+    });
+    enviar(msg.from, mensagem1, undefined, 1000);
     
     console.log(`🆕 Nova conversa iniciada (modo ${FLOW_MODE}): ${msg.from}`);
 }
@@ -316,14 +539,13 @@ async function processarRespostaPadrao(msg, mensagem, conversa) {
         conversa.dados.nome = mensagem;
         conversa.etapa = 2;
         
-        await delay(500);
         const mensagem2 = `Obrigada, ${mensagem}! ✨\n\n` +
             `Em qual período você prefere atendimento?\n\n` +
             `⏰ *Manhã*: das 8h às 12h\n` +
             `⏰ *Tarde*: das 14h às 18h\n\n` +
             `_Por favor, responda com *manhã* ou *tarde*_`;
         
-        await client.sendMessage(msg.from, mensagem2);
+        enviar(msg.from, mensagem2, undefined, 500);
         return;
     }
     
@@ -336,33 +558,28 @@ async function processarRespostaPadrao(msg, mensagem, conversa) {
         } else if (mensagemLower.includes('tarde')) {
             conversa.dados.periodo = 'Tarde (14h às 18h)';
         } else {
-            await client.sendMessage(msg.from, `Por favor, informe *manhã* ou *tarde* 🤍`);
+            enviar(msg.from, `Por favor, informe *manhã* ou *tarde* 🤍`);
             return;
         }
         
         conversa.etapa = 3;
         
-        await delay(500);
         let mensagem3 = `Perfeito! 🤍\nAgora me diga, por gentileza,\nqual procedimento você deseja realizar:\n\n`;
         
-        Object.keys(SERVICOS).forEach(id => {
-            const servico = SERVICOS[id];
-            mensagem3 += `*${id}* - ${servico.nome} ${servico.preco}\n`;
-        });
+        mensagem3 += MENU_SERVICOS;
         
         mensagem3 += `\nConfira o catálogo do whats e conheça os serviços também! 🥰`;
         
-        await client.sendMessage(msg.from, mensagem3);
+        enviar(msg.from, mensagem3, undefined, 500);
         
-        // Enviar catálogo em PDF após 2 segundos
-        await delay(2000);
+        // Enviar catálogo em PDF 2 segundos depois
         try {
             if (fs.existsSync(CATALOGO_PATH)) {
-                const media = MessageMedia.fromFilePath(CATALOGO_PATH);
-                await client.sendMessage(msg.from, media, {
+                enviar(msg.from, () => midias.get(CATALOGO_PATH), {
                     caption: '📄 Catálogo Pri Malzoni Estética'
+                }, 2000).then(ok => {
+                    if (ok) console.log(`📄 Catálogo enviado para: ${msg.from}`);
                 });
-                console.log(`📄 Catálogo enviado para: ${msg.from}`);
             } else {
                 console.warn('⚠️ Catálogo não encontrado em:', CATALOGO_PATH);
             }
@@ -379,13 +596,13 @@ async function processarRespostaPadrao(msg, mensagem, conversa) {
         
         if (SERVICOS[numeroServico]) {
             const servico = SERVICOS[numeroServico];
-            conversa.dados.servico = `${servico.nome} - ${servico.preco}`;
+            conversa.dados.servico = servico.preco ? `${servico.nome} - ${servico.preco}` : servico.nome;
+            conversa.dados.servico_id = servico.id;
             conversa.etapa = 4;
             
             const phone = msg.from.replace('@c.us', '');
             await saveCustomer(phone, conversa.dados.nome);
             
-            await delay(500);
             const mensagem4 = `Ótimo ✨\n` +
                 `Agora vou te mostrar as formas disponíveis para seguir com o agendamento 👇\n\n` +
                 `👉 Se preferir realizar o agendamento de forma independente e definitiva, (em média 3 minutos)\n` +
@@ -403,21 +620,83 @@ async function processarRespostaPadrao(msg, mensagem, conversa) {
                 `✅ Seu atendimento foi registrado!\n\n` +
                 `_Se precisar de um novo atendimento, digite *${PALAVRA_CHAVE_REATIVAR}* 🤍_`;
             
-            await client.sendMessage(msg.from, mensagem4);
+            enviar(msg.from, mensagem4, undefined, 500);
             
             encerrarConversa(msg.from);
         } else {
-            await client.sendMessage(msg.from, `Número inválido. Escolha entre 1 e 26 🤍`);
+            enviar(msg.from, `Número inválido. Escolha entre 1 e ${Object.keys(SERVICOS).length} 🤍`);
         }
     }
 }
 
 // ==================== FLUXO PERSONALIZADO ====================
+// Executa as mensagens do editor (chatbot_messages) com o flow-engine.js
+
+function modoAtivo() {
+    // Sem mensagens ativas o modo personalizado cai no fluxo padrão
+    return FLOW_MODE === 'custom' && FLOW && FLOW.steps.length > 0 ? 'custom' : 'default';
+}
+
+function caminhoMidia(mediaUrl) {
+    // media_url vem como /uploads/chatbot/<arquivo>
+    return path.join(MEDIA_DIR, path.basename(mediaUrl));
+}
+
+function enfileirarPasso(chatId, acao, delayMs) {
+    if (acao.media) {
+        const carregar = async () => {
+            try {
+                return await midias.get(caminhoMidia(acao.media.url), acao.media.filename);
+            } catch (error) {
+                // Arquivo sumiu: manda pelo menos o texto
+                console.error(`❌ Erro ao carregar mídia ${acao.media.url}:`, error.message);
+                return acao.text || '';
+            }
+        };
+        return enviar(chatId, carregar, { caption: acao.text || undefined }, delayMs);
+    }
+    if (acao.text) {
+        return enviar(chatId, acao.text, undefined, delayMs);
+    }
+}
+
+// Enfileira os passos; a pausa de cada um vale em relação ao passo anterior
+function executarAcoes(chatId, acoes, delayInicialMs = 0) {
+    let pausa = delayInicialMs;
+    for (const acao of acoes) {
+        enfileirarPasso(chatId, acao, pausa);
+        pausa = acao.delayAfterMs || 0;
+    }
+}
+
+async function iniciarConversaPersonalizada(msg) {
+    const { state, actions, done } = flowEngine.start(FLOW.program);
+    // Registra antes de enviar: mensagens que chegarem no meio não reiniciam a conversa
+    conversas.start(msg.from, state);
+    if (done) encerrarConversa(msg.from);
+
+    executarAcoes(msg.from, actions, 1000);
+    console.log(`🆕 Nova conversa iniciada (modo custom): ${msg.from}`);
+}
 
 async function processarRespostaPersonalizado(msg, mensagem, conversa) {
-    // TODO: Implementar lógica de mensagens personalizadas do banco
-    // Por enquanto usa o fluxo padrão
-    await processarRespostaPadrao(msg, mensagem, conversa);
+    const { state, actions, done } = flowEngine.advance(FLOW.program, conversa, mensagem);
+    if (done) {
+        encerrarConversa(msg.from);
+        if (state.respostas[0]) {
+            const phone = msg.from.replace('@c.us', '');
+            await saveCustomer(phone, state.respostas[0]);
+        }
+    }
+    executarAcoes(msg.from, actions);
+}
+
+async function iniciarConversa(msg) {
+    if (modoAtivo() === 'custom') {
+        await iniciarConversaPersonalizada(msg);
+    } else {
+        await iniciarConversaPadrao(msg);
+    }
 }
 
 // ==================== HANDLER PRINCIPAL ====================
@@ -443,25 +722,32 @@ async function handleMessage(msg) {
             return;
         }
         
-        if (conversasEncerradas.has(msg.from)) {
+        if (conversas.isClosed(msg.from)) {
             if (mensagemLower === PALAVRA_CHAVE_REATIVAR) {
                 reativarConversa(msg.from);
-                await iniciarConversaPadrao(msg);
+                await iniciarConversa(msg);
             }
             return;
         }
         
         console.log(`🔔 MENSAGEM de ${msg.from}: "${mensagem}"`);
         
-        const conversa = conversasAtivas[msg.from];
+        const conversa = conversas.get(msg.from);
         
         if (!conversa) {
-            await iniciarConversaPadrao(msg);
+            await iniciarConversa(msg);
+            return;
+        }
+        
+        // Conversa começada no outro modo (o modo mudou no meio): recomeça no modo atual
+        const modoConversa = conversa.modo === 'custom' ? 'custom' : 'default';
+        if (modoConversa !== modoAtivo()) {
+            resetarConversa(msg.from);
+            await iniciarConversa(msg);
             return;
         }
         
-        // Escolher fluxo baseado no modo
-        if (FLOW_MODE === 'default') {
+        if (modoConversa === 'default') {
             await processarRespostaPadrao(msg, mensagem, conversa);
         } else {
             await processarRespostaPersonalizado(msg, mensagem, conversa);
@@ -482,10 +768,19 @@ client.on('message_create', handleMessage);
     console.log('📱 Aguardando autenticação...\n');
     
     await saveStatus('disconnected');
-    await loadChatbotSettings();
-    await loadProgrammedMessages();
+    await Promise.all([loadFlow(), loadServices()]);
+
+    // Retoma as conversas em andamento antes de receber mensagens
+    try {
+        const restored = await conversas.load();
+        console.log(`💬 ${restored} conversa(s) restaurada(s)`);
+    } catch (error) {
+        console.error('❌ Erro ao restaurar conversas:', error.message);
+    }
+    conversas.startTimers();
+    lembretes.startTimer();
+    setInterval(reportMetrics, METRICS_INTERVAL_MS).unref();
     
-    console.log(`💆 ${Object.keys(SERVICOS).length} serviços carregados`);
     
     client.initialize();
     
@@ -494,6 +789,24 @@ client.on('message_create', handleMessage);
     console.log(`🔀 Modo de fluxo: ${FLOW_MODE}`);
 })();
 
+// O supervisor para o bot com SIGTERM: grava as conversas pendentes antes de sair
+async function shutdown(signal) {
+    console.log(`🛑 ${signal} recebido, salvando conversas...`);
+    // Lembretes em "sending" que não saírem voltam para a fila pela varredura do backend
+    lembretes.stop();
+    // Dá um tempo curto para as mensagens na fila saírem (o supervisor espera 5s)
+    await filaEnvio.drain(2000);
+    try {
+        await conversas.stop();
+    } catch (error) {
+        console.error('❌ Erro ao salvar conversas:', error.message);
+    }
+    process.exit(0);
+}
+
+process.once('SIGTERM', () => shutdown('SIGTERM'));
+process.once('SIGINT', () => shutdown('SIGINT'));
+
 process.on('unhandledRejection', (reason) => {
     console.error('❌ Unhandled Rejection:', reason);
 });
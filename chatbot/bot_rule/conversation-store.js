@@ -0,0 +1,219 @@
+// Arquivo: chatbot/bot_rule/conversation-store.js
+//
+// Estado das conversas do bot (etapa + dados coletados) com expiração e persistência.
+// - Conversas paradas há mais de idleTtlMs são descartadas (e encerradas há mais de closedTtlMs).
+// - As alterações ficam marcadas como "sujas" e vão para o Postgres em lote a cada
+//   flushIntervalMs, num único comando; ao reiniciar, o bot retoma de onde parou.
+
+const UPSERT_SQL = `
+    WITH data AS (
+        SELECT *
+        FROM jsonb_to_recordset($1::jsonb)
+             AS x(chat_id TEXT, state JSONB, is_closed BOOLEAN, last_activity DOUBLE PRECISION)
+    ),
+    upserted AS (
+        INSERT INTO chatbot_conversations (chat_id, state, is_closed, last_activity)
+        SELECT chat_id, state, is_closed, to_timestamp(last_activity / 1000.0)
+        FROM data
+        ON CONFLICT (chat_id) DO UPDATE
+        SET state = EXCLUDED.state,
+            is_closed = EXCLUDED.is_closed,
+            last_activity = EXCLUDED.last_activity
+        RETURNING 1
+    ),
+    deleted AS (
+        DELETE FROM chatbot_conversations
+        WHERE chat_id = ANY($2::text[])
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM upserted) AS upserted,
+           (SELECT COUNT(*) FROM deleted) AS deleted
+`;
+
+class ConversationStore {
+    constructor(pool, {
+        idleTtlMs = 12 * 60 * 60 * 1000,
+        closedTtlMs = 7 * 24 * 60 * 60 * 1000,
+        flushIntervalMs = 5000,
+        sweepIntervalMs = 60 * 1000
+    } = {}) {
+        this.pool = pool;
+        this.idleTtlMs = idleTtlMs;
+        this.closedTtlMs = closedTtlMs;
+        this.flushIntervalMs = flushIntervalMs;
+        this.sweepIntervalMs = sweepIntervalMs;
+
+        this.entries = new Map(); // chatId -> { state, closed, lastActivity }
+        this.dirty = new Set();
+        this.flushing = null;
+        this.timers = [];
+
+        this.counters = {
+            started: 0,
+            closed: 0,
+            reopened: 0,
+            evicted_idle: 0,
+            evicted_closed: 0,
+            restored: 0,
+            flushes: 0,
+            flush_errors: 0,
+            rows_written: 0
+        };
+    }
+
+    // ---------- leitura/escrita ----------
+
+    // Conversa em andamento (ou undefined). Quem recebe o objeto pode alterá-lo:
+    // a conversa já fica marcada para persistir.
+    get(chatId) {
+        const entry = this.entries.get(chatId);
+        if (!entry || entry.closed || !entry.state) return undefined;
+        this._touch(chatId, entry);
+        return entry.state;
+    }
+
+    isClosed(chatId) {
+        const entry = this.entries.get(chatId);
+        return !!(entry && entry.closed);
+    }
+
+    start(chatId, state) {
+        const entry = { state, closed: false, lastActivity: Date.now() };
+        this.entries.set(chatId, entry);
+        this.dirty.add(chatId);
+        this.counters.started++;
+        return state;
+    }
+
+    close(chatId) {
+        const entry = this.entries.get(chatId) || { state: null };
+        entry.closed = true;
+        if (entry.state) entry.state.encerrada = true;
+        this.entries.set(chatId, entry);
+        this._touch(chatId, entry);
+        this.counters.closed++;
+    }
+
+    // Apaga a conversa (encerrada ou não): a próxima mensagem começa do zero
+    reset(chatId) {
+        const entry = this.entries.get(chatId);
+        if (!entry) return;
+        if (entry.closed) this.counters.reopened++;
+        this.entries.delete(chatId);
+        this.dirty.add(chatId);
+    }
+
+    _touch(chatId, entry) {
+        entry.lastActivity = Date.now();
+        this.dirty.add(chatId);
+    }
+
+    // ---------- expiração ----------
+
+    sweep(now = Date.now()) {
+        for (const [chatId, entry] of this.entries) {
+            const ttl = entry.closed ? this.closedTtlMs : this.idleTtlMs;
+            if (now - entry.lastActivity > ttl) {
+                this.entries.delete(chatId);
+                this.dirty.add(chatId);
+                this.counters[entry.closed ? 'evicted_closed' : 'evicted_idle']++;
+            }
+        }
+    }
+
+    // ---------- persistência ----------
+
+    async load() {
+        const now = Date.now();
+        // Limpa o que expirou enquanto o bot estava parado e carrega o resto
+        await this.pool.query(`
+            DELETE FROM chatbot_conversations
+            WHERE last_activity < to_timestamp($1 / 1000.0)
+               OR (NOT is_closed AND last_activity < to_timestamp($2 / 1000.0))
+        `, [now - this.closedTtlMs, now - this.idleTtlMs]);
+
+        const result = await this.pool.query(`
+            SELECT chat_id, state, is_closed,
+                   EXTRACT(EPOCH FROM last_activity) * 1000 AS last_activity
+            FROM chatbot_conversations
+        `);
+        for (const row of result.rows) {
+            this.entries.set(row.chat_id, {
+                state: row.state,
+                closed: row.is_closed,
+                lastActivity: Number(row.last_activity)
+            });
+        }
+        this.counters.restored = result.rows.length;
+        return result.rows.length;
+    }
+
+    async flush() {
+        // Um flush por vez; quem chegar durante um flush espera ele e roda de novo
+        while (this.flushing) await this.flushing;
+        if (this.dirty.size === 0) return 0;
+
+        const ids = [...this.dirty];
+        this.dirty.clear();
+
+        const upserts = [];
+        const deletes = [];
+        for (const chatId of ids) {
+            const entry = this.entries.get(chatId);
+            if (entry) {
+                upserts.push({
+                    chat_id: chatId,
+                    state: entry.state,
+                    is_closed: entry.closed,
+                    last_activity: entry.lastActivity
+                });
+            } else {
+                deletes.push(chatId);
+            }
+        }
+
+        this.flushing = this.pool.query(UPSERT_SQL, [JSON.stringify(upserts), deletes])
+            .then(() => {
+                this.counters.flushes++;
+                this.counters.rows_written += ids.length;
+            })
+            .catch((error) => {
+                // Tenta de novo no próximo ciclo (o estado em memória é o mais recente)
+                ids.forEach(id => this.dirty.add(id));
+                this.counters.flush_errors++;
+                console.error('❌ Erro ao salvar conversas:', error.message);
+            });
+        try {
+            await this.flushing;
+        } finally {
+            this.flushing = null;
+        }
+        return ids.length;
+    }
+
+    startTimers() {
+        this.timers.push(setInterval(() => this.flush(), this.flushIntervalMs));
+        this.timers.push(setInterval(() => this.sweep(), this.sweepIntervalMs));
+        this.timers.forEach(timer => timer.unref());
+    }
+
+    async stop() {
+        this.timers.forEach(timer => clearInterval(timer));
+        this.timers = [];
+        await this.flush();
+    }
+
+    // ---------- métricas ----------
+
+    stats() {
+        let active = 0;
+        let closed = 0;
+        for (const entry of this.entries.values()) {
+            if (entry.closed) closed++;
+            else active++;
+        }
+        return { active, closed, pending_writes: this.dirty.size, ...this.counters };
+    }
+}
+
+module.exports = { ConversationStore };
@@ -0,0 +1,142 @@
+// Arquivo: chatbot/bot_rule/flow-engine.js
+//
+// Interpretador do fluxo personalizado (tabela chatbot_messages).
+// compileFlowProgram() transforma as mensagens ativas, já ordenadas, numa tabela de
+// passos; start()/advance() só consultam essa tabela (sem banco, sem laços sobre o
+// fluxo inteiro) e devolvem as ações que o bot deve executar.
+//
+// Regras:
+// - wait_for_reply = true: envia a mensagem e espera a resposta do cliente
+// - wait_for_reply = false: espera delay_seconds e segue para o próximo passo
+// - message_type 'final': envia a mensagem com o resumo das respostas e encerra a conversa
+// - Placeholders no texto: {nome}, {periodo}, {servico} (1ª, 2ª e 3ª respostas,
+//   como no fluxo padrão) e {resposta1}, {resposta2}, ...
+
+const SUMMARY_TEMPLATE =
+    `━━━━━━━━━━━━━━━\n` +
+    `📋 *Resumo da sua solicitação:*\n` +
+    `👤 Nome: {nome}\n` +
+    `⏰ Período: {periodo}\n` +
+    `💆 Serviço: {servico}\n` +
+    `━━━━━━━━━━━━━━━`;
+
+const TYPE_PREFIX = {
+    important: '📌 ',
+    alert: '⚠️ '
+};
+
+const NAMED_ANSWERS = { nome: 0, periodo: 1, servico: 2 };
+const PLACEHOLDER = /\{(\w+)\}/g;
+
+// Pré-processa o texto em partes fixas e índices de resposta
+function compileTemplate(text) {
+    const parts = [];
+    let last = 0;
+    let hasPlaceholders = false;
+    for (const match of text.matchAll(PLACEHOLDER)) {
+        const name = match[1];
+        let answer = NAMED_ANSWERS[name];
+        const numbered = /^resposta(\d+)$/.exec(name);
+        if (numbered) answer = Number(numbered[1]) - 1;
+        if (answer === undefined) continue;
+
+        parts.push(text.slice(last, match.index), answer);
+        last = match.index + match[0].length;
+        hasPlaceholders = true;
+    }
+    parts.push(text.slice(last));
+    return hasPlaceholders ? parts : text;
+}
+
+function renderTemplate(template, answers) {
+    if (typeof template === 'string') return template;
+    let out = '';
+    for (const part of template) {
+        out += typeof part === 'number' ? (answers[part] ?? '-') : part;
+    }
+    return out;
+}
+
+function compileFlowProgram(messages) {
+    const steps = messages.map((m, index) => {
+        const isFinal = m.message_type === 'final';
+        const text = (TYPE_PREFIX[m.message_type] || '') + (m.message_text || '');
+        return {
+            id: m.id,
+            index,
+            type: m.message_type || 'message',
+            template: compileTemplate(isFinal ? `${text}\n\n${SUMMARY_TEMPLATE}` : text),
+            // Um passo final encerra a conversa: não espera resposta
+            waitForReply: !isFinal && m.wait_for_reply !== false,
+            delayMs: m.wait_for_reply === false ? Math.max(0, m.delay_seconds || 0) * 1000 : 0,
+            isFinal,
+            media: m.media_url ? {
+                type: m.media_type,
+                url: m.media_url,
+                filename: m.media_filename
+            } : null,
+            // Último passo da sequência enviada a partir deste (até o próximo que espera resposta)
+            runEnd: index
+        };
+    });
+
+    // Calcula de trás para frente: cada passo reaproveita o fim da sequência do seguinte
+    for (let i = steps.length - 2; i >= 0; i--) {
+        const step = steps[i];
+        if (!step.waitForReply && !step.isFinal) {
+            step.runEnd = steps[i + 1].runEnd;
+        }
+    }
+
+    return {
+        steps,
+        indexById: new Map(steps.map(step => [step.id, step.index]))
+    };
+}
+
+// Ações para enviar a sequência que começa em `index`; atualiza o estado
+function runFrom(program, state, index) {
+    const actions = [];
+    const first = program.steps[index];
+    if (!first) {
+        state.done = true;
+        return actions;
+    }
+
+    for (let i = index; i <= first.runEnd; i++) {
+        const step = program.steps[i];
+        actions.push({
+            stepId: step.id,
+            text: renderTemplate(step.template, state.respostas),
+            media: step.media,
+            // Pausa depois de enviar (só entre mensagens que não esperam resposta)
+            delayAfterMs: i < first.runEnd ? step.delayMs : 0
+        });
+    }
+
+    const last = program.steps[first.runEnd];
+    state.pos = last.index;
+    state.stepId = last.id;
+    state.done = last.isFinal || !last.waitForReply;
+    return actions;
+}
+
+// Nova conversa: envia do primeiro passo até o primeiro que espera resposta
+function start(program) {
+    const state = { modo: 'custom', pos: 0, stepId: null, respostas: [], done: false };
+    const actions = runFrom(program, state, 0);
+    return { state, actions, done: state.done };
+}
+
+// Resposta do cliente ao passo em que a conversa parou
+function advance(program, state, text) {
+    // O fluxo pode ter sido editado (hot-reload): localiza o passo pelo id
+    let pos = program.indexById.get(state.stepId);
+    if (pos === undefined) pos = Math.min(state.pos, program.steps.length);
+
+    state.respostas.push(text);
+    const actions = runFrom(program, state, pos + 1);
+    return { state, actions, done: state.done };
+}
+
+module.exports = { compileFlowProgram, start, advance, renderTemplate };
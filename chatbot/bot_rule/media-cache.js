@@ -0,0 +1,131 @@
+// Arquivo: chatbot/bot_rule/media-cache.js
+//
+// Cache das mídias enviadas pelo bot (catálogo e anexos do fluxo personalizado).
+// Cada arquivo é lido e convertido para base64 uma vez; a chave é o caminho e a
+// validade é conferida pelo mtime/tamanho (um stat por envio), então trocar o
+// catálogo ou reenviar um upload invalida a entrada. Limite de memória com LRU.
+
+const fs = require('fs');
+const path = require('path');
+const { MessageMedia } = require('whatsapp-web.js');
+
+const MIME_TYPES = {
+    '.pdf': 'application/pdf',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+    '.mp4': 'video/mp4',
+    '.mp3': 'audio/mpeg',
+    '.ogg': 'audio/ogg',
+    '.opus': 'audio/ogg',
+    '.doc': 'application/msword',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.xls': 'application/vnd.ms-excel',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.txt': 'text/plain'
+};
+
+class MediaCache {
+    constructor({ maxBytes = 64 * 1024 * 1024 } = {}) {
+        this.maxBytes = maxBytes;
+        this.entries = new Map(); // filePath -> { mtimeMs, size, mimetype, data, bytes }; ordem = LRU
+        this.loading = new Map(); // filePath -> Promise (cargas simultâneas do mesmo arquivo)
+        this.bytes = 0;
+        this.counters = { hits: 0, misses: 0, evictions: 0, invalidations: 0 };
+    }
+
+    // MessageMedia pronta para envio; filename opcional (nome mostrado no WhatsApp)
+    async get(filePath, filename = null) {
+        const stat = await fs.promises.stat(filePath);
+        let entry = this.entries.get(filePath);
+
+        if (entry && (entry.mtimeMs !== stat.mtimeMs || entry.size !== stat.size)) {
+            this._remove(filePath, entry);
+            this.counters.invalidations++;
+            entry = null;
+        }
+
+        if (entry) {
+            this.counters.hits++;
+            // renova a posição no LRU
+            this.entries.delete(filePath);
+            this.entries.set(filePath, entry);
+        } else {
+            this.counters.misses++;
+            entry = await this._load(filePath, stat);
+        }
+
+        // Objeto novo a cada envio; a string base64 é compartilhada
+        return new MessageMedia(entry.mimetype, entry.data, filename || path.basename(filePath));
+    }
+
+    // Carrega em segundo plano (ex.: ao recarregar o fluxo); erros só são registrados
+    preload(filePaths) {
+        for (const filePath of filePaths) {
+            this.get(filePath).catch((error) => {
+                console.warn(`⚠️ Mídia não pré-carregada (${filePath}):`, error.message);
+            });
+        }
+    }
+
+    async _load(filePath, stat) {
+        const pending = this.loading.get(filePath);
+        if (pending) return pending;
+
+        const promise = fs.promises.readFile(filePath).then((buffer) => {
+            const data = buffer.toString('base64');
+            const entry = {
+                mtimeMs: stat.mtimeMs,
+                size: stat.size,
+                mimetype: MIME_TYPES[path.extname(filePath).toLowerCase()] || 'application/octet-stream',
+                data,
+                bytes: data.length
+            };
+            // Maior que o orçamento inteiro: usa sem guardar
+            if (entry.bytes <= this.maxBytes) {
+                const old = this.entries.get(filePath);
+                if (old) this._remove(filePath, old);
+                this.entries.set(filePath, entry);
+                this.bytes += entry.bytes;
+                this._evict();
+            }
+            return entry;
+        }).finally(() => {
+            this.loading.delete(filePath);
+        });
+
+        this.loading.set(filePath, promise);
+        return promise;
+    }
+
+    _evict() {
+        for (const [filePath, entry] of this.entries) {
+            if (this.bytes <= this.maxBytes) break;
+            this._remove(filePath, entry);
+            this.counters.evictions++;
+        }
+    }
+
+    _remove(filePath, entry) {
+        this.entries.delete(filePath);
+        this.bytes -= entry.bytes;
+    }
+
+    clear() {
+        this.entries.clear();
+        this.bytes = 0;
+    }
+
+    stats() {
+        return {
+            entries: this.entries.size,
+            bytes: this.bytes,
+            max_bytes: this.maxBytes,
+            ...this.counters
+        };
+    }
+}
+
+module.exports = { MediaCache };
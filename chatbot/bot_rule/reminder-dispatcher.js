@@ -0,0 +1,175 @@
+// Arquivo: chatbot/bot_rule/reminder-dispatcher.js
+//
+// Entrega dos lembretes de agendamento (tabela reminder_jobs, migração 0009).
+// O backend enfileira os jobs; aqui eles são reivindicados em lotes com
+// FOR UPDATE SKIP LOCKED (mais de um bot/processo não pega o mesmo job),
+// entregues pela fila de envio e confirmados num UPDATE só por lote.
+// Acorda com NOTIFY reminder_jobs e, por garantia, a cada pollIntervalMs.
+// O lock (locked_until) é renovado a cada lockMs/3 enquanto o lote está na
+// fila de envio, que é dividida com as conversas e não tem prazo; a varredura
+// do backend só devolve para a fila jobs cujo bot parou de renovar.
+// "Agora" é salon_now() (migração 0013, fuso de chatbot_settings), o mesmo
+// relógio da varredura do backend; não depende do fuso da sessão do pg.
+
+class ReminderDispatcher {
+    constructor(pool, send, {
+        batchSize = 20,
+        pollIntervalMs = 60 * 1000,
+        lockMs = 5 * 60 * 1000,
+        retryDelayMs = 15 * 60 * 1000
+    } = {}) {
+        this.pool = pool;
+        this.send = send; // (chatId, text) => Promise<boolean>
+        this.batchSize = batchSize;
+        this.pollIntervalMs = pollIntervalMs;
+        this.lockMs = lockMs;
+        this.renewIntervalMs = Math.floor(lockMs / 3);
+        this.retryDelayMs = retryDelayMs;
+
+        this.ready = false;
+        this.running = false;
+        this.pending = false;
+        this.timer = null;
+        this.counters = { claimed: 0, sent: 0, failed: 0, batches: 0, errors: 0, lockRenewals: 0 };
+    }
+
+    // Só entrega com o WhatsApp conectado
+    setReady(ready) {
+        this.ready = ready;
+        if (ready) this.wake();
+    }
+
+    startTimer() {
+        this.timer = setInterval(() => this.wake(), this.pollIntervalMs);
+        this.timer.unref();
+    }
+
+    stop() {
+        if (this.timer) clearInterval(this.timer);
+        this.timer = null;
+        this.ready = false;
+    }
+
+    // Chamado pelo NOTIFY e pelo timer; pedidos durante um lote viram uma rodada extra
+    wake() {
+        if (!this.ready) return;
+        if (this.running) {
+            this.pending = true;
+            return;
+        }
+        this._run();
+    }
+
+    async _run() {
+        this.running = true;
+        try {
+            do {
+                this.pending = false;
+                // Lote cheio: pode haver mais jobs vencidos, continua
+                while (this.ready && (await this._dispatchBatch()) === this.batchSize) { /* próximo lote */ }
+            } while (this.pending && this.ready);
+        } catch (error) {
+            this.counters.errors++;
+            console.error('❌ Erro ao entregar lembretes:', error.message);
+        } finally {
+            this.running = false;
+        }
+    }
+
+    async _claim() {
+        const result = await this.pool.query(`
+            WITH clock AS (
+                SELECT salon_now() AS now
+            ), due AS (
+                SELECT id
+                FROM reminder_jobs
+                WHERE status = 'pending'
+                  AND run_at <= (SELECT now FROM clock)
+                  AND scheduled_for > (SELECT now FROM clock)
+                ORDER BY run_at
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE reminder_jobs j
+            SET status = 'sending',
+                attempts = j.attempts + 1,
+                locked_until = clock.now + make_interval(secs => $2)
+            FROM due, clock
+            WHERE j.id = due.id
+            RETURNING j.id, j.phone, j.message
+        `, [this.batchSize, this.lockMs / 1000]);
+        return result.rows;
+    }
+
+    async _renewLock(ids) {
+        await this.pool.query(`
+            UPDATE reminder_jobs
+            SET locked_until = salon_now() + make_interval(secs => $2)
+            WHERE id = ANY($1::bigint[])
+              AND status = 'sending'
+        `, [ids, this.lockMs / 1000]);
+        this.counters.lockRenewals++;
+    }
+
+    async _dispatchBatch() {
+        const jobs = await this._claim();
+        if (jobs.length === 0) return 0;
+        this.counters.claimed += jobs.length;
+        this.counters.batches++;
+
+        const ids = jobs.map(job => job.id);
+        const heartbeat = setInterval(() => {
+            this._renewLock(ids).catch(error => {
+                this.counters.errors++;
+                console.error('❌ Erro ao renovar o lock dos lembretes:', error.message);
+            });
+        }, this.renewIntervalMs);
+        heartbeat.unref();
+
+        // A fila de envio cuida do limite de taxa e das novas tentativas imediatas
+        let delivered;
+        try {
+            delivered = await Promise.all(jobs.map(job =>
+                this.send(`${String(job.phone).replace(/\D/g, '')}@c.us`, job.message)
+            ));
+        } finally {
+            clearInterval(heartbeat);
+        }
+
+        for (const ok of delivered) {
+            if (ok) this.counters.sent++;
+            else this.counters.failed++;
+        }
+
+        // Confirmação do lote inteiro num comando; falha volta para a fila mais tarde
+        await this.pool.query(`
+            WITH clock AS (
+                SELECT salon_now() AS now
+            )
+            UPDATE reminder_jobs j
+            SET status = CASE
+                    WHEN r.ok THEN 'sent'
+                    WHEN j.attempts >= j.max_attempts THEN 'failed'
+                    ELSE 'pending'
+                END,
+                run_at = CASE WHEN r.ok THEN j.run_at ELSE clock.now + make_interval(secs => $3) END,
+                finished_at = CASE WHEN r.ok OR j.attempts >= j.max_attempts THEN clock.now END,
+                locked_until = NULL
+            FROM unnest($1::bigint[], $2::boolean[]) AS r(id, ok), clock
+            WHERE j.id = r.id
+              AND j.status = 'sending'
+        `, [ids, delivered, this.retryDelayMs / 1000]);
+
+        return jobs.length;
+    }
+
+    stats() {
+        return {
+            ready: this.ready,
+            running: this.running,
+            ...this.counters
+        };
+    }
+}
+
+module.exports = { ReminderDispatcher };
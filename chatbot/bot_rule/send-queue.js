@@ -0,0 +1,191 @@
+// Arquivo: chatbot/bot_rule/send-queue.js
+//
+// Fila de envio de mensagens do bot.
+// - Ordem FIFO por conversa: uma mensagem por vez em cada chat, na ordem em que foi enfileirada.
+// - Limite global (token bucket) e intervalo mínimo entre mensagens do mesmo chat.
+// - delayMs de cada item é a pausa em relação à mensagem anterior do chat (o "digitando...").
+// - Falhas são tentadas de novo com backoff exponencial, sem furar a fila do chat.
+// Quem enfileira não fica esperando o envio: handleMessage volta na hora para a próxima mensagem.
+
+const LATENCY_SAMPLES = 1000;
+
+class SendQueue {
+    constructor(send, {
+        ratePerSecond = 2,
+        burst = 5,
+        perChatIntervalMs = 500,
+        concurrency = 2,
+        maxRetries = 3,
+        retryBaseMs = 1000,
+        retryMaxMs = 30000
+    } = {}) {
+        this.send = send;
+        this.ratePerSecond = ratePerSecond;
+        this.burst = burst;
+        this.perChatIntervalMs = perChatIntervalMs;
+        this.concurrency = concurrency;
+        this.maxRetries = maxRetries;
+        this.retryBaseMs = retryBaseMs;
+        this.retryMaxMs = retryMaxMs;
+
+        this.chats = new Map(); // chatId -> { items, busy, lastSentAt }; ordem do Map = rodízio
+        this.tokens = burst;
+        this.lastRefill = Date.now();
+        this.inFlight = 0;
+        this.timer = null;
+        this.timerDue = 0;
+
+        this.depth = 0;
+        this.counters = { enqueued: 0, sent: 0, failed: 0, retried: 0, max_depth: 0 };
+        this.latencies = []; // ms entre enfileirar e enviar (últimas LATENCY_SAMPLES)
+    }
+
+    // Resolve true quando enviada, false se desistiu após as tentativas (nunca rejeita)
+    enqueue(chatId, content, options = undefined, delayMs = 0) {
+        return new Promise((resolve) => {
+            let chat = this.chats.get(chatId);
+            if (!chat) {
+                chat = { items: [], busy: false, lastSentAt: 0 };
+                this.chats.set(chatId, chat);
+            }
+            chat.items.push({
+                content,
+                options,
+                delayMs,
+                enqueuedAt: Date.now(),
+                attempts: 0,
+                retryAt: 0,
+                resolve
+            });
+            this.depth++;
+            this.counters.enqueued++;
+            this.counters.max_depth = Math.max(this.counters.max_depth, this.depth);
+            this._schedule(0);
+        });
+    }
+
+    _readyAt(chat) {
+        const item = chat.items[0];
+        const base = Math.max(item.enqueuedAt, chat.lastSentAt);
+        return Math.max(
+            base + item.delayMs,
+            chat.lastSentAt + this.perChatIntervalMs,
+            item.retryAt
+        );
+    }
+
+    _refill(now) {
+        const elapsed = (now - this.lastRefill) / 1000;
+        this.tokens = Math.min(this.burst, this.tokens + elapsed * this.ratePerSecond);
+        this.lastRefill = now;
+    }
+
+    _schedule(ms) {
+        const due = Date.now() + ms;
+        if (this.timer && this.timerDue <= due) return;
+        if (this.timer) clearTimeout(this.timer);
+        this.timerDue = due;
+        this.timer = setTimeout(() => this._pump(), ms);
+    }
+
+    _pump() {
+        this.timer = null;
+        const now = Date.now();
+        this._refill(now);
+        let wakeAt = Infinity;
+
+        for (const [chatId, chat] of this.chats) {
+            if (this.inFlight >= this.concurrency) break;
+            if (chat.busy) continue;
+            if (chat.items.length === 0) {
+                // Guarda o chat só enquanto o intervalo mínimo ainda vale
+                if (now - chat.lastSentAt >= this.perChatIntervalMs) this.chats.delete(chatId);
+                continue;
+            }
+
+            const readyAt = this._readyAt(chat);
+            if (readyAt > now) {
+                wakeAt = Math.min(wakeAt, readyAt);
+                continue;
+            }
+            if (this.tokens < 1) {
+                wakeAt = Math.min(wakeAt, now + ((1 - this.tokens) / this.ratePerSecond) * 1000);
+                break;
+            }
+
+            this.tokens -= 1;
+            this._dispatch(chatId, chat);
+            // Vai para o fim do rodízio: um chat com muitas mensagens não segura os outros
+            this.chats.delete(chatId);
+            this.chats.set(chatId, chat);
+        }
+
+        if (wakeAt < Infinity) this._schedule(Math.max(0, wakeAt - now));
+    }
+
+    async _dispatch(chatId, chat) {
+        const item = chat.items[0];
+        chat.busy = true;
+        this.inFlight++;
+        item.attempts++;
+
+        try {
+            await this.send(chatId, item.content, item.options);
+            chat.items.shift();
+            this.depth--;
+            this.counters.sent++;
+            this._recordLatency(Date.now() - item.enqueuedAt);
+            item.resolve(true);
+        } catch (error) {
+            if (item.attempts <= this.maxRetries) {
+                const backoff = Math.min(this.retryMaxMs, this.retryBaseMs * 2 ** (item.attempts - 1));
+                item.retryAt = Date.now() + backoff * (0.5 + Math.random() / 2);
+                this.counters.retried++;
+                console.warn(`⚠️ Falha ao enviar para ${chatId} (tentativa ${item.attempts}), nova tentativa em ${Math.round(backoff / 1000)}s:`, error.message);
+            } else {
+                chat.items.shift();
+                this.depth--;
+                this.counters.failed++;
+                console.error(`❌ Mensagem para ${chatId} descartada após ${item.attempts} tentativas:`, error.message);
+                item.resolve(false);
+            }
+        } finally {
+            chat.lastSentAt = Date.now();
+            chat.busy = false;
+            this.inFlight--;
+            this._schedule(0);
+        }
+    }
+
+    // Espera a fila esvaziar (ou o tempo acabar); usado ao encerrar o bot
+    async drain(timeoutMs) {
+        const deadline = Date.now() + timeoutMs;
+        while (this.depth > 0 && Date.now() < deadline) {
+            await new Promise(res => setTimeout(res, 100));
+        }
+        return this.depth === 0;
+    }
+
+    _recordLatency(ms) {
+        this.latencies.push(ms);
+        if (this.latencies.length > LATENCY_SAMPLES) this.latencies.shift();
+    }
+
+    stats() {
+        const sorted = this.latencies.slice().sort((a, b) => a - b);
+        const pick = p => sorted.length ? sorted[Math.min(sorted.length - 1, Math.floor(sorted.length * p))] : null;
+        let chatsWaiting = 0;
+        for (const chat of this.chats.values()) {
+            if (chat.items.length > 0) chatsWaiting++;
+        }
+        return {
+            depth: this.depth,
+            chats_waiting: chatsWaiting,
+            in_flight: this.inFlight,
+            ...this.counters,
+            latency_ms: { p50: pick(0.5), p95: pick(0.95), max: sorted.length ? sorted[sorted.length - 1] : null }
+        };
+    }
+}
+
+module.exports = { SendQueue };
@@ -47,8 +47,12 @@ window.updateChatbotSettings = function (payload) {
   return apiPut("/settings/chatbot", payload);
 };
 
-window.getAppointments = function (date) {
-  const query = date ? `?date=${encodeURIComponent(date)}` : "";
+// Retorna uma página { items, next_cursor }; passe next_cursor para a próxima
+window.getAppointments = function (date, cursor) {
+  const params = new URLSearchParams();
+  if (date) params.set("date", date);
+  if (cursor) params.set("cursor", cursor);
+  const query = params.toString() ? `?${params}` : "";
   return apiGet(`/appointments/${query}`);
 };
 
@@ -59,8 +63,13 @@ window.blockCustomer = function (customerId, reason) {
   });
 };
 
-window.getCustomers = function () {
-  return apiGet("/customers/");
+// Retorna uma página { items, next_cursor }; q busca por prefixo de telefone/nome
+window.getCustomers = function (q, cursor) {
+  const params = new URLSearchParams();
+  if (q) params.set("q", q);
+  if (cursor) params.set("cursor", cursor);
+  const query = params.toString() ? `?${params}` : "";
+  return apiGet(`/customers/${query}`);
 };
 
 window.blockCustomer = function (customerId, reason) {
@@ -4,6 +4,9 @@ document.addEventListener("DOMContentLoaded", () => {
     const statusEl = document.getElementById("appointments-status");
     const tbody = document.getElementById("appointments-body");
     const headerDateEl = document.getElementById("header-date");
+    const loadMoreBtn = document.getElementById("appointments-load-more");
+
+    let nextCursor = null;
 
     function formatDateISO(d) {
         return d.toISOString().slice(0, 10);
@@ -43,9 +46,9 @@ document.addEventListener("DOMContentLoaded", () => {
         return span;
     }
 
-    function renderAppointments(list) {
-        tbody.innerHTML = "";
-        if (!list || list.length === 0) {
+    function renderAppointments(list, append = false) {
+        if (!append) tbody.innerHTML = "";
+        if (!append && (!list || list.length === 0)) {
             const tr = document.createElement("tr");
             const td = document.createElement("td");
             td.colSpan = 5;
@@ -117,16 +120,23 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     }
 
-    async function loadAppointments() {
+    // Uma página por vez; as próximas só sob demanda ("Carregar mais")
+    async function loadAppointments(append = false) {
+        if (!append) nextCursor = null;
         try {
             const dateValue = dateInput.value || null;
             setStatus("Carregando agendamentos...");
-            const list = await window.getAppointments(dateValue);
-            renderAppointments(list);
+            loadMoreBtn.disabled = true;
+            const page = await window.getAppointments(dateValue, append ? nextCursor : null);
+            nextCursor = page.next_cursor;
+            loadMoreBtn.style.display = nextCursor ? "inline-block" : "none";
+            renderAppointments(page.items, append);
             setStatus("Agendamentos carregados.");
         } catch (err) {
             console.error(err);
             setStatus("Erro ao carregar agendamentos.", "error");
+        } finally {
+            loadMoreBtn.disabled = false;
         }
     }
 
@@ -141,5 +151,7 @@ document.addEventListener("DOMContentLoaded", () => {
         loadAppointments();
     });
 
+    loadMoreBtn.addEventListener("click", () => loadAppointments(true));
+
     loadAppointments();
 });
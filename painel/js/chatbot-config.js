@@ -19,7 +19,7 @@ window.setFlowMode = async function (mode) {
 
         if (data.success) {
             console.log('✅ Modo salvo no banco:', mode);
-            alert('✅ ' + data.message + '\n\n⚠️ Reinicie o bot para aplicar as mudanças.');
+            alert('✅ ' + data.message + '\n\nO bot aplica a mudança automaticamente.');
             updateModeUI(mode);
         } else {
             alert('❌ Erro: ' + data.message);
@@ -590,23 +590,21 @@ async function saveAll() {
             msg.order_position = index + 1;
         });
 
-        for (const msg of messages) {
-            if (msg.id) {
-                await fetch(`/chatbot-messages/${msg.id}`, {
-                    method: "PUT",
-                    headers: { "Content-Type": "application/json" },
-                    body: JSON.stringify(msg)
-                });
-            } else {
-                const response = await fetch("/chatbot-messages/", {
-                    method: "POST",
-                    headers: { "Content-Type": "application/json" },
-                    body: JSON.stringify(msg)
-                });
-                const result = await response.json();
-                msg.id = result.id;
-            }
+        // Fluxo inteiro numa única requisição/transação
+        const response = await fetch("/chatbot-messages/bulk", {
+            method: "PUT",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ messages })
+        });
+        if (!response.ok) {
+            const text = await response.text().catch(() => "");
+            throw new Error(`Falha ao salvar fluxo (${response.status}): ${text}`);
         }
+        const result = await response.json();
+        result.ids.forEach((id, index) => {
+            messages[index].id = id;
+        });
+        console.log(`Fluxo salvo (versão ${result.version})`);
 
         alert("Mensagens salvas com sucesso!");
         markAsSaved();
@@ -1,10 +1,21 @@
 let statusCheckInterval = null;
+let statusEvents = null;
 
 document.addEventListener("DOMContentLoaded", () => {
     console.log('✅ DOM carregado');
     setTimeout(() => {
-        checkBotStatus();
-        statusCheckInterval = setInterval(checkBotStatus, 5000);
+        if (window.EventSource) {
+            // O servidor empurra o status só quando ele muda
+            statusEvents = new EventSource('/whatsapp/events');
+            statusEvents.addEventListener('status', (e) => {
+                const data = JSON.parse(e.data);
+                console.log('📊 Status:', data);
+                updateStatusUI(data);
+            });
+        } else {
+            checkBotStatus();
+            statusCheckInterval = setInterval(checkBotStatus, 5000);
+        }
     }, 200);
 });
 
@@ -12,6 +23,18 @@ if (typeof showSuccess === 'undefined') {
     console.error('❌ modal.js não foi carregado!');
 }
 
+// Operações demoradas (ex.: desconectar) viram jobs no backend: acompanha até terminar
+async function waitForJob(jobId, intervalMs = 500) {
+    while (true) {
+        const response = await fetch(`/whatsapp/jobs/${jobId}`);
+        const job = await response.json();
+        if (!response.ok) throw new Error(job.detail || 'Job não encontrado');
+        if (job.state === 'done') return job.result;
+        if (job.state === 'failed') throw new Error(job.error || 'Falha na operação');
+        await new Promise(res => setTimeout(res, intervalMs));
+    }
+}
+
 // DEPOIS SUBSTITUA AS FUNÇÕES:
 
 async function startBot() {
@@ -89,7 +112,10 @@ async function disconnectBot() {
 
             try {
                 const response = await fetch('/whatsapp/disconnect', { method: 'POST' });
-                const data = await response.json();
+                let data = await response.json();
+                if (response.ok && data.job_id) {
+                    data = await waitForJob(data.job_id);
+                }
 
                 if (response.ok && data.success) {
                     let message = '<p>' + data.message + '</p>';
@@ -133,6 +159,9 @@ window.addEventListener('beforeunload', () => {
     if (statusCheckInterval) {
         clearInterval(statusCheckInterval);
     }
+    if (statusEvents) {
+        statusEvents.close();
+    }
 });
 
 async function checkBotStatus() {
@@ -215,9 +244,11 @@ function updateStatusUI(data) {
             if (qrContainer) qrContainer.style.display = 'block';
             if (connectedInfo) connectedInfo.style.display = 'none';
             if (btnDisconnect) btnDisconnect.style.display = 'none';
-            if (data.qr_code) {
+            if (data.qr_version) {
+                // Só baixa a imagem quando o bot gera um QR novo
                 const qrImage = document.getElementById('qr-image');
-                if (qrImage) qrImage.src = `data:image/png;base64,${data.qr_code}`;
+                const qrSrc = `/whatsapp/qr?v=${encodeURIComponent(data.qr_version)}`;
+                if (qrImage && qrImage.getAttribute('src') !== qrSrc) qrImage.src = qrSrc;
             }
         } else {
             if (statusWrapper) statusWrapper.classList.add('status-qr-wrapper');
@@ -291,7 +322,10 @@ async function disconnectBot() {
 
     try {
         const response = await fetch('/whatsapp/disconnect', { method: 'POST' });
-        const data = await response.json();
+        let data = await response.json();
+        if (response.ok && data.job_id) {
+            data = await waitForJob(data.job_id);
+        }
         if (response.ok && data.success) {
             let msg = '✅ ' + data.message + '\n\n';
             if (data.removed && data.removed.length > 0) {
@@ -6,7 +6,12 @@ document.addEventListener("DOMContentLoaded", () => {
   const cancelBtn = document.getElementById("block-cancel");
   const confirmBtn = document.getElementById("block-confirm");
 
+  const searchInput = document.getElementById("customers-search");
+  const loadMoreBtn = document.getElementById("customers-load-more");
+
   let currentCustomer = null;
+  let nextCursor = null;
+  let searchTimer = null;
 
   function formatDate(d) {
     if (!d) return "-";
@@ -61,13 +66,20 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   }
 
-  async function loadCustomers() {
-    tbody.innerHTML = "<tr><td colspan='6'>Carregando...</td></tr>";
+  async function loadCustomers(append = false) {
+    if (!append) {
+      nextCursor = null;
+      tbody.innerHTML = "<tr><td colspan='6'>Carregando...</td></tr>";
+    }
     try {
-      const customers = await window.getCustomers();
-      tbody.innerHTML = "";
+      const page = await window.getCustomers(searchInput.value.trim(), append ? nextCursor : null);
+      const customers = page.items;
+      nextCursor = page.next_cursor;
+      loadMoreBtn.style.display = nextCursor ? "inline-block" : "none";
+
+      if (!append) tbody.innerHTML = "";
 
-      if (!customers.length) {
+      if (!append && !customers.length) {
         tbody.innerHTML = "<tr><td colspan='6'>Nenhum cliente encontrado.</td></tr>";
         return;
       }
@@ -141,5 +153,13 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   }
 
+  loadMoreBtn.addEventListener("click", () => loadCustomers(true));
+
+  // Busca no servidor com pequeno atraso enquanto digita
+  searchInput.addEventListener("input", () => {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => loadCustomers(), 300);
+  });
+
   loadCustomers();
 });
\ No newline at end of file
@@ -49,25 +49,66 @@ async function loadDashboardStats() {
     }
 }
 
-async function loadAppointments() {
+// Cursor da próxima página da listagem atual (null = acabou)
+let appointmentsCursor = null;
+
+// IDs marcados para confirmar/cancelar em lote (PATCH /appointments/batch)
+const selectedAppointments = new Set();
+
+function updateBatchBar() {
+    const bar = document.getElementById("batch-bar");
+    bar.style.display = selectedAppointments.size ? "flex" : "none";
+    document.getElementById("batch-count").textContent = `${selectedAppointments.size} selecionado(s)`;
+}
+
+async function loadAppointments(append = false) {
     const filterDate = document.getElementById("filter-date").value;
+    const filterStatus = document.getElementById("filter-status").value;
     const tbody = document.getElementById("appointments-body");
-    tbody.innerHTML = "<tr><td colspan='8'>Carregando...</td></tr>";
+    const loadMoreBtn = document.getElementById("load-more");
+    if (!append) {
+        appointmentsCursor = null;
+        selectedAppointments.clear();
+        document.getElementById("select-all").checked = false;
+        updateBatchBar();
+        tbody.innerHTML = "<tr><td colspan='9'>Carregando...</td></tr>";
+    }
 
     try {
-        const url = filterDate ? `/appointments/?date=${filterDate}` : '/appointments/';
-        const appointments = await fetch(url).then(r => r.json());
+        const params = new URLSearchParams();
+        if (filterDate) params.set("date", filterDate);
+        if (filterStatus) params.set("status", filterStatus);
+        if (append && appointmentsCursor) params.set("cursor", appointmentsCursor);
+        const page = await fetch(`/appointments/?${params}`).then(r => r.json());
+        const appointments = page.items;
+
+        appointmentsCursor = page.next_cursor;
+        loadMoreBtn.style.display = appointmentsCursor ? "inline-block" : "none";
 
-        tbody.innerHTML = "";
+        if (!append) tbody.innerHTML = "";
 
-        if (!appointments || appointments.length === 0) {
-            tbody.innerHTML = "<tr><td colspan='8'>Nenhum agendamento encontrado.</td></tr>";
+        if (!append && (!appointments || appointments.length === 0)) {
+            tbody.innerHTML = "<tr><td colspan='9'>Nenhum agendamento encontrado.</td></tr>";
             return;
         }
 
         for (const ap of appointments) {
             const tr = document.createElement("tr");
 
+            // Seleção
+            const tdSelect = document.createElement("td");
+            const checkbox = document.createElement("input");
+            checkbox.type = "checkbox";
+            checkbox.classList.add("appointment-select");
+            checkbox.dataset.id = ap.id;
+            checkbox.onchange = () => {
+                if (checkbox.checked) selectedAppointments.add(ap.id);
+                else selectedAppointments.delete(ap.id);
+                updateBatchBar();
+            };
+            tdSelect.appendChild(checkbox);
+            tr.appendChild(tdSelect);
+
             // ID
             const tdId = document.createElement("td");
             tdId.textContent = ap.id;
@@ -138,12 +179,51 @@ async function loadAppointments() {
 
     } catch (err) {
         console.error("Erro ao carregar agendamentos:", err);
-        tbody.innerHTML = "<tr><td colspan='8'>Erro ao carregar agendamentos.</td></tr>";
+        tbody.innerHTML = "<tr><td colspan='9'>Erro ao carregar agendamentos.</td></tr>";
+    }
+}
+
+document.getElementById("select-all").addEventListener("change", (e) => {
+    document.querySelectorAll(".appointment-select").forEach(checkbox => {
+        checkbox.checked = e.target.checked;
+        const id = Number(checkbox.dataset.id);
+        if (e.target.checked) selectedAppointments.add(id);
+        else selectedAppointments.delete(id);
+    });
+    updateBatchBar();
+});
+
+async function batchUpdateStatus(status) {
+    const ids = [...selectedAppointments];
+    if (ids.length === 0) return;
+    const label = status === "confirmed" ? "confirmar" : "cancelar";
+    if (!confirm(`Deseja ${label} ${ids.length} agendamento(s)?`)) return;
+
+    try {
+        const response = await fetch("/appointments/batch", {
+            method: "PATCH",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ ids, status })
+        });
+        const result = await response.json();
+        if (!response.ok) throw new Error(result.detail || "Erro ao atualizar");
+
+        let message = `${result.updated} agendamento(s) atualizado(s).`;
+        if (result.conflicts) message += `\n${result.conflicts} com horário já ocupado por outro agendamento.`;
+        if (result.not_found) message += `\n${result.not_found} não encontrado(s).`;
+        alert(message);
+        loadAppointments();
+        loadDashboardStats();
+
+    } catch (err) {
+        console.error("Erro:", err);
+        alert("Erro ao atualizar agendamentos em lote");
     }
 }
 
 function clearFilter() {
     document.getElementById("filter-date").value = "";
+    document.getElementById("filter-status").value = "";
     loadAppointments();
 }
 
@@ -0,0 +1,198 @@
+"""
+Benchmark de criação de agendamentos concorrentes (POST /appointments/ sem o HTTP).
+Compara o caminho antigo (SELECT do cliente, INSERT se não existe, INSERT do
+agendamento) com o comando único CREATE_APPOINTMENT_SQL. Cada telefone novo é
+agendado por várias threads ao mesmo tempo, que é onde o caminho antigo colide
+na unique de customers.phone.
+
+Grava (em datas de 2099, com telefones "bench-...") e apaga tudo no final, então
+só roda num banco descartável: --dsn ou PRISYSTEM_SCRATCH_DSN, com as migrações
+aplicadas (python migrate.py apply --dsn ...). Recusa o banco do backend/db.py.
+
+Uso (de dentro de backend/):
+    python ../scripts/bench_create_appointment.py --dsn postgresql://.../scratch \
+        [--requests 2000] [--threads 16] [--same-phone 4]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time as time_type, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import psycopg2  # noqa: E402
+from psycopg2 import errors  # noqa: E402
+from psycopg2.extras import RealDictCursor  # noqa: E402
+
+from migrate import SCRATCH_DSN_ENV, is_app_database  # noqa: E402
+from routers.appointments import CREATE_APPOINTMENT_SQL  # noqa: E402
+
+BASE_DATE = date(2099, 1, 1)
+
+
+def legacy_create(cur, params):
+    """create_appointment antes do comando único: três idas ao banco"""
+    cur.execute("SELECT id, is_blocked FROM customers WHERE phone = %s", (params["phone"],))
+    row = cur.fetchone()
+    if not row:
+        cur.execute(
+            """
+            INSERT INTO customers (name, phone, email, channel)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id, is_blocked
+            """,
+            (params["name"], params["phone"], params["email"], params["channel"]),
+        )
+        row = cur.fetchone()
+    if row["is_blocked"]:
+        return
+    cur.execute(
+        """
+        INSERT INTO appointments (customer_id, service_id, date, start_time, duration_minutes,
+                                  status, channel, notes, created_by)
+        VALUES (%s, %s, %s, %s, %s, 'pending', %s, %s, NULL)
+        RETURNING id
+        """,
+        (row["id"], params["service_id"], params["date"], params["start_time"],
+         params["duration"], params["channel"], params["notes"]),
+    )
+
+
+def single_create(cur, params):
+    cur.execute(CREATE_APPOINTMENT_SQL, params)
+    cur.fetchone()
+
+
+def build_requests(prefix, total, same_phone, service_id, duration):
+    """Um horário exclusivo por requisição; `same_phone` requisições seguidas por telefone"""
+    per_day = (24 * 60) // duration
+    requests = []
+    for i in range(total):
+        minutes = (i % per_day) * duration
+        requests.append({
+            "name": f"Bench {i // same_phone}",
+            "phone": f"{prefix}{i // same_phone:07d}",
+            "email": None,
+            "channel": "bench",
+            "service_id": service_id,
+            "date": BASE_DATE + timedelta(days=i // per_day),
+            "start_time": time_type(minutes // 60, minutes % 60),
+            "duration": duration,
+            "notes": "bench",
+        })
+    return requests
+
+
+def run(label, create, requests, threads, dsn):
+    local = threading.local()
+    lock = threading.Lock()
+    latencies = []
+    counts = {"ok": 0, "unique_violation": 0, "exclusion_violation": 0, "other_error": 0}
+    connections = []
+
+    def worker(params):
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+            with lock:
+                connections.append(conn)
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            with conn, conn.cursor() as cur:
+                create(cur, params)
+        except errors.UniqueViolation:
+            outcome = "unique_violation"
+        except errors.ExclusionViolation:
+            outcome = "exclusion_violation"
+        except psycopg2.Error:
+            outcome = "other_error"
+        elapsed = time.perf_counter() - started
+        with lock:
+            counts[outcome] += 1
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, requests))
+    total = time.perf_counter() - started
+
+    for conn in connections:
+        conn.close()
+
+    latencies.sort()
+    pick = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000  # noqa: E731
+    print(
+        f"{label:<16} {len(requests) / total:8.0f} req/s   "
+        f"p50 {pick(0.5):6.1f} ms   p95 {pick(0.95):6.1f} ms   "
+        f"ok {counts['ok']}   duplicate key {counts['unique_violation']}   "
+        f"conflito de horário {counts['exclusion_violation']}   outros erros {counts['other_error']}"
+    )
+    return counts
+
+
+def cleanup(conn, prefix):
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            DELETE FROM appointments
+            WHERE customer_id IN (SELECT id FROM customers WHERE phone LIKE %s)
+            """,
+            (prefix + "%",),
+        )
+        cur.execute("DELETE FROM customers WHERE phone LIKE %s", (prefix + "%",))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de criação concorrente de agendamentos")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--same-phone", type=int, default=4,
+                        help="requisições simultâneas por telefone novo")
+    parser.add_argument("--dsn", default=os.getenv(SCRATCH_DSN_ENV),
+                        help=f"banco descartável (ou {SCRATCH_DSN_ENV})")
+    args = parser.parse_args(argv)
+
+    if not args.dsn:
+        print(f"❌ O benchmark grava e apaga dados: informe um banco descartável com --dsn ou {SCRATCH_DSN_ENV}")
+        return 2
+
+    conn = psycopg2.connect(args.dsn, cursor_factory=RealDictCursor)
+    run_id = uuid.uuid4().hex[:6]
+    try:
+        if is_app_database(conn):
+            print("❌ O DSN aponta para o banco da aplicação; use um banco descartável")
+            return 2
+
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, duration_minutes FROM services ORDER BY id LIMIT 1")
+            service = cur.fetchone()
+        if not service:
+            print("Nenhum serviço cadastrado")
+            return 1
+        duration = service["duration_minutes"] or 60
+
+        print(f"{args.requests} agendamentos, {args.threads} threads, "
+              f"{args.same_phone} requisições por telefone novo\n")
+        results = {}
+        for label, create in (("SELECT+INSERTs", legacy_create), ("comando único", single_create)):
+            prefix = f"bench-{run_id}-{label[0]}-"
+            requests = build_requests(prefix, args.requests, args.same_phone, service["id"], duration)
+            try:
+                results[label] = run(label, create, requests, args.threads, args.dsn)
+            finally:
+                cleanup(conn, prefix)
+    finally:
+        conn.close()
+
+    single = results["comando único"]
+    return 1 if single["unique_violation"] or single["other_error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
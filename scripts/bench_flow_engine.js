@@ -0,0 +1,101 @@
+// Benchmark do interpretador do fluxo personalizado (chatbot/bot_rule/flow-engine.js).
+// Reproduz milhares de conversas simuladas, intercaladas como no WhatsApp real,
+// sem banco nem envio de mensagens: mede só o custo de start()/advance().
+//
+// Uso: node scripts/bench_flow_engine.js [conversas] [passos]
+//   ex.: node scripts/bench_flow_engine.js 20000 12
+
+const path = require('path');
+const { compileFlowProgram, start, advance } = require(
+    path.join(__dirname, '..', 'chatbot', 'bot_rule', 'flow-engine.js')
+);
+
+const CONVERSATIONS = Number(process.argv[2]) || 10000;
+const STEPS = Math.max(2, Number(process.argv[3]) || 10);
+
+function buildMessages(count) {
+    const types = ['message', 'important', 'alert'];
+    const messages = [];
+    for (let i = 0; i < count - 1; i++) {
+        messages.push({
+            id: i + 1,
+            order_position: i + 1,
+            message_type: types[i % types.length],
+            message_text: i === 0 ? 'Olá! Qual é o seu nome?' : `Passo ${i + 1}, {nome}: responda por favor`,
+            // um em cada três passos é informativo (não espera resposta)
+            wait_for_reply: i % 3 !== 1,
+            delay_seconds: 1,
+            media_type: i === 2 ? 'image' : null,
+            media_url: i === 2 ? '/uploads/chatbot/exemplo.png' : null,
+            media_filename: i === 2 ? 'exemplo.png' : null
+        });
+    }
+    messages.push({
+        id: count,
+        order_position: count,
+        message_type: 'final',
+        message_text: 'Obrigada, {nome}! Seu atendimento foi registrado.',
+        wait_for_reply: true,
+        delay_seconds: 0
+    });
+    return messages;
+}
+
+function percentile(sorted, p) {
+    return sorted[Math.min(sorted.length - 1, Math.floor(sorted.length * p))];
+}
+
+function main() {
+    const messages = buildMessages(STEPS);
+
+    let t0 = process.hrtime.bigint();
+    const program = compileFlowProgram(messages);
+    const compileMs = Number(process.hrtime.bigint() - t0) / 1e6;
+
+    const heapBefore = process.memoryUsage().heapUsed;
+    const conversations = new Map();
+    const latencies = [];
+    let actionsSent = 0;
+    let finished = 0;
+
+    t0 = process.hrtime.bigint();
+
+    // Rodada 0: todas as conversas começam; depois cada rodada responde um passo de cada
+    for (let c = 0; c < CONVERSATIONS; c++) {
+        const s = process.hrtime.bigint();
+        const result = start(program);
+        latencies.push(Number(process.hrtime.bigint() - s));
+        actionsSent += result.actions.length;
+        conversations.set(`55119${String(c).padStart(8, '0')}@c.us`, result.state);
+    }
+
+    while (conversations.size > 0) {
+        for (const [chatId, state] of conversations) {
+            const s = process.hrtime.bigint();
+            const result = advance(program, state, `resposta de ${chatId}`);
+            latencies.push(Number(process.hrtime.bigint() - s));
+            actionsSent += result.actions.length;
+            if (result.done) {
+                conversations.delete(chatId);
+                finished++;
+            }
+        }
+    }
+
+    const totalMs = Number(process.hrtime.bigint() - t0) / 1e6;
+    const heapAfter = process.memoryUsage().heapUsed;
+    latencies.sort((a, b) => a - b);
+
+    console.log(`Fluxo: ${STEPS} passos (compilado em ${compileMs.toFixed(3)} ms)`);
+    console.log(`Conversas: ${CONVERSATIONS} (${finished} concluídas)`);
+    console.log(`Eventos: ${latencies.length} start/advance, ${actionsSent} mensagens geradas`);
+    console.log(`Tempo total: ${totalMs.toFixed(1)} ms (${Math.round(latencies.length / (totalMs / 1000))} eventos/s)`);
+    console.log(
+        `Latência por evento: p50 ${(percentile(latencies, 0.5) / 1000).toFixed(2)} µs, ` +
+        `p99 ${(percentile(latencies, 0.99) / 1000).toFixed(2)} µs, ` +
+        `máx ${(latencies[latencies.length - 1] / 1000).toFixed(2)} µs`
+    );
+    console.log(`Heap: ${((heapAfter - heapBefore) / 1024 / 1024).toFixed(1)} MB a mais durante o teste`);
+}
+
+main();
@@ -0,0 +1,2 @@
+-- O schema é versionado em backend/migrations/.
+-- Para criar/atualizar o banco: cd backend && python migrate.py apply